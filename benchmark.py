@@ -0,0 +1,340 @@
+"""Micro-benchmarks for the backend's hot functions.
+
+Each benchmark is calibrated to run for about `--min-time` seconds per round
+and repeated `--repeat` times; the reported figure is the best (minimum)
+per-call time, which is the most stable across runs, alongside the median.
+Database-backed cases use a throwaway SQLite file and the random module is
+reseeded before each benchmark, so runs are repeatable.
+
+    python benchmark.py                         # run everything
+    python benchmark.py -k truefalse            # only matching benchmarks
+    python benchmark.py --save bench.json       # store results
+    python benchmark.py --compare bench.json    # diff against a saved baseline
+    python benchmark.py --compare bench.json --fail-over 10   # exit 1 on >10% regressions
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+
+_BENCHMARKS: List[Tuple[str, Callable]] = []
+
+
+def benchmark(name: str):
+    """Register `fn()` -> callable to time; setup happens in `fn`."""
+    def wrap(fn):
+        _BENCHMARKS.append((name, fn))
+        return fn
+    return wrap
+
+
+def _time(fn: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    # calibrate the inner loop so one round takes roughly `min_time`
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5 or number >= 1 << 20:
+            break
+        number *= 2
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+    rounds = []
+    # like timeit: keep collector pauses out of the rounds
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            rounds.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "best_us": round(min(rounds) * 1e6, 3),
+        "median_us": round(statistics.median(rounds) * 1e6, 3),
+        "stdev_us": round(statistics.pstdev(rounds) * 1e6, 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+# --- fixtures ---------------------------------------------------------------
+
+_state: Dict = {}
+
+
+def _db():
+    """Temp SQLite database with the real quiz bank and one fully set-up user."""
+    if "user_id" in _state:
+        return _state
+    from sqlmodel import Session, select
+    from server.db import engine, create_db_and_tables
+    from server.models import User, UserScore, UserStreak, UserSubscription, UserEnergy, QuizQuestion
+
+    create_db_and_tables()
+    with open(os.path.join(DATA_DIR, "manual_quiz.json"), encoding="utf-8") as f:
+        quiz = json.load(f)
+    with Session(engine) as session:
+        for item in quiz:
+            session.add(QuizQuestion(
+                question_texts=json.dumps(item["question_texts"], ensure_ascii=False),
+                options_texts=json.dumps(item["options_texts"], ensure_ascii=False),
+                correct_answer_index=item["correct_answer_index"], category=item["category"],
+            ))
+        user = User(firebase_uid="bench-user", email="bench@example.com",
+                    score=UserScore(score=1200), streak=UserStreak(streak_count=3),
+                    subscription=UserSubscription(level="pro"))
+        session.add(user)
+        session.commit()
+        session.add(UserEnergy(user_id=user.id, remaining_energy=4))
+        session.commit()
+        _state["user_id"] = user.id
+        _state["question_ids"] = list(session.exec(select(QuizQuestion.id).order_by(QuizQuestion.id)).all())
+    return _state
+
+
+def _content():
+    from server.content import registry
+    if "content" not in _state:
+        registry.load(os.path.join(DATA_DIR, "manual_info.json"), os.path.join(DATA_DIR, "manual_truefalse.json"), initial=True)
+        _state["content"] = True
+    return registry.current
+
+
+# --- benchmarks -------------------------------------------------------------
+
+@benchmark("content.info_catalog")
+def bench_load_infos():
+    """Parse + index manual_info.json (the infos half of a reload)."""
+    from server.content import InfoCatalog, _read_list
+    path = os.path.join(DATA_DIR, "manual_info.json")
+    return lambda: InfoCatalog(_read_list(path))
+
+
+@benchmark("content.truefalse_catalog")
+def bench_load_truefalse():
+    """Parse + index + pre-serialize manual_truefalse.json."""
+    from server.content import TrueFalseCatalog, _read_list
+    path = os.path.join(DATA_DIR, "manual_truefalse.json")
+    return lambda: TrueFalseCatalog(_read_list(path))
+
+
+@benchmark("content.bundle_open")
+def bench_bundle_open():
+    """Map the compiled bundle (built into a temp dir from data/*.json)."""
+    import json as _json
+    from server.bundle import BundleInfoCatalog, BundleTrueFalseCatalog, build_bundle, open_bundle
+    path = os.path.join(tempfile.mkdtemp(prefix="sparkup-bundle-"), "content.bundle")
+    with open(os.path.join(DATA_DIR, "manual_info.json"), encoding="utf-8") as f:
+        infos = _json.load(f)
+    with open(os.path.join(DATA_DIR, "manual_truefalse.json"), encoding="utf-8") as f:
+        truefalse = _json.load(f)
+    build_bundle(infos, truefalse, path, {})
+
+    def run():
+        bundle = open_bundle(path)
+        return BundleInfoCatalog(bundle), BundleTrueFalseCatalog(bundle)
+    return run
+
+
+@benchmark("content.registry_reload")
+def bench_registry_reload():
+    from server.content import registry
+    _content()
+    return lambda: registry.load()
+
+
+@benchmark("truefalse.build_payloads")
+def bench_truefalse_payloads():
+    from server.content import _build_truefalse_payloads
+    items = _content().truefalse.items
+    return lambda: _build_truefalse_payloads(items)
+
+
+@benchmark("truefalse.projected_response")
+def bench_truefalse_response():
+    """Body assembly of /manual/truefalse/?limit=10 (sample + join)."""
+    catalog = _content().truefalse
+    payloads = catalog.payloads["en"]
+    pool = range(len(catalog.items))
+
+    def run():
+        picked = random.sample(pool, 10)
+        return '{"total":%d,"items":[%s]}' % (len(pool), ",".join(payloads[i] for i in picked))
+    return run
+
+
+@benchmark("quiz.localize_row")
+def bench_localize_row():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.models import QuizQuestion
+    from server.quiz_catalog import _localize_row
+    st = _db()
+    with Session(engine) as session:
+        row = session.get(QuizQuestion, st["question_ids"][0])
+        session.expunge(row)
+    return lambda: _localize_row(row)
+
+
+@benchmark("quiz.get_localized_questions.cached")
+def bench_localized_cached():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.quiz_catalog import get_localized_questions
+    st = _db()
+    ids = st["question_ids"][:3]
+    session = Session(engine)
+    get_localized_questions(session, ids, "tr")
+    return lambda: get_localized_questions(session, ids, "tr")
+
+
+@benchmark("quiz.get_localized_questions.cold")
+def bench_localized_cold():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.quiz_catalog import get_localized_questions, invalidate_catalog
+    st = _db()
+    ids = st["question_ids"][:3]
+    session = Session(engine)
+
+    def run():
+        invalidate_catalog()
+        return get_localized_questions(session, ids, "tr")
+    return run
+
+
+@benchmark("access.get_user_access_level.ctx")
+def bench_access_ctx():
+    from sqlmodel import Session
+    from server.context import load_user_context
+    from server.db import engine
+    from server.utils import _get_user_access_level
+    st = _db()
+    session = Session(engine)
+    ctx = load_user_context(session, user_id=st["user_id"])
+    return lambda: _get_user_access_level(ctx.user, session, ctx)
+
+
+@benchmark("access.get_user_access_level.db")
+def bench_access_db():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.models import User
+    from server.utils import _get_user_access_level
+    st = _db()
+    session = Session(engine)
+    user = session.get(User, st["user_id"])
+    return lambda: _get_user_access_level(user, session)
+
+
+@benchmark("infos.select_unseen_info_for_user")
+def bench_select_unseen():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.models import User
+    from server.utils import _select_unseen_info_for_user
+    st = _db()
+    _content()
+    session = Session(engine)
+    user = session.get(User, st["user_id"])
+    return lambda: _select_unseen_info_for_user(session, user)
+
+
+@benchmark("infos.select_unseen_info_for_user.category")
+def bench_select_unseen_category():
+    from sqlmodel import Session
+    from server.db import engine
+    from server.models import User
+    from server.utils import _select_unseen_info_for_user
+    st = _db()
+    _content()
+    session = Session(engine)
+    user = session.get(User, st["user_id"])
+    return lambda: _select_unseen_info_for_user(session, user, "history")
+
+
+# --- runner -----------------------------------------------------------------
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> List[Tuple[str, Optional[float]]]:
+    """Percent change of best time per benchmark (positive = slower)."""
+    out = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("best_us"):
+            out.append((name, None))
+            continue
+        out.append((name, (res["best_us"] - base["best_us"]) / base["best_us"] * 100.0))
+    return out
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("-k", dest="keyword", help="only run benchmarks whose name contains this")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--save", help="write results to this JSON file")
+    p.add_argument("--compare", help="baseline JSON written by --save")
+    p.add_argument("--fail-over", type=float, help="with --compare, exit 1 if any benchmark is slower by more than this percent")
+    args = p.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="sparkup-bench-"), "bench.db")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    sys.path.insert(0, REPO_ROOT)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    results: Dict[str, Dict] = {}
+    print(f"{'benchmark':<46}{'best us':>12}{'median us':>12}{'stdev':>10}{'vs base':>10}")
+    for name, factory in _BENCHMARKS:
+        if args.keyword and args.keyword not in name:
+            continue
+        random.seed(args.seed)
+        fn = factory()
+        res = _time(fn, args.repeat, args.min_time)
+        results[name] = res
+        delta = ""
+        base = baseline.get(name)
+        if base and base.get("best_us"):
+            delta = f"{(res['best_us'] - base['best_us']) / base['best_us'] * 100.0:+.1f}%"
+        print(f"{name:<46}{res['best_us']:>12.2f}{res['median_us']:>12.2f}{res['stdev_us']:>10.2f}{delta:>10}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+        print(f"\nSaved {len(results)} results to {args.save}")
+
+    if args.compare and args.fail_over is not None:
+        slower = [(n, d) for n, d in compare(results, baseline) if d is not None and d > args.fail_over]
+        if slower:
+            for n, d in slower:
+                print(f"REGRESSION {n}: {d:+.1f}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
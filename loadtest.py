@@ -0,0 +1,293 @@
+"""End-to-end load test for the backend with Firebase stubbed out.
+
+Boots `server.app:app` under uvicorn (in a background thread) against a local
+SQLite file or any DATABASE_URL, replaces token verification and FCM
+multicast with fakes, seeds content when the database is empty, and replays
+the app's session mix from many concurrent virtual users:
+
+    profile -> quiz (consume) -> N answers -> leaderboard -> rank -> true/false
+
+and reports p50/p95/p99 latency and requests/sec per endpoint.
+
+    python loadtest.py --users 200 --concurrency 50 --sessions 1000
+    python loadtest.py --database-url postgresql://... --answers 5 --json out.json
+    python loadtest.py --serve --port 8000        # only boot the stubbed server
+    python loadtest.py --url http://127.0.0.1:8000  # load an already running one
+
+Bearer tokens are accepted as-is: the token is the Firebase uid.
+
+SQLite allows one writer at a time, and a transaction that read before it
+writes fails with "database is locked" instead of waiting when another
+connection committed in between. On a SQLite database the async routes are
+therefore pointed at the sync engine's threadpool (one engine instead of the
+sync + aiosqlite pair) and the busy timeout is raised to 30s; the numbers then
+measure a serialized writer, so compare concurrency on PostgreSQL.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def _fake_verify(token: str) -> Dict:
+    return {"uid": token, "email": f"{token}@loadtest.local"}
+
+
+async def _fake_verify_async(token: str) -> Dict:
+    return _fake_verify(token)
+
+
+class _FakeSendResponse:
+    def __init__(self, success: bool):
+        self.success = success
+        self.exception = None
+
+
+class _FakeBatchResponse:
+    def __init__(self, n: int):
+        self.responses = [_FakeSendResponse(True) for _ in range(n)]
+        self.success_count = n
+        self.failure_count = 0
+
+
+def install_fakes(fcm_latency_ms: float = 0.0, energy_per_day: Optional[int] = None) -> None:
+    """Swap Firebase auth and messaging for in-process fakes. Must run after
+    DATABASE_URL is set, since importing `server` creates the engines.
+    """
+    from firebase_admin import messaging
+    from server import auth, config
+
+    auth.verify_id_token = _fake_verify
+    auth.verify_id_token_async = _fake_verify_async
+
+    def send_multicast(message):
+        if fcm_latency_ms:
+            time.sleep(fcm_latency_ms / 1000.0)
+        return _FakeBatchResponse(len(message.tokens))
+
+    messaging.send_multicast = send_multicast
+    if energy_per_day is not None:
+        # the default 3-5 sessions a day would turn most of the run into 403s
+        for access in config.SUBSCRIPTION_ACCESS.values():
+            access["energy_per_day"] = energy_per_day
+
+
+def use_one_sqlite_engine() -> None:
+    """On SQLite, route the async handlers through the sync engine as well."""
+    from server import db
+    if db.engine.url.get_backend_name() == "sqlite" and db.async_engine is not None:
+        db.async_engine = None
+
+
+def seed_if_empty() -> None:
+    from sqlmodel import Session, select
+    from server.db import engine, create_db_and_tables
+    from server.models import QuizQuestion
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        if session.exec(select(QuizQuestion.id).limit(1)).first() is not None:
+            return
+    import seed_manual
+    seed_manual.seed_database_manual()
+
+
+def start_server(host: str, port: int) -> Tuple[object, threading.Thread]:
+    import uvicorn
+    from server.app import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="loadtest-server", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    def add(self, name: str, status: int, seconds: float) -> None:
+        self.samples.setdefault(name, []).append(seconds)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(rec: Recorder, wall_seconds: float) -> Dict:
+    out = {}
+    everything: List[float] = []
+    for name in sorted(rec.samples):
+        values = sorted(rec.samples[name])
+        everything.extend(values)
+        statuses = rec.statuses[name]
+        out[name] = {
+            "requests": len(values),
+            "errors": sum(n for status, n in statuses.items() if status >= 400),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+            "rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    everything.sort()
+    out["TOTAL"] = {
+        "requests": len(everything),
+        "errors": sum(v["errors"] for v in out.values()),
+        "rps": round(len(everything) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(everything, 50) * 1000, 2),
+        "p95_ms": round(percentile(everything, 95) * 1000, 2),
+        "p99_ms": round(percentile(everything, 99) * 1000, 2),
+        "max_ms": round(everything[-1] * 1000, 2) if everything else 0.0,
+    }
+    return out
+
+
+def print_report(summary: Dict, wall_seconds: float, args) -> None:
+    print(f"\n{args.sessions} sessions, {args.users} users, concurrency {args.concurrency}, "
+          f"{args.answers} answers/session, {wall_seconds:.2f}s wall")
+    header = f"{'endpoint':<34}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in summary.items():
+        print(f"{name:<34}{s['requests']:>8}{s['errors']:>6}{s['rps']:>10.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+
+
+async def _timed(client, rec: Recorder, name: str, method: str, url: str, uid: str, **kwargs):
+    start = time.perf_counter()
+    try:
+        resp = await client.request(method, url, headers={"Authorization": f"Bearer {uid}"}, **kwargs)
+        status = resp.status_code
+    except Exception:
+        resp, status = None, 599
+    rec.add(name, status, time.perf_counter() - start)
+    return resp
+
+
+async def run_session(client, rec: Recorder, uid: str, args, rng: random.Random) -> None:
+    await _timed(client, rec, "GET /user/profile/", "GET", "/user/profile/", uid)
+    resp = await _timed(client, rec, "GET /quiz/", "GET", f"/quiz/?consume=true&limit={args.answers}", uid)
+    questions = resp.json() if resp is not None and resp.status_code == 200 else []
+    for q in questions:
+        # answer correctly most of the time, like a reasonably good player
+        answer = q["correct_answer_index"] if rng.random() < 0.7 else (q["correct_answer_index"] + 1) % max(1, len(q.get("options") or [1, 2]))
+        await _timed(client, rec, "POST /quiz/answer/", "POST", "/quiz/answer/", uid,
+                     json={"question_id": q["id"], "answer_index": answer})
+    await _timed(client, rec, "GET /leaderboard/", "GET", "/leaderboard/?limit=50", uid)
+    await _timed(client, rec, "GET /user/rank/", "GET", "/user/rank/", uid)
+    if args.truefalse:
+        await _timed(client, rec, "GET /manual/truefalse/", "GET", f"/manual/truefalse/?limit={args.truefalse}", uid)
+
+
+async def run_load(base_url: str, args) -> Tuple[Recorder, float]:
+    import httpx
+
+    rec = Recorder()
+    uids = [f"lt-user-{i}" for i in range(args.users)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if args.warmup:
+            # create the users first so the measured run is steady-state
+            warm = Recorder()
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def _warm(uid):
+                async with sem:
+                    await _timed(client, warm, "warmup", "GET", "/user/profile/", uid)
+            await asyncio.gather(*(_warm(u) for u in uids))
+
+        next_session = iter(range(args.sessions))
+
+        async def worker(worker_id: int):
+            rng = random.Random(args.seed + worker_id)
+            for i in next_session:
+                await run_session(client, rec, uids[i % len(uids)], args, rng)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(args.concurrency)))
+        wall = time.perf_counter() - start
+    return rec, wall
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--database-url", help="default: a fresh SQLite file in a temp dir")
+    p.add_argument("--url", help="load an already running (stubbed) server instead of booting one")
+    p.add_argument("--serve", action="store_true", help="only boot the stubbed server and block")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--sessions", type=int, default=500)
+    p.add_argument("--answers", type=int, default=3, help="quiz questions fetched and answered per session")
+    p.add_argument("--truefalse", type=int, default=10, help="true/false questions per session (0 to skip)")
+    p.add_argument("--energy", type=int, default=100000, help="energy per day for every subscription level")
+    p.add_argument("--fcm-latency-ms", type=float, default=0.0)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--no-warmup", dest="warmup", action="store_false")
+    p.add_argument("--json", help="also write the summary to this file")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        if args.database_url:
+            os.environ["DATABASE_URL"] = args.database_url
+        else:
+            # never default to the .env database: the run writes users and answers
+            os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="sparkup-load-"), "load.db")
+        if os.environ["DATABASE_URL"].startswith("sqlite"):
+            os.environ.setdefault("SQLITE_BUSY_TIMEOUT_MS", "30000")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        install_fakes(args.fcm_latency_ms, args.energy)
+        use_one_sqlite_engine()
+        seed_if_empty()
+        server, thread = start_server(args.host, args.port)
+        base_url = f"http://{args.host}:{args.port}"
+        print(f"Serving stubbed backend at {base_url} ({os.environ['DATABASE_URL']})")
+        if args.serve:
+            try:
+                thread.join()
+            except KeyboardInterrupt:
+                server.should_exit = True
+            return 0
+    try:
+        rec, wall = asyncio.run(run_load(base_url, args))
+    finally:
+        if server is not None:
+            server.should_exit = True
+    summary = summarize(rec, wall)
+    print_report(summary, wall, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "wall_seconds": wall, "endpoints": summary}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
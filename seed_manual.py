@@ -1,8 +1,7 @@
 import os
-import json
-from typing import Optional, Any, List, Dict
+import time
 from dotenv import load_dotenv
-from sqlmodel import Field, SQLModel, Session, create_engine, select
+from sqlmodel import SQLModel, create_engine
 
 print("🌱 Manuel Veri Doldurma Script'i Başlatılıyor...")
 load_dotenv()
@@ -20,97 +19,55 @@ CHALLENGE_FILE = "data/manual_challenges.json"
 TF_FILE = "data/manual_truefalse.json"
 
 
-# Import required models from server.models. Challenges were removed from the
-# codebase — only import DailyInfo and QuizQuestion. If these are missing,
-# abort so we don't attempt to redefine models and cause table conflicts.
-try:
-    from server.models import DailyInfo, QuizQuestion
-    # TrueFalseQuestion is optional; import if available
-    try:
-        from server.models import TrueFalseQuestion
-    except Exception:
-        TrueFalseQuestion = None
-except ImportError as e:
-    raise RuntimeError("server.models must define DailyInfo and QuizQuestion for seeding") from e
+# Content tables and the incremental upsert pipeline live in the server package.
+from server.config import SEED_BATCH_SIZE
+from server.db import _ensure_content_columns
+from server.ingest import SPECS, ingest
+
+# Cached localized questions must be dropped when quiz content changes.
+from server.quiz_catalog import invalidate_catalog
+
+SEED_FILES = [
+    ("info", INFO_FILE, "Daily Info"),
+    ("quiz", QUIZ_FILE, "Quiz Sorusu"),
+    ("truefalse", TF_FILE, "True/False Sorusu"),
+]
+
 
 def create_db_and_tables(): 
     SQLModel.metadata.create_all(engine)
+    return _ensure_content_columns(engine)
 
-def load_json_data(file_path: str) -> List[Dict[str, Any]]:
-    """Belirtilen JSON dosyasını okur."""
-    if not os.path.exists(file_path):
-        print(f"HATA: Veri dosyası bulunamadı: {file_path}. Lütfen dosyayı oluşturun.")
-        return []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
 
-def seed_database_manual():
-    create_db_and_tables()
+def seed_database_manual(batch_size: int = SEED_BATCH_SIZE):
+    """Yeni veya değişen içerikleri ekler/günceller (bkz. server/ingest.py)."""
+    columns_ok = create_db_and_tables()
     print("Veritabanı tabloları kontrol edildi/oluşturuldu.")
-    
-    # Yeni bir 'data' klasörü oluşturun (Eğer yoksa)
-    os.makedirs('data', exist_ok=True)
-    
-    # NOT: Bu script'i çalıştırmadan önce, 'data' klasörünün içine 
-    # manual_info.json, manual_quiz.json ve manual_challenges.json dosyalarını 
-    # yukarıdaki şablonlara uygun içerikle doldurmanız gerekir.
-
-    with Session(engine) as session:
-        
-        # --- 1. Challenge'ları Doldurma ---
-        # Challenges have been removed from the app; skip seeding them.
-        print("ℹ️ Challenges are deprecated and will not be seeded.")
-            
-        # --- 2. Bilgileri (DailyInfo) Doldurma ---
-        info_data = load_json_data(INFO_FILE)
-        if info_data and not session.exec(select(DailyInfo)).first():
-            print(f"\nℹ️ {len(info_data)} adet Daily Info yükleniyor...")
-            for item in info_data:
-                session.add(DailyInfo(
-                    info_texts=json.dumps(item["info_texts"], ensure_ascii=False),
-                    category=item["category"],
-                    source=item.get("source")
-                ))
-            session.commit()
-            print(f"✅ {len(info_data)} Daily Info eklendi.")
-        else:
-            print("☑️ Daily Info bilgileri zaten mevcut veya dosya boş.")
-
-        # --- 3. Quiz Sorularını Doldurma ---
-        quiz_data = load_json_data(QUIZ_FILE)
-        if quiz_data and not session.exec(select(QuizQuestion)).first():
-            print(f"\n❓ {len(quiz_data)} adet Quiz Sorusu yükleniyor...")
-            for item in quiz_data:
-                session.add(QuizQuestion(
-                    question_texts=json.dumps(item["question_texts"], ensure_ascii=False),
-                    options_texts=json.dumps(item["options_texts"], ensure_ascii=False),
-                    correct_answer_index=item["correct_answer_index"],
-                    category=item["category"]
-                ))
-            session.commit()
-            print(f"✅ {len(quiz_data)} Quiz Sorusu eklendi.")
-        else:
-            print("☑️ Quiz Soruları zaten mevcut veya dosya boş.")
-
-        # --- 4. True/False Sorularını Doldurma ---
-        if TrueFalseQuestion is not None:
-            tf_data = load_json_data(TF_FILE)
-            if tf_data and not session.exec(select(TrueFalseQuestion)).first():
-                print(f"\n❓ {len(tf_data)} adet True/False Sorusu yükleniyor...")
-                for item in tf_data:
-                    # question mapping: store question translations as JSON string
-                    question_texts = json.dumps(item.get('question', {}), ensure_ascii=False)
-                    correct = bool(item.get('correct_answer', False))
-                    category = item.get('category', 'General')
-                    session.add(TrueFalseQuestion(question_texts=question_texts, correct_answer=correct, category=category))
-                session.commit()
-                print(f"✅ {len(tf_data)} True/False Sorusu eklendi.")
-            else:
-                print("☑️ True/False Soruları zaten mevcut veya dosya boş.")
-        else:
-            print("ℹ️ TrueFalseQuestion model not found in server.models; skipping TF seeding.")
+
+    # Challenges have been removed from the app; skip seeding them.
+    print("ℹ️ Challenges are deprecated and will not be seeded.")
+
+    results = {}
+    for name, path, label in SEED_FILES:
+        if not os.path.exists(path):
+            print(f"HATA: Veri dosyası bulunamadı: {path}. Lütfen dosyayı oluşturun.")
+            continue
+        start = time.perf_counter()
+        counts = ingest(engine, SPECS[name], path, batch_size=batch_size)
+        results[name] = counts
+        print(f"✅ {label}: {counts['inserted']} eklendi, {counts['updated']} güncellendi, "
+              f"{counts['retired']} kaldırıldı, {counts['unchanged']} değişmedi ({time.perf_counter() - start:.2f}s)")
+
+    if not columns_ok:
+        # duplicate keys blocked the unique index; the seed has just retired them
+        _ensure_content_columns(engine)
+
+    quiz = results.get("quiz")
+    if quiz and (quiz["inserted"] or quiz["updated"] or quiz["retired"]):
+        invalidate_catalog()
 
     print("\n🎉 Manuel veri doldurma işlemi tamamlandı!")
+    return results
 
 if __name__ == "__main__":
-    seed_database_manual()
\ No newline at end of file
+    seed_database_manual()
@@ -1,3 +1,8 @@
+import time as _time
+
+# start of the package import, for the startup timing breakdown
+IMPORT_STARTED = _time.perf_counter()
+
 from .app import app
 
 __all__ = ["app"]
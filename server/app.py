@@ -1,31 +1,37 @@
-import os
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .config import load_manual_infos, load_manual_truefalse
-from .db import create_db_and_tables, _ensure_schema_compat
+from .content import registry as content_registry
+from .metrics import MetricsMiddleware
+from .rank_index import rank_index
 from .routes import router
+from .startup import prepare_database, report as startup_report
+from . import IMPORT_STARTED
+
+startup_report.add("imports", time.perf_counter() - IMPORT_STARTED)
 
 app = FastAPI(title="SparkUp Backend")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
-    load_manual_infos()
-    # Ensure manual_truefalse.json is loaded from the repository-root `data/` directory.
-    try:
-        repo_root = os.path.dirname(os.path.dirname(__file__))
-        tf_path = os.path.join(repo_root, 'data', 'manual_truefalse.json')
-        load_manual_truefalse(tf_path)
-    except Exception:
-        # silent on startup to avoid noisy logs
-        pass
-    try:
-        _ensure_schema_compat()
-    except Exception as e:
-        print(f"Schema compatibility check failed: {e}")
+    # no-op when main.py already prepared the database in this process
+    prepare_database()
+    with startup_report.phase("catalogs"):
+        try:
+            content_registry.load(initial=True)
+        except Exception as e:
+            print(f"Content catalogs failed to load: {e}")
+        content_registry.start_watcher()
+    with startup_report.phase("rank_index"):
+        try:
+            rank_index.rebuild()
+        except Exception as e:
+            print(f"Rank index build failed: {e}")
+    startup_report.log()
 
 
 app.include_router(router)
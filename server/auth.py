@@ -1,35 +1,97 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from .db import get_session
+from .cache import TTLCache
+from .config import USER_ID_CACHE_SIZE, USER_ID_CACHE_TTL
+from .context import UserContext, load_user_context
+from .db import get_session, get_async_session
 from .models import User, UserScore, UserStreak, UserSubscription
-from firebase_admin import auth
+from .rank_index import rank_index
+from .tokens import verify_id_token, verify_id_token_async
 from sqlmodel import select
 from sqlalchemy.exc import IntegrityError
 
 token_auth_scheme = HTTPBearer()
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(token_auth_scheme), session = Depends(get_session)) -> User:
+# firebase_uid -> User.id, so known users are loaded by primary key
+_user_id_cache = TTLCache(maxsize=USER_ID_CACHE_SIZE, ttl=USER_ID_CACHE_TTL)
+
+
+def _verify_token(credentials: str) -> dict:
     try:
-        decoded_token = auth.verify_id_token(token.credentials)
-        uid = decoded_token['uid']
+        decoded_token = verify_id_token(credentials)
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid Firebase token: {e}")
-    db_user = session.exec(select(User).where(User.firebase_uid == uid)).first()
-    if db_user:
+    if not decoded_token.get('uid'):
+        raise HTTPException(status_code=401, detail="Invalid Firebase token: missing uid")
+    return decoded_token
+
+
+def _create_user(session, uid: str, decoded_token: dict) -> User:
+    try:
+        new_user = User(
+            firebase_uid=uid, email=decoded_token.get('email'),
+            score=UserScore(), streak=UserStreak(),
+            subscription=UserSubscription()
+        )
+        session.add(new_user); session.commit(); session.refresh(new_user)
+        rank_index.set_score(new_user.id, 0)
+        return new_user
+    except IntegrityError:
+        session.rollback()
+        db_user = session.exec(select(User).where(User.firebase_uid == uid)).first()
+        if not db_user: raise HTTPException(status_code=500, detail="Could not retrieve user after race condition.")
         return db_user
-    else:
-        try:
-            new_user = User(
-                firebase_uid=uid, email=decoded_token.get('email'),
-                score=UserScore(), streak=UserStreak(),
-                subscription=UserSubscription()
-            )
-            session.add(new_user); session.commit(); session.refresh(new_user)
-            return new_user
-        except IntegrityError:
-            session.rollback()
-            db_user = session.exec(select(User).where(User.firebase_uid == uid)).first()
-            if not db_user: raise HTTPException(status_code=500, detail="Could not retrieve user after race condition.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create new user: {e}")
+
+
+def get_current_user(token: HTTPAuthorizationCredentials = Depends(token_auth_scheme), session = Depends(get_session)) -> User:
+    decoded_token = _verify_token(token.credentials)
+    uid = decoded_token['uid']
+    cached_id = _user_id_cache.get(uid)
+    if cached_id is not None:
+        db_user = session.get(User, cached_id)
+        if db_user and db_user.firebase_uid == uid:
             return db_user
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to create new user: {e}")
+        _user_id_cache.pop(uid)
+    db_user = session.exec(select(User).where(User.firebase_uid == uid)).first()
+    if not db_user:
+        db_user = _create_user(session, uid, decoded_token)
+    _user_id_cache.set(uid, db_user.id)
+    return db_user
+
+
+def _resolve_user_context(session, decoded_token: dict) -> UserContext:
+    uid = decoded_token['uid']
+    cached_id = _user_id_cache.get(uid)
+    if cached_id is not None:
+        ctx = load_user_context(session, user_id=cached_id)
+        if ctx and ctx.user.firebase_uid == uid:
+            return ctx
+        _user_id_cache.pop(uid)
+    ctx = load_user_context(session, firebase_uid=uid)
+    if not ctx:
+        new_user = _create_user(session, uid, decoded_token)
+        ctx = load_user_context(session, user_id=new_user.id)
+    _user_id_cache.set(uid, ctx.user.id)
+    return ctx
+
+
+def get_user_context(token: HTTPAuthorizationCredentials = Depends(token_auth_scheme), session = Depends(get_session)) -> UserContext:
+    """Like `get_current_user`, but loads the user's score, streak, subscription
+    and energy rows in the same query.
+    """
+    return _resolve_user_context(session, _verify_token(token.credentials))
+
+
+async def get_user_context_async(token: HTTPAuthorizationCredentials = Depends(token_auth_scheme), session = Depends(get_async_session)) -> UserContext:
+    """`get_user_context` for async routes; the rows are loaded through the
+    request's AsyncSession, which the route must keep using.
+    """
+    try:
+        decoded_token = await verify_id_token_async(token.credentials)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid Firebase token: {e}")
+    if not decoded_token.get('uid'):
+        raise HTTPException(status_code=401, detail="Invalid Firebase token: missing uid")
+    return await session.run_sync(_resolve_user_context, decoded_token)
@@ -0,0 +1,297 @@
+"""Compiled content bundle shared by all workers through mmap.
+
+`python -m server.bundle` compiles manual_info.json and manual_truefalse.json
+into one file (default data/content.bundle, or CONTENT_BUNDLE_PATH):
+
+    magic | u32 header length | JSON header | 8-byte aligned sections
+
+The header holds the catalog versions, summaries, category names and the
+offset of every section. Sections are u32/u16 arrays (category ids and
+per-category item indices) and string tables: a u32 offset array followed by
+the UTF-8 blob, one table per language for the texts and the pre-serialized
+true/false payloads, plus one with each item's raw JSON.
+
+The registry maps the file read-only when it was built from the current JSON
+files, so every worker shares the same page-cache pages and a lookup decodes
+only the string it returns. When CONTENT_BUNDLE_PATH is set, startup
+(`startup.prepare_database`) rebuilds a missing or stale bundle there; a
+bundle that can't be used falls back to parsing the JSON. Quiz questions stay in the database (see quiz_catalog).
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+MAGIC = b"SPKBND01"
+_ALIGN = 8
+
+
+def file_digest(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _layout() -> Dict:
+    return {"byteorder": sys.byteorder, "u32": array("I").itemsize, "u16": array("H").itemsize}
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+        self.sections: Dict[str, Dict] = {}
+
+    def add(self, name: str, data: bytes, **meta) -> None:
+        pad = -self.size % _ALIGN
+        if pad:
+            self.parts.append(b"\0" * pad)
+            self.size += pad
+        self.sections[name] = dict(meta, offset=self.size, length=len(data))
+        self.parts.append(data)
+        self.size += len(data)
+
+    def add_ints(self, name: str, values, typecode: str) -> None:
+        self.add(name, array(typecode, values).tobytes(), type=typecode, count=len(values))
+
+    def add_strings(self, name: str, strings: List[str]) -> None:
+        blobs = [s.encode("utf-8") for s in strings]
+        offsets = array("I", [0])
+        total = 0
+        for b in blobs:
+            total += len(b)
+            offsets.append(total)
+        self.add(name, offsets.tobytes() + b"".join(blobs), type="strings", count=len(blobs))
+
+
+def _text(texts, lang: str) -> str:
+    if isinstance(texts, dict):
+        v = texts.get(lang)
+        return v if isinstance(v, str) else ("" if v is None else str(v))
+    return str(texts or "") if lang == "en" else ""
+
+
+def _add_catalog(w: _Writer, name: str, items: List[Dict], text_key: str, default_category: Optional[str]) -> Dict:
+    from .content import _content_version, _index_catalog
+    by_category, item_langs, summary = _index_catalog(items, text_key, default_category)
+    categories = list(by_category)
+    if len(categories) > 0xFFFF:
+        raise ValueError(f"{name}: too many categories")
+    cat_ids = {c: i for i, c in enumerate(categories)}
+    w.add_ints(f"{name}/category_ids", [cat_ids[it.get("category", default_category)] for it in items], "H")
+    for i, c in enumerate(categories):
+        w.add_ints(f"{name}/by_category/{i}", by_category[c], "I")
+    w.add_strings(f"{name}/raw", [json.dumps(it, ensure_ascii=False, separators=(",", ":")) for it in items])
+    languages = sorted({lang for langs in item_langs for lang in langs} | {"en"})
+    for lang in languages:
+        w.add_strings(f"{name}/text/{lang}", [_text(it.get(text_key), lang) for it in items])
+    return {
+        "count": len(items),
+        "version": _content_version(items),
+        "summary": summary,
+        "categories": categories,
+        "languages": languages,
+    }
+
+
+def build_bundle(infos: List[Dict], truefalse: List[Dict], out_path: str, sources: Dict[str, Optional[str]]) -> Dict:
+    """Write the bundle atomically (temp file + rename) and return its header.
+    `sources` maps catalog name to the sha1 of the JSON file it was built from.
+    """
+    from .content import _build_truefalse_payloads
+    w = _Writer()
+    catalogs = {
+        "infos": _add_catalog(w, "infos", infos, "info_texts", None),
+        "truefalse": _add_catalog(w, "truefalse", truefalse, "question", "General"),
+    }
+    w.add_strings("infos/source", [it.get("source") or "" for it in infos])
+    payloads = _build_truefalse_payloads(truefalse)
+    catalogs["truefalse"]["payload_languages"] = sorted(payloads)
+    for lang, rows in payloads.items():
+        w.add_strings(f"truefalse/payload/{lang}", rows)
+    header = {"layout": _layout(), "sources": sources, "catalogs": catalogs, "sections": w.sections}
+    raw_header = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    prefix = MAGIC + len(raw_header).to_bytes(4, "little") + raw_header
+    prefix += b"\0" * (-len(prefix) % _ALIGN)
+    tmp = f"{out_path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(prefix)
+        for part in w.parts:
+            f.write(part)
+    os.replace(tmp, out_path)
+    return header
+
+
+class StringTable(Sequence):
+    """Read-only list of strings backed by the mapped file; indexing decodes one string."""
+    __slots__ = ("_buf", "_offsets", "_base", "_n")
+
+    def __init__(self, buf: memoryview, offset: int, count: int):
+        end = offset + 4 * (count + 1)
+        self._buf = buf
+        self._offsets = buf[offset:end].cast("I")
+        self._base = end
+        self._n = count
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return str(self._buf[self._base + self._offsets[i]:self._base + self._offsets[i + 1]], "utf-8")
+
+
+class _RawItems(Sequence):
+    """Catalog items as dicts, each decoded from its own JSON on access."""
+    __slots__ = ("_table",)
+
+    def __init__(self, table: StringTable):
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [json.loads(s) for s in self._table[i]]
+        return json.loads(self._table[i])
+
+
+class Bundle:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: not a content bundle")
+        n = int.from_bytes(buf[len(MAGIC):len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        self.header = json.loads(str(buf[start:start + n], "utf-8"))
+        if self.header.get("layout") != _layout():
+            raise ValueError(f"{path}: built for a different platform")
+        base = start + n
+        self._data = buf[base + (-base % _ALIGN):]
+        self.path = path
+        self.sources = self.header.get("sources", {})
+
+    def _section(self, name: str) -> Dict:
+        return self.header["sections"][name]
+
+    def strings(self, name: str) -> StringTable:
+        s = self._section(name)
+        return StringTable(self._data, s["offset"], s["count"])
+
+    def ints(self, name: str) -> memoryview:
+        s = self._section(name)
+        return self._data[s["offset"]:s["offset"] + s["length"]].cast(s["type"])
+
+
+class _BundleCatalog:
+    backend = "bundle"
+
+    def __init__(self, bundle: Bundle, name: str):
+        meta = bundle.header["catalogs"][name]
+        self.version = meta["version"]
+        self.summary = meta["summary"]
+        self.raw = bundle.strings(f"{name}/raw")
+        self.items = _RawItems(self.raw)
+        self._texts = {lang: bundle.strings(f"{name}/text/{lang}") for lang in meta["languages"]}
+        self._categories = meta["categories"]
+        self._category_ids = bundle.ints(f"{name}/category_ids")
+        # memoryview slices: random.sample and slicing work on them directly
+        self.by_category = {c: bundle.ints(f"{name}/by_category/{i}") for i, c in enumerate(self._categories)}
+        self._languages = None
+
+    @property
+    def languages(self) -> List[List[str]]:
+        if self._languages is None:
+            self._languages = [[lang for lang, t in self._texts.items() if t[i]] or ["en"] for i in range(len(self.items))]
+        return self._languages
+
+    def text(self, i: int, lang: str) -> str:
+        table = self._texts.get(lang)
+        return (table[i] if table is not None else "") or self._texts["en"][i]
+
+    def category(self, i: int):
+        return self._categories[self._category_ids[i]]
+
+
+class BundleInfoCatalog(_BundleCatalog):
+    def __init__(self, bundle: Bundle):
+        super().__init__(bundle, "infos")
+        self._sources = bundle.strings("infos/source")
+
+    def source(self, i: int) -> Optional[str]:
+        return self._sources[i] or None
+
+
+class BundleTrueFalseCatalog(_BundleCatalog):
+    def __init__(self, bundle: Bundle):
+        super().__init__(bundle, "truefalse")
+        langs = bundle.header["catalogs"]["truefalse"]["payload_languages"]
+        self.payloads = {lang: bundle.strings(f"truefalse/payload/{lang}") for lang in langs}
+        self.legacy_bodies: Dict = {}
+
+
+def open_bundle(path: str) -> Bundle:
+    return Bundle(path)
+
+
+def read_sources(path: str) -> Optional[Dict]:
+    """The JSON digests a bundle was built from, reading only its header."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            n = int.from_bytes(f.read(4), "little")
+            return json.loads(f.read(n).decode("utf-8")).get("sources")
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_bundle(out: Optional[str] = None, info_path: Optional[str] = None, truefalse_path: Optional[str] = None, force: bool = False) -> str:
+    """Rebuild the bundle when it is missing or was built from other versions
+    of the JSON files. Returns "fresh", "built" or "unavailable" (a content
+    file can't be read).
+    """
+    from .content import bundle_path, info_path_candidates, truefalse_path_candidates, _resolve, _read_list
+    info_src = _resolve(info_path_candidates(info_path))
+    tf_src = _resolve(truefalse_path_candidates(truefalse_path))
+    out = out or bundle_path()
+    digests = {"infos": file_digest(info_src), "truefalse": file_digest(tf_src)}
+    if not force and read_sources(out) == digests:
+        return "fresh"
+    infos, tf = _read_list(info_src), _read_list(tf_src)
+    if infos is None or tf is None:
+        print(f"Could not read the content files ({info_src}, {tf_src})")
+        return "unavailable"
+    header = build_bundle(infos, tf, out, digests)
+    print(f"Wrote {out}: {os.path.getsize(out)} bytes, {len(infos)} infos, {len(tf)} true/false, {len(header['sections'])} sections")
+    return "built"
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Compile the content catalogs into a memory-mappable bundle.")
+    p.add_argument("--out", help="default: CONTENT_BUNDLE_PATH or data/content.bundle")
+    p.add_argument("--infos", help="manual_info.json to compile")
+    p.add_argument("--truefalse", help="manual_truefalse.json to compile")
+    args = p.parse_args(argv)
+    return 0 if ensure_bundle(args.out, args.infos, args.truefalse, force=True) == "built" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
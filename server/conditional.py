@@ -0,0 +1,45 @@
+"""ETag / If-None-Match helpers for the cacheable read endpoints.
+
+Content-derived responses get strong ETags built from the content version
+(plus whatever else shapes the body), the leaderboard gets weak ones from its
+generation counter. A request whose If-None-Match matches is answered with a
+bodyless 304 that repeats the validator and Cache-Control.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def strong_etag(*parts) -> str:
+    raw = ":".join(str(p) for p in parts).encode("utf-8")
+    return '"%s"' % hashlib.sha1(raw).hexdigest()[:20]
+
+
+def weak_etag(*parts) -> str:
+    return "W/" + strong_etag(*parts)
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/"x" matches "x"."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    want = _opaque(etag)
+    return any(_opaque(t) == want for t in header.split(","))
+
+
+def cache_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
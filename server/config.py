@@ -1,13 +1,50 @@
 import os
 import json
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Async driver URL for the async routes; derived from DATABASE_URL when unset
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+# Engine profile (see db.ENGINE_PROFILES): "default" keeps SQLAlchemy's pool defaults,
+# "web"/"worker" are opt-in; DB_POOL_* / DB_STATEMENT_TIMEOUT_MS override single settings
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
+
+def _read_project_id() -> Optional[str]:
+    """Firebase project id used to check the `aud`/`iss` of ID tokens locally.
+    Falls back to the `project_id` of the service-account file.
+    """
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if project_id or not GOOGLE_APPLICATION_CREDENTIALS:
+        return project_id
+    try:
+        with open(GOOGLE_APPLICATION_CREDENTIALS, "r", encoding="utf-8") as f:
+            return json.load(f).get("project_id")
+    except Exception:
+        return None
+
+
+FIREBASE_PROJECT_ID = _read_project_id()
+# Bounded caches for verified token claims and firebase_uid -> user id lookups
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_ID_CACHE_SIZE = int(os.getenv("USER_ID_CACHE_SIZE", "50000"))
+USER_ID_CACHE_TTL = float(os.getenv("USER_ID_CACHE_TTL", "3600"))
+# Parsed (question_id, lang) entries; the TTL lets other workers pick up reseeded content
+QUIZ_CATALOG_SIZE = int(os.getenv("QUIZ_CATALOG_SIZE", "20000"))
+QUIZ_CATALOG_TTL = float(os.getenv("QUIZ_CATALOG_TTL", "3600"))
+# In-memory leaderboard size and how often it is rebuilt from the database
+LEADERBOARD_TOP_K = int(os.getenv("LEADERBOARD_TOP_K", "200"))
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "30"))
+# Full resync interval of the in-memory score rank index
+RANK_INDEX_REFRESH_SECONDS = float(os.getenv("RANK_INDEX_REFRESH_SECONDS", "300"))
+
 # Subscription limits
 SUBSCRIPTION_LIMITS = {
     "free": {"quiz_limit": 3, "challenge_limit": 3},
@@ -52,68 +89,54 @@ TRANSLATIONS = {
 }
 
 NOTIFICATION_FREQUENCY = {"free": 1, "pro": 2, "ultra": 3}
+# Concurrent multicast batches in flight during a notification scan
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "8"))
+# Request/DB/Firebase metrics served at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+# Threads reserved for blocking Firebase calls made from async handlers
+FIREBASE_WORKERS = int(os.getenv("FIREBASE_WORKERS", "4"))
+# Users per checkpointed chunk of the notification scan, and how long a running
+# scan may go without a checkpoint before another trigger resumes it
+SCAN_CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", "500"))
+SCAN_STALE_SECONDS = float(os.getenv("SCAN_STALE_SECONDS", "300"))
+# "fast" skips create_all, compat probes and seeding when the stored schema/content
+# stamp matches (see server/startup.py); "full" always runs them
+STARTUP_MODE = os.getenv("STARTUP_MODE", "fast").lower()
+# Poll interval of the data/ file watcher that hot-reloads the content catalogs (0 = off).
+# Every worker runs its own watcher, which is what keeps them on the same content version.
+CONTENT_RELOAD_SECONDS = float(os.getenv("CONTENT_RELOAD_SECONDS", "30"))
+# Compiled catalogs built by `python -m server.bundle` (default data/content.bundle);
+# when set, startup also (re)builds the bundle here if it is missing or stale
+CONTENT_BUNDLE_PATH = os.getenv("CONTENT_BUNDLE_PATH")
+# max-age of the public, content-derived responses (/quiz/localize/); they carry
+# ETags, so clients and CDNs revalidate with If-None-Match after that
+CONTENT_CACHE_MAX_AGE = int(os.getenv("CONTENT_CACHE_MAX_AGE", "300"))
+# Rows per multi-row INSERT/UPDATE (or COPY) when seeding content
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "1000"))
 
-# runtime-loaded manual infos
-MANUAL_INFOS: List[Dict] = []
-# runtime-loaded manual true/false questions
-MANUAL_TRUEFALSE: List[Dict] = []
-
-def load_manual_infos(path: str = "data/manual_info.json"):
-    global MANUAL_INFOS
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            MANUAL_INFOS = json.load(f)
-            if not isinstance(MANUAL_INFOS, list):
-                MANUAL_INFOS = []
-    except Exception as e:
-        print(f"Failed to load {path}: {e}")
-        MANUAL_INFOS = []
+_firebase_ready = False
+_firebase_lock = threading.Lock()
 
 
-def load_manual_truefalse(path: str = "data/manual_truefalse.json"):
-    """Load the manual true/false JSON from disk for runtime use.
-    The file is expected to be located at the repository root `data/` directory.
+def init_firebase() -> None:
+    """Initialize Firebase Admin on first use rather than at import, so workers
+    that never verify through firebase_admin or send pushes don't pay for it.
+    Callers on other threads wait until the default app exists; a failed
+    initialization is retried by the next call.
     """
-    global MANUAL_TRUEFALSE
-    # Allow override via environment variable for debugging or deployed setups
-    env_path = os.getenv('MANUAL_TRUEFALSE_PATH')
-    candidates = [
-        path,
-        os.path.abspath(path),
-        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'manual_truefalse.json'),
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'manual_truefalse.json'),
-        os.path.join(os.getcwd(), 'data', 'manual_truefalse.json'),
-    ]
-    if env_path:
-        candidates.insert(0, env_path)
-    loaded = False
-    for p in candidates:
+    global _firebase_ready
+    if _firebase_ready:
+        return
+    with _firebase_lock:
+        if _firebase_ready:
+            return
         try:
-            if not os.path.exists(p):
-                continue
-            with open(p, "r", encoding="utf-8") as f:
-                loaded_list = json.load(f)
-                if not isinstance(loaded_list, list):
-                    continue
-                # mutate existing list object so other modules that imported it see updates
-                MANUAL_TRUEFALSE.clear()
-                MANUAL_TRUEFALSE.extend(loaded_list)
-                loaded = True
-                break
-        except Exception:
-            # intentionally silent to avoid noisy logs in normal operation
-            continue
-    if not loaded:
-        MANUAL_TRUEFALSE.clear()
-
-
-# Try initializing Firebase Admin if credentials path provided
-try:
-    if GOOGLE_APPLICATION_CREDENTIALS:
-        import firebase_admin
-        from firebase_admin import credentials
-        cred = credentials.Certificate(GOOGLE_APPLICATION_CREDENTIALS)
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred)
-except Exception as e:
-    print(f"Warning: Firebase Admin initialization failed: {e}")
+            if GOOGLE_APPLICATION_CREDENTIALS:
+                import firebase_admin
+                from firebase_admin import credentials
+                cred = credentials.Certificate(GOOGLE_APPLICATION_CREDENTIALS)
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app(cred)
+            _firebase_ready = True
+        except Exception as e:
+            print(f"Warning: Firebase Admin initialization failed: {e}")
@@ -0,0 +1,335 @@
+"""Versioned, immutable content catalogs with hot reload.
+
+`registry.current` is a `ContentSnapshot` holding the parsed infos and
+true/false questions plus every index built from them. A reload parses and
+indexes the files into a brand-new snapshot on a background thread and then
+publishes it with a single reference assignment, so a request that reads
+`registry.current` once sees one complete catalog from start to finish and
+never waits for parsing. A reload that fails keeps the previous snapshot.
+
+Every process runs a watcher polling the files' size and mtime every
+CONTENT_RELOAD_SECONDS (30 by default), so all uvicorn workers pick up a
+content change within one interval and serve the same version; anything keyed
+on `infos.version` (e.g. UserSeenInfoBits) would otherwise flip between
+workers. `POST /admin/content/reload/` reloads only the process that handles
+it, to apply a change right away or retry a failed load there. Setting
+CONTENT_RELOAD_SECONDS=0 disables the watcher; every worker then keeps its
+content until it restarts.
+When a compiled bundle (server/bundle.py) matching the JSON files exists, the
+catalogs are mapped from it instead of parsed; startup rebuilds it when
+CONTENT_BUNDLE_PATH is set, and /debug/startup/ shows which backend is in use.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import CONTENT_BUNDLE_PATH, CONTENT_RELOAD_SECONDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _content_version(items) -> str:
+    raw = json.dumps(items, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def _index_catalog(items: List[Dict], text_key: str, default_category: Optional[str] = None) -> Tuple[Dict[str, List[int]], List[List[str]], Dict]:
+    """category -> item indices, the languages each item has text for, and the
+    category/language count summary.
+    """
+    by_category: Dict[str, List[int]] = {}
+    item_langs: List[List[str]] = []
+    lang_counts: Dict[str, int] = {}
+    for i, it in enumerate(items):
+        by_category.setdefault(it.get("category", default_category), []).append(i)
+        texts = it.get(text_key)
+        langs = sorted(k for k, v in texts.items() if v) if isinstance(texts, dict) else ["en"]
+        item_langs.append(langs)
+        for lang in langs:
+            lang_counts[lang] = lang_counts.get(lang, 0) + 1
+    summary = {
+        "total": len(items),
+        "categories": [{"category": c, "count": len(ix)} for c, ix in sorted(by_category.items(), key=lambda kv: (-len(kv[1]), str(kv[0])))],
+        "languages": dict(sorted(lang_counts.items())),
+    }
+    return by_category, item_langs, summary
+
+
+def _build_truefalse_payloads(items: List[Dict]) -> Dict[str, List[str]]:
+    """Project every true/false item onto each available language and serialize
+    it once (`lang -> [json str]`, aligned with the items), so requests only
+    have to pick and join strings.
+    """
+    langs = {"en"}
+    for it in items:
+        q = it.get("question")
+        if isinstance(q, dict):
+            langs.update(q.keys())
+    payloads: Dict[str, List[str]] = {lang: [] for lang in langs}
+    for i, it in enumerate(items):
+        q = it.get("question")
+        q = q if isinstance(q, dict) else {"en": q or ""}
+        category = it.get("category", "General")
+        for lang in langs:
+            payloads[lang].append(json.dumps({
+                "id": i,
+                "category": category,
+                "question_text": q.get(lang) or q.get("en") or "",
+                "correct_answer": bool(it.get("correct_answer", False)),
+            }, ensure_ascii=False, separators=(",", ":")))
+    return payloads
+
+
+class InfoCatalog:
+    """Infos parsed from JSON; `bundle.BundleInfoCatalog` has the same interface."""
+    backend = "json"
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.version = _content_version(items)
+        self.by_category, self.languages, self.summary = _index_catalog(items, "info_texts")
+
+    def text(self, i: int, lang: str) -> str:
+        texts = self.items[i].get("info_texts")
+        if not isinstance(texts, dict):
+            return ""
+        return texts.get(lang) or texts.get("en") or ""
+
+    def category(self, i: int):
+        return self.items[i].get("category")
+
+    def source(self, i: int) -> Optional[str]:
+        return self.items[i].get("source")
+
+
+class TrueFalseCatalog:
+    backend = "json"
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.version = _content_version(items)
+        self.payloads = _build_truefalse_payloads(items)
+        # each item serialized once, for the unprojected list (see legacy_truefalse_body)
+        self.raw = [json.dumps(it, ensure_ascii=False, separators=(",", ":")) for it in items]
+        self.legacy_bodies: Dict = {}
+        self.by_category, self.languages, self.summary = _index_catalog(items, "question", "General")
+
+
+def legacy_truefalse_body(catalog, session_seconds) -> str:
+    """The unprojected /manual/truefalse/ body, every item plus the
+    `session_seconds` hint, joined from the serialized items once per catalog
+    and hint value.
+    """
+    body = catalog.legacy_bodies.get(session_seconds)
+    if body is None:
+        extra = '"session_seconds":%s}' % json.dumps(session_seconds)
+        body = "[%s]" % ",".join(r[:-1] + ("," if r != "{}" else "") + extra for r in catalog.raw)
+        catalog.legacy_bodies[session_seconds] = body
+    return body
+
+
+class ContentSnapshot:
+    """One published catalog generation. Treat everything in it as read-only."""
+
+    def __init__(self, infos: InfoCatalog, truefalse: TrueFalseCatalog, generation: int, sources: Dict[str, Optional[str]]):
+        self.infos = infos
+        self.truefalse = truefalse
+        self.generation = generation
+        self.sources = sources
+        self.version = hashlib.sha1(f"{infos.version}:{truefalse.version}".encode("utf-8")).hexdigest()[:16]
+        self.loaded_at = time.time()
+
+    def status(self) -> Dict:
+        return {
+            "version": self.version,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "infos": {"version": self.infos.version, "count": len(self.infos.items), "source": self.sources.get("infos"), "backend": self.infos.backend},
+            "truefalse": {"version": self.truefalse.version, "count": len(self.truefalse.items), "source": self.sources.get("truefalse"), "backend": self.truefalse.backend},
+        }
+
+
+def info_path_candidates(path: Optional[str] = None) -> List[str]:
+    candidates = [os.getenv("MANUAL_INFO_PATH"), path, "data/manual_info.json", os.path.join(REPO_ROOT, "data", "manual_info.json")]
+    return [p for p in candidates if p]
+
+
+def truefalse_path_candidates(path: Optional[str] = None) -> List[str]:
+    # MANUAL_TRUEFALSE_PATH overrides for debugging or deployed setups
+    candidates = [
+        os.getenv("MANUAL_TRUEFALSE_PATH"),
+        path,
+        os.path.join(REPO_ROOT, "data", "manual_truefalse.json"),
+        os.path.join(os.getcwd(), "data", "manual_truefalse.json"),
+    ]
+    return [p for p in candidates if p]
+
+
+def _resolve(candidates: List[str]) -> Optional[str]:
+    """First candidate that exists; a broken file must not silently fall back
+    to another copy, so resolution doesn't look at the contents.
+    """
+    for p in candidates:
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def _read_list(path: Optional[str]) -> Optional[List[Dict]]:
+    """Items of the JSON list at `path`; None when it is missing or unreadable."""
+    if not path:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Failed to load {path}: {e}")
+        return None
+    return data if isinstance(data, list) else None
+
+
+def bundle_path() -> str:
+    return CONTENT_BUNDLE_PATH or os.path.join(REPO_ROOT, "data", "content.bundle")
+
+
+def _stat(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except (OSError, TypeError):
+        return None
+
+
+def _open_bundle(path: str, info_src: Optional[str], tf_src: Optional[str]):
+    """(infos, truefalse) catalogs mapped from the bundle, or None when it is
+    missing, unreadable or was built from other versions of the JSON files.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        from .bundle import BundleInfoCatalog, BundleTrueFalseCatalog, file_digest, open_bundle
+        bundle = open_bundle(path)
+        if bundle.sources != {"infos": file_digest(info_src), "truefalse": file_digest(tf_src)}:
+            print(f"{path} is stale; parsing the JSON files (rebuild with python -m server.bundle)")
+            return None
+        return BundleInfoCatalog(bundle), BundleTrueFalseCatalog(bundle)
+    except Exception as e:
+        print(f"Could not use content bundle {path}: {e}")
+        return None
+
+
+class ContentRegistry:
+    def __init__(self):
+        self._current = ContentSnapshot(InfoCatalog([]), TrueFalseCatalog([]), 0, {})
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self._info_path: Optional[str] = None
+        self._truefalse_path: Optional[str] = None
+        # path and (mtime, size) of the files the last load read, for the watcher
+        self._watched: Dict[str, Tuple[Optional[str], Optional[Tuple[int, int]]]] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> ContentSnapshot:
+        return self._current
+
+    def publish(self, infos: Optional[List[Dict]] = None, truefalse: Optional[List[Dict]] = None, sources: Optional[Dict] = None) -> ContentSnapshot:
+        """Build a snapshot from in-memory lists (None keeps the current catalog)
+        and swap it in.
+        """
+        with self._reload_lock:
+            return self._publish(infos, truefalse, sources)
+
+    def _publish(self, infos, truefalse, sources) -> ContentSnapshot:
+        # each of infos/truefalse: a list to index, a ready catalog, or None to keep the current one
+        old = self._current
+        info_cat = old.infos if infos is None else InfoCatalog(list(infos)) if isinstance(infos, list) else infos
+        tf_cat = old.truefalse if truefalse is None else TrueFalseCatalog(list(truefalse)) if isinstance(truefalse, list) else truefalse
+        snap = ContentSnapshot(info_cat, tf_cat, old.generation + 1, dict(old.sources, **(sources or {})))
+        self._current = snap
+        return snap
+
+    def load(self, info_path: Optional[str] = None, truefalse_path: Optional[str] = None, initial: bool = False) -> ContentSnapshot:
+        """Load both catalogs and publish them as one new snapshot: from the
+        compiled bundle when it matches the JSON files, by parsing the JSON
+        otherwise. On the first load a missing file yields an empty catalog;
+        later reloads keep the previous catalog for a file that can't be read.
+        """
+        with self._reload_lock:
+            self._reloading = True
+            try:
+                self._info_path = info_path or self._info_path
+                self._truefalse_path = truefalse_path or self._truefalse_path
+                info_src = _resolve(info_path_candidates(self._info_path))
+                tf_src = _resolve(truefalse_path_candidates(self._truefalse_path))
+                bundle_file = bundle_path()
+                self._watched = {
+                    "infos": (info_src, _stat(info_src)),
+                    "truefalse": (tf_src, _stat(tf_src)),
+                    "bundle": (bundle_file, _stat(bundle_file)),
+                }
+                catalogs = _open_bundle(bundle_file, info_src, tf_src)
+                if catalogs is not None:
+                    infos, tf = catalogs
+                else:
+                    infos, tf = _read_list(info_src), _read_list(tf_src)
+                    if initial:
+                        infos, tf = infos or [], tf or []
+                self.last_error = None if (infos is not None and tf is not None) else "content file missing or unreadable"
+                sources = {}
+                if infos is not None:
+                    sources["infos"] = info_src
+                if tf is not None:
+                    sources["truefalse"] = tf_src
+                return self._publish(infos, tf, sources)
+            finally:
+                self._reloading = False
+
+    def reload_in_background(self) -> bool:
+        """Start a reload on a daemon thread; False if one is already running."""
+        if self._reloading:
+            return False
+        threading.Thread(target=self._safe_load, name="content-reload", daemon=True).start()
+        return True
+
+    def _safe_load(self) -> None:
+        try:
+            self.load()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Content reload failed: {e}")
+
+    def changed_on_disk(self) -> bool:
+        return any(_stat(path) != stat for path, stat in self._watched.values())
+
+    def start_watcher(self, interval: float = CONTENT_RELOAD_SECONDS) -> None:
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(interval):
+                if self.changed_on_disk():
+                    self._safe_load()
+
+        self._watcher = threading.Thread(target=_run, name="content-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict:
+        out = self._current.status()
+        out["pid"] = os.getpid()
+        out["watching"] = self._watcher is not None and self._watcher.is_alive() and not self._stop.is_set()
+        out["reloading"] = self._reloading
+        out["last_error"] = self.last_error
+        return out
+
+
+registry = ContentRegistry()
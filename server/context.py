@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlmodel import select
+
+from .models import User, UserScore, UserStreak, UserSubscription, UserEnergy
+
+
+@dataclass
+class UserContext:
+    """Per-request snapshot of a user's state, loaded once and shared by the
+    route and helpers such as `_get_user_access_level`.
+    """
+    user: User
+    score: Optional[UserScore] = None
+    streak: Optional[UserStreak] = None
+    subscription: Optional[UserSubscription] = None
+    energy: Optional[UserEnergy] = None
+
+
+def load_user_context(session, user_id: Optional[int] = None, firebase_uid: Optional[str] = None) -> Optional[UserContext]:
+    """Fetch User, score, streak, subscription and energy with one outer-joined query."""
+    stmt = (
+        select(User, UserScore, UserStreak, UserSubscription, UserEnergy)
+        .join(UserScore, UserScore.user_id == User.id, isouter=True)
+        .join(UserStreak, UserStreak.user_id == User.id, isouter=True)
+        .join(UserSubscription, UserSubscription.user_id == User.id, isouter=True)
+        .join(UserEnergy, UserEnergy.user_id == User.id, isouter=True)
+    )
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    elif firebase_uid is not None:
+        stmt = stmt.where(User.firebase_uid == firebase_uid)
+    else:
+        raise ValueError("user_id or firebase_uid is required")
+    row = session.exec(stmt).first()
+    if not row:
+        return None
+    user, score, streak, sub, energy = row
+    return UserContext(user=user, score=score, streak=streak, subscription=sub, energy=energy)
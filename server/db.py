@@ -1,17 +1,272 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from sqlmodel import create_engine, Session, SQLModel
-from .config import DATABASE_URL
+from starlette.concurrency import run_in_threadpool
+from .metrics import instrument_engine
+from .config import DATABASE_URL, ASYNC_DATABASE_URL, DB_PROFILE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE
+
+# Pool settings per deployment role. "default" keeps SQLAlchemy's own defaults;
+# "web" sizes the pool for the request threadpool and fails fast when it is
+# exhausted; "worker" is for scans/seeders that run few, long statements.
+ENGINE_PROFILES: Dict[str, Dict] = {
+    "default": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_recycle": -1, "pool_pre_ping": False, "statement_timeout_ms": None},
+    "web": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True, "statement_timeout_ms": 15000},
+    "worker": {"pool_size": 2, "max_overflow": 2, "pool_timeout": 60, "pool_recycle": 1800, "pool_pre_ping": True, "statement_timeout_ms": 300000},
+}
+
+_ENV_OVERRIDES = {
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", lambda v: v.lower() in ("1", "true", "yes")),
+    "statement_timeout_ms": ("DB_STATEMENT_TIMEOUT_MS", int),
+}
+
+
+def engine_profile(name: Optional[str] = None) -> Dict:
+    profile = dict(ENGINE_PROFILES.get(name or DB_PROFILE) or ENGINE_PROFILES["default"])
+    for key, (env, cast) in _ENV_OVERRIDES.items():
+        raw = os.getenv(env)
+        if raw:
+            try:
+                profile[key] = cast(raw)
+            except ValueError:
+                print(f"Warning: ignoring invalid {env}={raw!r}")
+    return profile
+
+
+class PoolStats:
+    """Connection acquisition counters, fed by `_TimedQueuePool`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquired += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_seconds_avg": round(self.wait_total / self.acquired, 6) if self.acquired else 0.0,
+            }
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+class _TimedPoolMixin:
+    """Records how long each checkout waited (including opening a new connection)."""
+    stats = pool_stats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+
+class _TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class _TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    stats = async_pool_stats
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _install_connect_hooks(engine, profile: Dict):
+    backend = engine.url.get_backend_name()
+    timeout_ms = profile.get("statement_timeout_ms")
+
+    if backend == "sqlite":
+        memory = _is_memory_sqlite(engine.url)
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                if not memory:
+                    cur.execute("PRAGMA journal_mode=WAL")
+                    cur.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+                cur.execute("PRAGMA synchronous=NORMAL")
+                cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+            finally:
+                cur.close()
+    elif backend == "mysql" and timeout_ms:
+        @event.listens_for(engine, "connect")
+        def _mysql_timeout(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                cur.execute(f"SET SESSION MAX_EXECUTION_TIME={int(timeout_ms)}")
+            finally:
+                cur.close()
+
+
+def _pool_kwargs(profile: Dict) -> Dict:
+    return {
+        "pool_size": profile["pool_size"],
+        "max_overflow": profile["max_overflow"],
+        "pool_timeout": profile["pool_timeout"],
+        "pool_recycle": profile["pool_recycle"],
+        "pool_pre_ping": profile["pool_pre_ping"],
+    }
+
+
+def build_engine(url: str, profile_name: Optional[str] = None, echo: bool = False):
+    """Create an engine for `url` using the named (or configured) profile."""
+    profile = engine_profile(profile_name)
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    kwargs: Dict = {"echo": echo}
+    connect_args: Dict = {}
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+    if _is_memory_sqlite(parsed):
+        # one shared connection, otherwise every thread would see its own empty database
+        kwargs["poolclass"] = StaticPool
+    else:
+        kwargs.update(poolclass=_TimedQueuePool, **_pool_kwargs(profile))
+        if backend == "postgresql" and profile.get("statement_timeout_ms"):
+            connect_args["options"] = f"-c statement_timeout={int(profile['statement_timeout_ms'])}"
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    engine = create_engine(url, **kwargs)
+    _install_connect_hooks(engine, profile)
+    return engine
+
+
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+
+def async_url_for(url: str) -> Optional[str]:
+    """Async-driver variant of a sync database URL, or None if unsupported."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or _is_memory_sqlite(parsed):
+        # an in-memory database lives in the sync engine's connection only
+        return None
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def build_async_engine(url: Optional[str], profile_name: Optional[str] = None, echo: bool = False):
+    """Create the AsyncEngine, or return None when there is no async driver."""
+    if not url:
+        return None
+    from sqlalchemy.ext.asyncio import create_async_engine
+    profile = engine_profile(profile_name)
+    parsed = make_url(url)
+    kwargs: Dict = {"echo": echo, "poolclass": _TimedAsyncQueuePool, **_pool_kwargs(profile)}
+    if parsed.get_backend_name() == "postgresql" and profile.get("statement_timeout_ms"):
+        kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(int(profile["statement_timeout_ms"]))}}
+    try:
+        eng = create_async_engine(url, **kwargs)
+    except ImportError as e:
+        print(f"Warning: async database driver unavailable ({e}); async routes use the threadpool")
+        return None
+    _install_connect_hooks(eng.sync_engine, profile)
+    return eng
+
+
+def _queue_pool_status(pool) -> Dict:
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": pool._max_overflow,
+    }
+
+
+def get_pool_status(eng=None) -> Dict:
+    """Current pool occupancy plus cumulative checkout wait statistics."""
+    pool = (eng or engine).pool
+    out = {"pool": type(pool).__name__, "profile": DB_PROFILE}
+    out.update(_queue_pool_status(pool))
+    out.update(pool_stats.snapshot())
+    if eng is None and async_engine is not None:
+        apool = async_engine.pool
+        out["async"] = {"pool": type(apool).__name__, **_queue_pool_status(apool), **async_pool_stats.snapshot()}
+    return out
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+engine = build_engine(DATABASE_URL)
+async_engine = build_async_engine(ASYNC_DATABASE_URL or async_url_for(DATABASE_URL))
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+
+class ThreadedSession:
+    """Stand-in for AsyncSession when no async engine is available: `run_sync`
+    runs the callable with a regular Session in the threadpool.
+    """
+
+    def __init__(self):
+        self.sync_session = Session(engine)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_async_session():
+    """Per-request AsyncSession. Handlers run their ORM work through
+    `await session.run_sync(fn, ...)`, so the sync helpers are shared with the
+    blocking routes.
+    """
+    if async_engine is None:
+        session = ThreadedSession()
+        try:
+            yield session
+        finally:
+            await session.close()
+        return
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    async with AsyncSession(async_engine) as session:
+        yield session
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
-def _ensure_schema_compat():
-    # lightweight compat helper retained from monolith
+def _ensure_schema_compat() -> bool:
+    # lightweight compat helper retained from monolith; False if a step failed
     from sqlalchemy import text
     with engine.connect() as conn:
         try:
@@ -39,3 +294,36 @@ def _ensure_schema_compat():
                 conn.execute(text("ALTER TABLE devicetoken ADD COLUMN last_seen DATE DEFAULT NULL"))
             except Exception:
                 pass
+
+    return _ensure_content_columns()
+
+
+def _ensure_content_columns(eng=None) -> bool:
+    """content_key/content_hash/retired used by the incremental seeder
+    (server/ingest.py). The key index is unique so concurrent seeders can't
+    insert an item twice.
+    """
+    from sqlalchemy import inspect, text
+    eng = eng or engine
+    ok = True
+    for table in ("quizquestion", "truefalsequestion", "dailyinfo"):
+        try:
+            with eng.begin() as conn:
+                insp = inspect(conn)
+                cols = {c["name"] for c in insp.get_columns(table)}
+                if "content_key" not in cols:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN content_key VARCHAR"))
+                if "content_hash" not in cols:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN content_hash VARCHAR"))
+                if "retired" not in cols:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN retired BOOLEAN NOT NULL DEFAULT FALSE"))
+                index = next((ix for ix in insp.get_indexes(table) if ix["column_names"] == ["content_key"]), None)
+                if index is None or not index["unique"]:
+                    if index is not None:
+                        conn.execute(text(f"DROP INDEX {index['name']}"))
+                    conn.execute(text(f"CREATE UNIQUE INDEX ix_{table}_content_key ON {table} (content_key)"))
+        except Exception as e:
+            # e.g. duplicate keys from an earlier race; the next seed retires them
+            print(f"Could not update content columns of {table}: {e}")
+            ok = False
+    return ok
@@ -0,0 +1,77 @@
+"""Atomic energy accounting.
+
+Energy used to be handled as read-modify-write across several commits, which
+cost extra round trips and let concurrent taps spend the same energy twice.
+`consume_energy` folds the lazy daily reset and the guarded decrement into one
+conditional UPDATE (with RETURNING where the dialect supports it), so the
+database serializes concurrent spends.
+"""
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import case, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from .models import UserEnergy
+
+
+def effective_remaining_energy(user_energy: Optional[UserEnergy], energy_per_day: int, today: Optional[date] = None) -> int:
+    """Remaining energy as of `today` without writing: a missing row or a row
+    last reset before today counts as a full tank.
+    """
+    today = today or date.today()
+    if user_energy is None or not user_energy.last_reset or user_energy.last_reset < today:
+        return energy_per_day
+    return int(user_energy.remaining_energy)
+
+
+def _spend_statement(user_id: int, energy_per_day: int, amount: int, today: date):
+    t = UserEnergy.__table__
+    is_new_day = or_(t.c.last_reset.is_(None), t.c.last_reset < today)
+    can_spend = t.c.remaining_energy >= amount
+    if energy_per_day >= amount:
+        can_spend = or_(is_new_day, can_spend)
+    # SET expressions see the pre-update row, so the CASE reads the old last_reset
+    return (
+        t.update()
+        .where(t.c.user_id == user_id, can_spend)
+        .values(
+            remaining_energy=case((is_new_day, energy_per_day - amount), else_=t.c.remaining_energy - amount),
+            last_reset=today,
+        )
+    )
+
+
+def consume_energy(session, user_id: int, energy_per_day: int, amount: int = 1, today: Optional[date] = None) -> Optional[int]:
+    """Reset-if-new-day and spend `amount` energy in one statement, then commit.
+
+    Returns the remaining energy, or None when the user does not have enough.
+    """
+    today = today or date.today()
+    t = UserEnergy.__table__
+    for _ in range(2):
+        stmt = _spend_statement(user_id, energy_per_day, amount, today)
+        if session.get_bind().dialect.update_returning:
+            row = session.execute(stmt.returning(t.c.remaining_energy)).first()
+            remaining = row[0] if row else None
+        else:
+            # older SQLite: the UPDATE holds the write lock, so the follow-up read is consistent
+            res = session.execute(stmt)
+            remaining = None
+            if res.rowcount:
+                remaining = session.execute(select(t.c.remaining_energy).where(t.c.user_id == user_id)).scalar()
+        if remaining is not None:
+            session.commit()
+            return int(remaining)
+        exists = session.execute(select(t.c.user_id).where(t.c.user_id == user_id)).first()
+        if exists:
+            session.rollback()
+            return None
+        # first spend ever: create a full row, then retry the guarded update
+        try:
+            session.execute(t.insert().values(user_id=user_id, remaining_energy=energy_per_day, last_reset=today))
+            session.flush()
+        except IntegrityError:
+            session.rollback()
+    session.rollback()
+    return None
@@ -0,0 +1,36 @@
+"""Dedicated thread pools for blocking calls made from async handlers.
+
+Firebase calls (certificate fetches, `firebase_admin.auth`) run on their own
+small pool so a slow Google endpoint cannot starve Starlette's shared
+threadpool, which the sync routes and `run_in_threadpool` depend on.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .config import FIREBASE_WORKERS
+
+_firebase_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def firebase_executor() -> ThreadPoolExecutor:
+    global _firebase_executor
+    if _firebase_executor is None:
+        with _lock:
+            if _firebase_executor is None:
+                _firebase_executor = ThreadPoolExecutor(max_workers=FIREBASE_WORKERS, thread_name_prefix="firebase")
+    return _firebase_executor
+
+
+async def run_firebase(fn, *args, **kwargs):
+    """Run a blocking Firebase call on the dedicated pool and await its result.
+    The call runs in a copy of the caller's context (like `asyncio.to_thread`),
+    so it counts towards the current request's metrics.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(firebase_executor(), functools.partial(ctx.run, fn, *args, **kwargs))
@@ -0,0 +1,256 @@
+"""Incremental content ingestion for the manual data files.
+
+The JSON arrays in `data/` are parsed one item at a time, so memory stays flat
+however large a content drop is. Every item gets a `content_key` (its explicit
+`key` field when it has one, otherwise category + English text plus an
+occurrence number for exact duplicates) and a `content_hash` of the row it
+maps to. Items whose key is in the table are updated when the hash changed;
+all other items are inserted with fresh ids. Rows whose key disappeared from
+the file are marked `retired` instead of being deleted, so answers, cursors
+and analysis rows that point at them stay valid; the quiz bank skips them,
+and an item that comes back un-retires its row. Give an item an explicit `key`
+to keep its row (and id) through edits of its text. Rows seeded before these
+columns existed have no hash yet and are rewritten once to record it.
+
+`content_key` is unique, and on PostgreSQL the run holds an advisory lock, so
+two workers seeding at the same time can't insert the same item twice; a run
+that loses the race on another database retries once against the committed
+rows. Inserts use COPY on PostgreSQL with psycopg2 and multi-row INSERTs
+elsewhere.
+"""
+import csv
+import hashlib
+import io
+import json
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.exc import IntegrityError
+
+from .models import DailyInfo, QuizQuestion, TrueFalseQuestion
+
+_WS = " \t\r\n"
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator:
+    """Yield the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, started = "", 0, False, False
+        while True:
+            while pos < len(buf) and (buf[pos] in _WS or (started and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) and not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            item = end = None
+            if pos < len(buf):
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            # a value touching the end of the buffer may continue in the next chunk
+            if end is None or (end == len(buf) and not eof):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+
+
+def _texts_key(category, texts) -> str:
+    if not isinstance(texts, dict) or not texts:
+        return f"{category}\x00{texts}"
+    text = texts.get("en") or texts[sorted(texts)[0]]
+    return f"{category}\x00{text}"
+
+
+def _stored_key(category: str, texts_json: str) -> str:
+    try:
+        texts = json.loads(texts_json)
+    except Exception:
+        texts = texts_json
+    return _texts_key(category, texts)
+
+
+def _row_hash(row: Dict) -> str:
+    # row values are already serialized strings/scalars; no need for another json.dumps
+    payload = "\x1f".join(f"{k}={row[k]!r}" for k in sorted(row))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ContentSpec:
+    """How one data file maps onto one table."""
+
+    def __init__(self, name: str, model, text_field: str, item_field: str, to_row: Callable[[Dict], Dict]):
+        self.name = name
+        self.model = model
+        self.table = model.__table__
+        self.text_field = text_field
+        self.item_field = item_field
+        self.to_row = to_row
+
+    def base_key(self, item: Dict, row: Dict) -> str:
+        if item.get("key") is not None:
+            return f"key\x00{item['key']}"
+        # same key as _stored_key(row) would give, without re-parsing the JSON
+        return _texts_key(row["category"], item.get(self.item_field, {}))
+
+
+def _info_row(item: Dict) -> Dict:
+    return {
+        "info_texts": json.dumps(item["info_texts"], ensure_ascii=False),
+        "category": item["category"],
+        "source": item.get("source"),
+    }
+
+
+def _quiz_row(item: Dict) -> Dict:
+    return {
+        "question_texts": json.dumps(item["question_texts"], ensure_ascii=False),
+        "options_texts": json.dumps(item["options_texts"], ensure_ascii=False),
+        "correct_answer_index": item["correct_answer_index"],
+        "category": item["category"],
+    }
+
+
+def _truefalse_row(item: Dict) -> Dict:
+    return {
+        "question_texts": json.dumps(item.get("question", {}), ensure_ascii=False),
+        "correct_answer": bool(item.get("correct_answer", False)),
+        "category": item.get("category", "General"),
+    }
+
+
+SPECS = {
+    "info": ContentSpec("info", DailyInfo, "info_texts", "info_texts", _info_row),
+    "quiz": ContentSpec("quiz", QuizQuestion, "question_texts", "question_texts", _quiz_row),
+    "truefalse": ContentSpec("truefalse", TrueFalseQuestion, "question_texts", "question", _truefalse_row),
+}
+
+
+def _keyed(base: str, seen: Dict[str, int]) -> str:
+    n = seen.get(base, 0)
+    seen[base] = n + 1
+    return hashlib.sha1(f"{base}\x00{n}".encode("utf-8")).hexdigest()
+
+
+def _existing(conn, spec: ContentSpec) -> Dict[str, Tuple[int, Optional[str], bool]]:
+    """content_key -> (id, content_hash, retired) in id order; keys are derived
+    for legacy rows.
+    """
+    t = spec.table
+    out: Dict[str, Tuple[int, Optional[str], bool]] = {}
+    legacy_seen: Dict[str, int] = {}
+    rows = conn.execute(select(t.c.id, t.c.content_key, t.c.content_hash, t.c.retired, t.c.category, t.c[spec.text_field]).order_by(t.c.id))
+    for row_id, key, digest, retired, category, texts in rows:
+        if key is None:
+            if retired:
+                continue  # retired without a key (see _retire): never matched again
+            key, digest = _keyed(_stored_key(category, texts or ""), legacy_seen), None
+        if key in out:
+            # duplicate left by an earlier race: never matches, so it is retired
+            key = f"duplicate\x00{row_id}"
+        out[key] = (row_id, digest, bool(retired))
+    return out
+
+
+def _lock(conn, spec: ContentSpec) -> None:
+    """Serialize concurrent seeders of one table (PostgreSQL advisory lock)."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": zlib.crc32(f"ingest:{spec.table.name}".encode("utf-8"))})
+
+
+def _retire(conn, spec: ContentSpec, stale: List[Tuple[str, int]], batch_size: int) -> None:
+    """Mark `(content_key, id)` rows retired; duplicates also drop their key so
+    the unique index can be built.
+    """
+    t = spec.table
+    ids = [row_id for _, row_id in stale]
+    duplicates = [row_id for key, row_id in stale if key.startswith("duplicate\x00")]
+    for i in range(0, len(ids), batch_size):
+        conn.execute(t.update().where(t.c.id.in_(ids[i:i + batch_size])).values(retired=True))
+    for i in range(0, len(duplicates), batch_size):
+        conn.execute(t.update().where(t.c.id.in_(duplicates[i:i + batch_size])).values(content_key=None))
+
+
+def _copy_rows(conn, spec: ContentSpec, rows: List[Dict]) -> bool:
+    """COPY rows into a PostgreSQL table; False when the driver can't."""
+    if conn.dialect.name != "postgresql" or conn.dialect.driver != "psycopg2":
+        return False
+    cols = list(rows[0])
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    for r in rows:
+        writer.writerow([r[c] for c in cols])
+    buf.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{spec.table.name}" ({", ".join(cols)}) FROM STDIN WITH (FORMAT csv)', buf)
+    finally:
+        cursor.close()
+    return True
+
+
+def _flush(conn, spec: ContentSpec, inserts: List[Dict], updates: List[Dict], use_copy: bool) -> None:
+    t = spec.table
+    if inserts and not (use_copy and _copy_rows(conn, spec, inserts)):
+        conn.execute(t.insert(), inserts)
+    if updates:
+        values = {c: bindparam(f"_{c}") for c in updates[0] if c != "_id"}
+        params = [{("_id" if k == "_id" else f"_{k}"): v for k, v in u.items()} for u in updates]
+        conn.execute(t.update().where(t.c.id == bindparam("_id")).values(**values), params)
+    inserts.clear()
+    updates.clear()
+
+
+def ingest(engine, spec: ContentSpec, path: str, batch_size: int = 1000, use_copy: bool = True) -> Dict[str, int]:
+    """Sync `spec`'s table with the items of `path` in one transaction.
+    Returns inserted/updated/unchanged/retired counts.
+    """
+    try:
+        return _ingest(engine, spec, path, batch_size, use_copy)
+    except IntegrityError as e:
+        # another process inserted the same keys first; diff against its rows
+        print(f"Concurrent {spec.name} seed detected ({e.orig}); retrying")
+        return _ingest(engine, spec, path, batch_size, use_copy)
+
+
+def _ingest(engine, spec: ContentSpec, path: str, batch_size: int, use_copy: bool) -> Dict[str, int]:
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "retired": 0}
+    with engine.begin() as conn:
+        _lock(conn, spec)
+        existing = _existing(conn, spec)
+        seen: Dict[str, int] = {}
+        inserts: List[Dict] = []
+        updates: List[Dict] = []
+        for item in iter_json_array(path):
+            row = spec.to_row(item)
+            key = _keyed(spec.base_key(item, row), seen)
+            digest = _row_hash(row)
+            current = existing.pop(key, None)
+            if current is None:
+                inserts.append(dict(row, content_key=key, content_hash=digest, retired=False))
+                counts["inserted"] += 1
+            elif current[1] != digest or current[2]:
+                updates.append(dict(row, content_key=key, content_hash=digest, retired=False, _id=current[0]))
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+            if len(inserts) + len(updates) >= batch_size:
+                _flush(conn, spec, inserts, updates, use_copy)
+        _flush(conn, spec, inserts, updates, use_copy)
+        # what is left of `existing` is no longer in the file
+        stale = sorted(((key, row_id) for key, (row_id, _, retired) in existing.items() if not retired), key=lambda kv: kv[1])
+        _retire(conn, spec, stale, batch_size)
+        counts["retired"] = len(stale)
+    return counts
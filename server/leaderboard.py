@@ -0,0 +1,150 @@
+"""In-memory top-K leaderboard.
+
+The top `LEADERBOARD_TOP_K` entries are kept in memory, updated incrementally
+when a score changes in this process and rebuilt from the database every
+`LEADERBOARD_REFRESH_SECONDS` (which also picks up changes made by other
+workers). Concurrent requests that find the board stale share one in-flight
+rebuild instead of each running the query.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from .config import LEADERBOARD_TOP_K, LEADERBOARD_REFRESH_SECONDS
+from .models import User, UserScore
+
+
+def display_name(user) -> Optional[str]:
+    username = getattr(user, "username", None) or getattr(user, "display_name", None)
+    if not username and getattr(user, "email", None):
+        username = user.email.split("@", 1)[0]
+    return username
+
+
+def query_leaderboard(session, limit: int) -> List[Dict]:
+    """Top `limit` users straight from the database, without ranks."""
+    rows = session.exec(
+        select(User, UserScore)
+        .join(UserScore, User.id == UserScore.user_id, isouter=True)
+        .order_by(UserScore.score.desc().nullslast())
+        .limit(limit)
+    ).all()
+    out = []
+    for pair in rows:
+        user = pair[0]
+        score_obj = pair[1] if len(pair) > 1 else None
+        out.append({
+            "user_id": user.id, "email": user.email, "username": display_name(user),
+            "score": score_obj.score if score_obj else 0,
+        })
+    return out
+
+
+def render(entries: List[Dict]) -> List[Dict]:
+    return [
+        {"rank": i, "email": e["email"], "username": e["username"], "score": e["score"]}
+        for i, e in enumerate(entries, start=1)
+    ]
+
+
+class Leaderboard:
+    def __init__(self, top_k: int = LEADERBOARD_TOP_K, refresh_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        self.top_k = top_k
+        self.refresh_seconds = refresh_seconds
+        # bumped on every visible change; usable as a cache validator
+        self.generation = 0
+        # generations are per process, so validators also carry this process' epoch
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._entries: List[Dict] = []
+        self._built_at: Optional[float] = None
+        self._inflight: Optional[Future] = None
+        # score updates that arrive while a rebuild is running, replayed on install
+        self._pending: Dict[int, Dict] = {}
+
+    def _load(self) -> List[Dict]:
+        from .db import engine
+        with Session(engine) as session:
+            return query_leaderboard(session, self.top_k)
+
+    def _is_fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < self.refresh_seconds
+
+    def is_fresh(self) -> bool:
+        """True when `top()` can answer without touching the database."""
+        with self._lock:
+            return self._is_fresh()
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and self._is_fresh():
+                return
+            fut = self._inflight
+            owner = fut is None
+            if owner:
+                fut = self._inflight = Future()
+                self._pending = {}
+        if not owner:
+            fut.result()
+            return
+        try:
+            entries = self._load()
+        except BaseException as e:
+            with self._lock:
+                self._inflight = None
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._entries = entries
+            for entry in self._pending.values():
+                self._apply(entry)
+            self._pending = {}
+            self._built_at = time.monotonic()
+            self._inflight = None
+            self.generation += 1
+        fut.set_result(None)
+
+    def _apply(self, entry: Dict) -> bool:
+        entries = self._entries
+        for i, e in enumerate(entries):
+            if e["user_id"] == entry["user_id"]:
+                del entries[i]
+                break
+        else:
+            if len(entries) >= self.top_k and entry["score"] <= entries[-1]["score"]:
+                return False
+        # keep descending score order; ties keep their existing order
+        pos = len(entries)
+        while pos > 0 and entries[pos - 1]["score"] < entry["score"]:
+            pos -= 1
+        entries.insert(pos, entry)
+        del entries[self.top_k:]
+        return True
+
+    def record_score(self, user_id: int, score: int, email: Optional[str] = None, username: Optional[str] = None) -> None:
+        """Apply a committed score change without touching the database."""
+        if not username and email:
+            username = email.split("@", 1)[0]
+        entry = {"user_id": user_id, "email": email, "username": username, "score": score}
+        with self._lock:
+            if self._inflight is not None:
+                self._pending[user_id] = entry
+            if self._built_at is not None and self._apply(entry):
+                self.generation += 1
+
+    def top(self, limit: int) -> List[Dict]:
+        self.refresh()
+        with self._lock:
+            entries = self._entries[:limit]
+        return render(entries)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+
+leaderboard = Leaderboard()
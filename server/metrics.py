@@ -0,0 +1,288 @@
+"""In-process request, database and Firebase metrics in Prometheus text format.
+
+`MetricsMiddleware` times every request and labels it with the matched route
+template (`/quiz/answer/`, not the raw path). SQLAlchemy cursor hooks and the
+`firebase_call` context manager add to the current request's totals through a
+context variable, which also follows sync handlers into the threadpool and
+async ones through `run_sync`. Work done on unrelated threads (background
+rebuilds, the notification sender pool) still counts in the global series.
+
+Everything is plain dicts under one lock per metric, so it is cheap enough to
+leave on; set METRICS_ENABLED=0 to skip the hooks entirely.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from .config import METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+FIREBASE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Summary(_Metric):
+    """Sum and count only (no quantiles)."""
+    kind = "summary"
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        with self._lock:
+            cur = self._values.get(labels)
+            if cur is None:
+                self._values[labels] = [value, 1]
+            else:
+                cur[0] += value
+                cur[1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for k, (total, count) in items:
+            lbl = _labels(self.labelnames, k)
+            out.append(f"{self.name}_sum{lbl} {_num(total)}")
+            out.append(f"{self.name}_count{lbl} {count}")
+        return out
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            cur = self._values.get(labels)
+            if cur is None:
+                # per-bucket (non-cumulative) counts, +Inf last, then sum
+                cur = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            cur[i] += 1
+            cur[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for k, cur in items:
+            running = 0
+            for bound, n in zip(self.buckets + ("+Inf",), cur[:-1]):
+                running += n
+                le = 'le="%s"' % (bound if bound == "+Inf" else _num(bound))
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {running}")
+            lbl = _labels(self.labelnames, k)
+            out.append(f"{self.name}_sum{lbl} {_num(cur[-1])}")
+            out.append(f"{self.name}_count{lbl} {running}")
+        return out
+
+
+http_latency = Histogram("sparkup_http_request_duration_seconds", "Request latency by route template.", ("route", "method"))
+http_requests = Counter("sparkup_http_requests_total", "Requests by route template and status code.", ("route", "method", "status"))
+http_db_statements = Histogram("sparkup_http_db_statements", "SQL statements issued per request.", ("route", "method"), STATEMENT_BUCKETS)
+http_db_seconds = Summary("sparkup_http_db_seconds", "Time spent executing SQL per request.", ("route", "method"))
+http_firebase_calls = Summary("sparkup_http_firebase_calls", "Firebase calls made per request.", ("route", "method"))
+db_statements = Counter("sparkup_db_statements_total", "SQL statements executed, including background work.")
+db_seconds = Counter("sparkup_db_statement_seconds_total", "Time spent executing SQL, including background work.")
+firebase_calls = Counter("sparkup_firebase_calls_total", "Firebase calls by operation and outcome.", ("op", "outcome"))
+firebase_latency = Histogram("sparkup_firebase_call_duration_seconds", "Firebase call latency by operation.", ("op",), FIREBASE_BUCKETS)
+
+REGISTRY: List[_Metric] = [
+    http_latency, http_requests, http_db_statements, http_db_seconds, http_firebase_calls,
+    db_statements, db_seconds, firebase_calls, firebase_latency,
+]
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "firebase_calls", "firebase_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.firebase_calls = 0
+        self.firebase_seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("sparkup_request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_metrics_t0")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_statements.inc()
+    db_seconds.inc(amount=elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("_metrics_t0") if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Attach the statement counters to a (sync) Engine; for an AsyncEngine pass
+    `async_engine.sync_engine`.
+    """
+    if not METRICS_ENABLED or engine is None:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def firebase_call(op: str):
+    """Time one blocking Firebase call (token verification, cert fetch, send)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        firebase_calls.inc((op, outcome))
+        firebase_latency.observe((op,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.firebase_calls += 1
+            stats.firebase_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and per-request DB/Firebase
+    cost under the matched route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            labels = (template, scope.get("method", ""))
+            http_latency.observe(labels, elapsed)
+            http_requests.inc(labels + (str(status[0]),))
+            http_db_statements.observe(labels, stats.statements)
+            http_db_seconds.observe(labels, stats.db_seconds)
+            http_firebase_calls.observe(labels, stats.firebase_calls)
+
+
+def _pool_lines() -> List[str]:
+    from .db import get_pool_status
+    status = get_pool_status()
+    out = []
+    pools = [("sync", status)]
+    if "async" in status:
+        pools.append(("async", status["async"]))
+    gauges = ("checked_out", "checked_in", "overflow", "size")
+    for key in gauges:
+        out.append(f"# TYPE sparkup_db_pool_{key} gauge")
+        for name, st in pools:
+            if key in st:
+                out.append(f'sparkup_db_pool_{key}{{pool="{name}"}} {st[key]}')
+    for metric, key in (("wait_seconds_total", "wait_seconds_total"), ("checkouts_total", "acquired"), ("timeouts_total", "timeouts")):
+        out.append(f"# TYPE sparkup_db_pool_{metric} counter")
+        for name, st in pools:
+            out.append(f'sparkup_db_pool_{metric}{{pool="{name}"}} {st[key]}')
+    return out
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+    try:
+        lines.extend(_pool_lines())
+    except Exception as e:
+        lines.append(f"# pool metrics unavailable: {_escape(e)}")
+    return "\n".join(lines) + "\n"
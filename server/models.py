@@ -1,5 +1,5 @@
-from typing import Optional
-from datetime import date
+from typing import List, Optional
+from datetime import date, datetime
 from sqlmodel import Field, SQLModel, Relationship
 
 
@@ -55,6 +55,10 @@ class QuizQuestion(SQLModel, table=True):
     options_texts: str
     correct_answer_index: int
     category: str = Field(index=True)
+    # set by the content seeder (server/ingest.py) to detect new/changed items
+    content_key: Optional[str] = Field(default=None, index=True, unique=True)
+    content_hash: Optional[str] = None
+    retired: bool = Field(default=False)
 
 
 class TrueFalseQuestion(SQLModel, table=True):
@@ -63,6 +67,9 @@ class TrueFalseQuestion(SQLModel, table=True):
     question_texts: str
     correct_answer: bool = Field(default=False)
     category: str = Field(index=True)
+    content_key: Optional[str] = Field(default=None, index=True, unique=True)
+    content_hash: Optional[str] = None
+    retired: bool = Field(default=False)
 
 
 # DailyInfo modeli eklendi (seed_manual.py ile uyumlu)
@@ -71,6 +78,9 @@ class DailyInfo(SQLModel, table=True):
     info_texts: str
     category: str = Field(index=True)
     source: Optional[str] = None
+    content_key: Optional[str] = Field(default=None, index=True, unique=True)
+    content_hash: Optional[str] = None
+    retired: bool = Field(default=False)
 
 
 
@@ -79,6 +89,20 @@ class UserAnsweredQuestion(SQLModel, table=True):
     quizquestion_id: int = Field(foreign_key="quizquestion.id", primary_key=True)
 
 
+class UserQuizCursor(SQLModel, table=True):
+    """Per-user position in a deterministic shuffle of the question bank.
+    The permutation is derived from (seed, epoch); `bank_size` pins the prefix of
+    the id-ordered bank the current epoch runs over.
+    """
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    seed: int = Field(default=0)
+    epoch: int = Field(default=0)
+    cursor: int = Field(default=0)
+    bank_size: int = Field(default=0)
+    # the user had answered questions before getting a cursor: skip those until the first wrap
+    skip_answered: bool = Field(default=False)
+
+
 class UserAnswerRecord(SQLModel, table=True):
     """Persisted record of each answer attempt with correctness for analysis."""
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -113,6 +137,17 @@ class AnswerResponse(SQLModel):
     new_score: int
 
 
+class AnswerBatchPayload(SQLModel):
+    """All answers of one quiz session, in the order they were given."""
+    answers: List[AnswerPayload]
+
+
+class AnswerBatchResponse(SQLModel):
+    results: List[AnswerResponse]
+    final_score: int
+    streak: int
+
+
  
 
 
@@ -131,6 +166,18 @@ class UserSeenInfo(SQLModel, table=True):
     shown_at: Optional[date] = Field(default_factory=date.today)
 
 
+class UserSeenInfoBits(SQLModel, table=True):
+    """Compact replacement for UserSeenInfo rows: bit i of `bits` (little-endian)
+    is set once info i of the loaded catalog was shown in the current `cycle`.
+    The bitmap is reset when `content_version` no longer matches the loaded infos.
+    """
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    content_version: str = Field(default="")
+    cycle: int = Field(default=0)
+    bits: bytes = Field(default=b"")
+    updated_at: Optional[date] = Field(default_factory=date.today)
+
+
 class UserOnboarding(SQLModel, table=True):
     """Per-user persistent flag indicating whether the onboarding was completed/seen."""
     user_id: int = Field(foreign_key="user.id", primary_key=True)
@@ -144,6 +191,40 @@ class NotificationMetric(SQLModel, table=True):
     attempts: int = Field(default=0)
 
 
+class NotificationScanJob(SQLModel, table=True):
+    """Checkpointed state of a notification scan. Users are processed in id
+    order; `last_user_id` is the resume point if the job is interrupted, and
+    `sent_user_ids` (JSON list) holds the users of the current chunk that were
+    already sent to.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="running", index=True)
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+    last_user_id: int = Field(default=0)
+    total_users: int = Field(default=0)
+    users_scanned: int = Field(default=0)
+    notified: int = Field(default=0)
+    no_info: int = Field(default=0)
+    batches: int = Field(default=0)
+    tokens_targeted: int = Field(default=0)
+    delivered: int = Field(default=0)
+    removed_tokens: int = Field(default=0)
+    failed_tokens: int = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    sent_user_ids: Optional[str] = Field(default=None)
+
+
+class AppStamp(SQLModel, table=True):
+    """Versions the database was last prepared for (`schema`, `content`);
+    startup skips create_all/compat checks/seeding when they still match.
+    """
+    key: str = Field(primary_key=True)
+    value: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class DeviceTokenPayload(SQLModel):
     token: str
     platform: Optional[str] = None
@@ -0,0 +1,252 @@
+"""Batched, concurrent push sender used by the notification scan.
+
+Recipients are grouped by `(info_index, language)`, since everyone in a group
+receives the identical message, and split into multicast batches of at most
+`MULTICAST_LIMIT` tokens. Batches are sent from a bounded thread pool; workers
+only do network I/O and classify per-token results, while all database writes
+happen afterwards on the caller's session (sessions are not thread-safe).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlmodel import select, delete
+
+from .config import NOTIFICATION_WORKERS, init_firebase
+from .metrics import firebase_call
+from .models import DeviceToken, NotificationMetric
+
+# FCM rejects multicast messages with more than 500 tokens
+MULTICAST_LIMIT = 500
+
+_INVALID_TOKEN_MARKERS = ("not-registered", "registration-token-not-registered", "invalid-registration-token", "invalid-argument")
+
+
+def is_invalid_token_error(exc) -> bool:
+    exc_text = str(exc).lower() if exc else ''
+    return any(x in exc_text for x in _INVALID_TOKEN_MARKERS)
+
+
+def send_multicast(message):
+    """`messaging.send_multicast` was removed in firebase-admin 7; fall back to
+    its replacement when it is missing.
+    """
+    init_firebase()
+    from firebase_admin import messaging
+    send = getattr(messaging, "send_multicast", None) or messaging.send_each_for_multicast
+    with firebase_call("send_multicast"):
+        return send(message)
+
+
+def _build_message(tokens: List[str], title: str, body: str, info_index: int):
+    from firebase_admin import messaging
+    return messaging.MulticastMessage(
+        tokens=tokens,
+        notification=messaging.Notification(title=title, body=body),
+        data={"type": "info", "info_index": str(info_index)}
+    )
+
+
+class Batch:
+    def __init__(self, info_index: int, lang: str, title: str, body: str, tokens: List[str]):
+        self.info_index = info_index
+        self.lang = lang
+        self.title = title
+        self.body = body
+        self.tokens = tokens
+
+
+class BatchOutcome:
+    def __init__(self, batch: Batch):
+        self.batch = batch
+        self.success_tokens: List[str] = []
+        self.bad_tokens: List[str] = []
+        self.failed_tokens: List[str] = []
+        self.retried = 0
+        self.error: Optional[str] = None
+        # the first multicast alone, and the retry's {success_count, failure_count} or {error}
+        self.first_success = 0
+        self.first_error: Optional[str] = None
+        self.retry_result: Optional[Dict] = None
+
+
+def build_batches(recipients: List[Tuple[int, str, str, str, List[str]]]) -> List[Batch]:
+    """Group `(info_index, lang, title, body, tokens)` recipients into multicast batches."""
+    groups: Dict[Tuple[int, str], Batch] = {}
+    order: List[Tuple[int, str]] = []
+    for info_index, lang, title, body, tokens in recipients:
+        if not tokens:
+            continue
+        key = (info_index, lang)
+        if key not in groups:
+            groups[key] = Batch(info_index, lang, title, body, [])
+            order.append(key)
+        groups[key].tokens.extend(tokens)
+    batches = []
+    for key in order:
+        g = groups[key]
+        for i in range(0, len(g.tokens), MULTICAST_LIMIT):
+            batches.append(Batch(g.info_index, g.lang, g.title, g.body, g.tokens[i:i + MULTICAST_LIMIT]))
+    return batches
+
+
+def _classify(tokens: List[str], resp, outcome: BatchOutcome) -> List[str]:
+    retry = []
+    for i, r in enumerate(resp.responses):
+        if getattr(r, 'success', False):
+            outcome.success_tokens.append(tokens[i])
+        elif is_invalid_token_error(getattr(r, 'exception', None)):
+            outcome.bad_tokens.append(tokens[i])
+        else:
+            retry.append(tokens[i])
+    return retry
+
+
+def send_batch(batch: Batch) -> BatchOutcome:
+    """Send one batch, retrying transient per-token failures once."""
+    outcome = BatchOutcome(batch)
+    try:
+        resp = send_multicast(_build_message(batch.tokens, batch.title, batch.body, batch.info_index))
+        retry = _classify(batch.tokens, resp, outcome)
+        outcome.first_success = len(outcome.success_tokens)
+    except Exception as e:
+        outcome.error = outcome.first_error = str(e)
+        retry = list(batch.tokens)
+    if retry:
+        outcome.retried = len(retry)
+        delivered = len(outcome.success_tokens)
+        try:
+            resp = send_multicast(_build_message(retry, batch.title, batch.body, batch.info_index))
+            failed = _classify(retry, resp, outcome)
+            outcome.failed_tokens.extend(failed)
+            succeeded = len(outcome.success_tokens) - delivered
+            outcome.retry_result = {"success_count": succeeded, "failure_count": len(retry) - succeeded}
+        except Exception as e:
+            outcome.error = str(e)
+            outcome.failed_tokens.extend(retry)
+            outcome.retry_result = {"error": str(e)}
+    return outcome
+
+
+def dispatch_batches(batches: List[Batch], max_workers: int = NOTIFICATION_WORKERS) -> List[BatchOutcome]:
+    if not batches:
+        return []
+    if max_workers <= 1 or len(batches) == 1:
+        return [send_batch(b) for b in batches]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix="fcm-send") as pool:
+        return list(pool.map(send_batch, batches))
+
+
+class OutcomeCollector:
+    """Gathers per-token results across a whole send so they can be written
+    back with one bulk `last_seen` update, one bulk delete of invalid tokens and
+    one NotificationMetric row per batch, all in a single commit.
+    """
+    def __init__(self):
+        self.outcomes: List[BatchOutcome] = []
+        self.success_tokens: List[str] = []
+        self.bad_tokens: List[str] = []
+        self.failed_tokens: List[str] = []
+
+    def add(self, outcome: BatchOutcome) -> None:
+        self.outcomes.append(outcome)
+        self.success_tokens.extend(outcome.success_tokens)
+        self.bad_tokens.extend(outcome.bad_tokens)
+        self.failed_tokens.extend(outcome.failed_tokens)
+
+    def summary(self, removed: int) -> Dict:
+        return {
+            "batches": len(self.outcomes),
+            "tokens": sum(len(o.batch.tokens) for o in self.outcomes),
+            "delivered": len(self.success_tokens),
+            "removed_tokens": removed,
+            "failed": len(self.failed_tokens),
+        }
+
+    def apply(self, session) -> Dict:
+        if not self.outcomes:
+            return self.summary(0)
+        today = date.today()
+        removed = 0
+        try:
+            if self.success_tokens:
+                session.exec(DeviceToken.__table__.update().where(DeviceToken.token.in_(self.success_tokens)).values(last_seen=today))
+            if self.bad_tokens:
+                session.exec(delete(DeviceToken).where(DeviceToken.token.in_(self.bad_tokens)))
+            session.execute(NotificationMetric.__table__.insert(), [
+                {"metric_date": today, "removed_tokens": len(o.bad_tokens), "attempts": len(o.batch.tokens)}
+                for o in self.outcomes
+            ])
+            session.commit()
+            removed = len(self.bad_tokens)
+        except Exception as e:
+            session.rollback()
+            print(f"Warning: failed to persist notification outcomes: {e}")
+        return self.summary(removed)
+
+
+def apply_outcomes(session, outcomes: List[BatchOutcome]) -> Dict:
+    """Persist per-batch results: refresh `last_seen` of delivered tokens, drop
+    invalid ones and record one NotificationMetric per batch.
+    """
+    collector = OutcomeCollector()
+    for o in outcomes:
+        collector.add(o)
+    return collector.apply(session)
+
+
+def load_tokens(session, user_ids: List[int]) -> Dict[int, List[str]]:
+    out: Dict[int, List[str]] = {}
+    if not user_ids:
+        return out
+    rows = session.exec(select(DeviceToken.user_id, DeviceToken.token).where(DeviceToken.user_id.in_(user_ids))).all()
+    for user_id, token in rows:
+        out.setdefault(user_id, []).append(token)
+    return out
+
+
+def send_infos(session, picks: List[Tuple[object, int, Dict]], max_workers: int = NOTIFICATION_WORKERS,
+               checkpoint: Optional[Callable[[List[int], List[int], Dict], None]] = None) -> Dict:
+    """Send each `(user, info_index, info)` pick; marking the picks seen is up
+    to the caller.
+
+    With `checkpoint`, batches go out in waves of `max_workers`: each wave's
+    outcomes are persisted and `checkpoint(user_ids, delivered_user_ids,
+    summary)` is called before the next wave is sent, so a caller can record
+    who was reached and who actually got the push. Users without tokens are
+    reported (as reached, not delivered) with the first wave.
+
+    Returns per-user results plus a summary of the batches sent.
+    """
+    from .utils import _get_info_text
+    tokens_by_user = load_tokens(session, [u.id for u, _, _ in picks])
+    recipients = []
+    results = []
+    for u, idx, info in picks:
+        lang = u.language_code or "en"
+        tokens = tokens_by_user.get(u.id, [])
+        recipients.append((idx, lang, info.get("category", "SparkUp"), _get_info_text(info, lang), tokens))
+        res = {"sent": True, "tokens_targeted": len(tokens)}
+        if not tokens:
+            res["note"] = "no_device_tokens"
+        results.append({"user_id": u.id, "info_index": idx, "send": res})
+
+    batches = build_batches(recipients)
+    if checkpoint is None:
+        summary = apply_outcomes(session, dispatch_batches(batches, max_workers))
+        return {"results": results, "summary": summary}
+
+    owner = {t: user_id for user_id, tokens in tokens_by_user.items() for t in tokens}
+    reached = [u.id for u, _, _ in picks if not tokens_by_user.get(u.id)]
+    summary = OutcomeCollector().summary(0)
+    step = max(1, max_workers)
+    for i in range(0, len(batches), step) or [0]:  # one (empty) wave when nobody has tokens
+        wave = batches[i:i + step]
+        outcomes = dispatch_batches(wave, max_workers)
+        wave_summary = apply_outcomes(session, outcomes)
+        reached.extend(sorted({owner[t] for b in wave for t in b.tokens}))
+        checkpoint(reached, sorted({owner[t] for o in outcomes for t in o.success_tokens}), wave_summary)
+        reached = []
+        for k, v in wave_summary.items():
+            summary[k] += v
+    return {"results": results, "summary": summary}
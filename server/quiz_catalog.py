@@ -0,0 +1,96 @@
+"""In-memory catalog of localized, pre-parsed quiz questions.
+
+`QuizQuestion` rows store their texts as JSON strings keyed by language. The
+catalog parses a row once and keeps one ready-to-serve entry per
+`(question_id, lang)`, so /quiz/ and /quiz/localize/ only touch the database
+(and `json.loads`) for questions that are not cached yet.
+"""
+import json
+import time
+from typing import Dict, List, Optional
+
+from .cache import TTLCache
+from .config import QUIZ_CATALOG_SIZE, QUIZ_CATALOG_TTL
+from .quiz_cursor import invalidate_question_ids, load_questions
+
+_catalog = TTLCache(maxsize=QUIZ_CATALOG_SIZE, ttl=QUIZ_CATALOG_TTL)
+_generation = 0
+
+
+def _parse_options(value) -> List:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except Exception:
+            return [value]
+    return value or []
+
+
+def _localize_row(q) -> Dict[str, Dict]:
+    """Parse a QuizQuestion row into `{lang: entry}` for every language it has."""
+    try:
+        questions = json.loads(q.question_texts or "{}")
+    except Exception:
+        questions = {}
+    try:
+        options = json.loads(q.options_texts or "{}")
+    except Exception:
+        options = {}
+    out = {}
+    for lang in set(questions) | set(options) | {"en"}:
+        out[lang] = {
+            "id": q.id,
+            "question_text": questions.get(lang) or questions.get("en") or "",
+            "options": _parse_options(options.get(lang) or options.get("en") or ""),
+            "correct_answer_index": q.correct_answer_index,
+        }
+    return out
+
+
+def get_localized_questions(session, question_ids: List[int], lang: Optional[str]) -> List[Dict]:
+    """Return localized question dicts for `question_ids` in the given order,
+    skipping ids that do not exist. The dicts are copies and safe to mutate.
+    """
+    lang = lang or "en"
+    found: Dict[int, Dict] = {}
+    missing = []
+    for qid in question_ids:
+        entry = _catalog.get((qid, lang))
+        if entry is not None:
+            found[qid] = entry
+        elif qid not in missing:
+            missing.append(qid)
+    for q in load_questions(session, missing):
+        per_lang = _localize_row(q)
+        for entry_lang, entry in per_lang.items():
+            _catalog.set((q.id, entry_lang), entry)
+        # unknown languages fall back to English, cache that projection too
+        entry = per_lang.get(lang) or per_lang["en"]
+        _catalog.set((q.id, lang), entry)
+        found[q.id] = entry
+
+    result = []
+    emitted = set()
+    for qid in question_ids:
+        if qid in found and qid not in emitted:
+            emitted.add(qid)
+            entry = found[qid]
+            result.append(dict(entry, options=list(entry["options"])))
+    return result
+
+
+def catalog_version() -> str:
+    """Version of the served quiz content, for validators: it changes when this
+    process invalidates the catalog and with every TTL window, in which other
+    workers' reseeds are picked up.
+    """
+    window = int(time.time() // QUIZ_CATALOG_TTL) if QUIZ_CATALOG_TTL else 0
+    return f"{_generation}.{window}"
+
+
+def invalidate_catalog() -> None:
+    """Forget every cached question; call after quiz content is (re)seeded."""
+    global _generation
+    _generation += 1
+    _catalog.clear()
+    invalidate_question_ids()
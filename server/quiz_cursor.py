@@ -0,0 +1,151 @@
+"""Per-user shuffled walk over the quiz question bank.
+
+Each user gets a pseudo-random permutation of the id-ordered question bank,
+defined by a stored seed and epoch. Serving the next N questions only computes
+N permutation positions and loads those N rows, so the cost does not depend on
+the size of the bank or on the user's answer history. When the cursor reaches
+the end of the bank a new epoch (a fresh permutation) starts. Users who
+answered questions before they had a cursor skip those during their first
+epoch.
+"""
+import random
+import threading
+import time
+from typing import List, Optional
+
+from sqlmodel import select, delete
+
+from .models import QuizQuestion, UserAnsweredQuestion, UserQuizCursor
+
+# The sorted id list is shared by all users; refresh it periodically so content
+# added by another process is picked up without a restart.
+QUESTION_IDS_TTL_SECONDS = 300
+
+_MASK64 = (1 << 64) - 1
+_ids_lock = threading.Lock()
+_question_ids: Optional[List[int]] = None
+_question_ids_loaded_at = 0.0
+# bumped by invalidate_question_ids so a load that raced it is not installed
+_ids_generation = 0
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer; deterministic across processes unlike hash()
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def permute(index: int, size: int, key: int) -> int:
+    """Map `index` to its position in a keyed permutation of range(size).
+
+    Uses a 4-round Feistel network over the smallest even-bit domain covering
+    `size`, cycle-walking until the result falls inside range(size).
+    """
+    if size <= 1:
+        return index
+    bits = max(2, (size - 1).bit_length())
+    bits += bits & 1
+    half = bits // 2
+    mask = (1 << half) - 1
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for rnd in range(4):
+            left, right = right, left ^ (_mix64(key ^ (rnd << 56) ^ right) & mask)
+        x = (left << half) | right
+        if x < size:
+            return x
+
+
+def _epoch_key(seed: int, epoch: int) -> int:
+    return _mix64((seed & _MASK64) ^ _mix64(epoch))
+
+
+def get_question_ids(session) -> List[int]:
+    global _question_ids, _question_ids_loaded_at
+    ids, generation = _question_ids, _ids_generation
+    if ids is not None and time.time() - _question_ids_loaded_at < QUESTION_IDS_TTL_SECONDS:
+        return ids
+    # The query must not run under the lock: through AsyncSession.run_sync it
+    # awaits on the event-loop thread, and a second request blocking on the lock
+    # there would hang the loop. Concurrent misses just load the list twice.
+    ids = list(session.exec(select(QuizQuestion.id).where(QuizQuestion.retired == False).order_by(QuizQuestion.id)).all())  # noqa: E712
+    with _ids_lock:
+        if generation == _ids_generation:
+            _question_ids, _question_ids_loaded_at = ids, time.time()
+    return ids
+
+
+def invalidate_question_ids() -> None:
+    """Drop the cached id list; call after (re)seeding quiz content."""
+    global _question_ids, _ids_generation
+    with _ids_lock:
+        _question_ids = None
+        _ids_generation += 1
+
+
+def next_question_ids(session, user_id: int, count: int, advance: bool = True, commit: bool = True) -> List[int]:
+    """Return the next `count` question ids of the user's shuffle.
+
+    With `advance=False` (previews) the cursor is left untouched; with
+    `commit=False` the move is only flushed, for the caller to commit together
+    with its own writes (or roll back). Starting a new
+    epoch clears the user's answered rows so questions can score again, matching
+    the previous "all answered -> start over" behaviour.
+    """
+    ids = get_question_ids(session)
+    if count <= 0 or not ids:
+        return []
+    count = min(count, len(ids))
+
+    row = session.get(UserQuizCursor, user_id)
+    if row is None:
+        # answered rows from before the cursor existed would otherwise be served again
+        history = session.exec(select(UserAnsweredQuestion.quizquestion_id).where(UserAnsweredQuestion.user_id == user_id).limit(1)).first()
+        row = UserQuizCursor(user_id=user_id, seed=random.getrandbits(63), epoch=0, cursor=0, bank_size=len(ids), skip_answered=history is not None)
+    seed, epoch, cursor, bank_size, skip = row.seed, row.epoch, row.cursor, row.bank_size, bool(row.skip_answered)
+    wrapped = False
+    if bank_size <= 0 or bank_size > len(ids):
+        # bank shrank (or row is new/corrupt): the stored prefix is no longer valid
+        epoch, cursor, bank_size, wrapped, skip = epoch + 1, 0, len(ids), True, False
+    answered = set()
+    if skip:
+        answered = set(session.exec(select(UserAnsweredQuestion.quizquestion_id).where(UserAnsweredQuestion.user_id == user_id)).all())
+
+    out: List[int] = []
+    key = _epoch_key(seed, epoch)
+    while len(out) < count:
+        if cursor >= bank_size:
+            # the new epoch starts with the answered rows cleared
+            epoch, cursor, bank_size, wrapped, skip = epoch + 1, 0, len(ids), True, False
+            key = _epoch_key(seed, epoch)
+        qid = ids[permute(cursor, bank_size, key)]
+        cursor += 1
+        if qid not in out and not (skip and qid in answered):
+            out.append(qid)
+
+    if advance:
+        if wrapped:
+            session.exec(delete(UserAnsweredQuestion).where(UserAnsweredQuestion.user_id == user_id))
+        row.epoch, row.cursor, row.bank_size, row.skip_answered = epoch, cursor, bank_size, skip
+        try:
+            session.add(row)
+            if commit:
+                session.commit()
+            else:
+                session.flush()
+        except Exception:
+            # concurrent first fetch created the row; the other request's cursor wins
+            session.rollback()
+    return out
+
+
+def load_questions(session, question_ids: List[int]) -> List[QuizQuestion]:
+    """Load exactly the given questions, preserving the requested order."""
+    if not question_ids:
+        return []
+    rows = session.exec(select(QuizQuestion).where(QuizQuestion.id.in_(question_ids))).all()
+    by_id = {q.id: q for q in rows}
+    return [by_id[i] for i in question_ids if i in by_id]
@@ -0,0 +1,178 @@
+"""Order-statistic index over user scores.
+
+A Fenwick (binary indexed) tree over exact score values answers "how many users
+score higher than S" in O(log max_score), replacing the per-request
+`COUNT(*) ... WHERE score > :s` scan. The tree grows by doubling as scores grow;
+the rare scores beyond `MAX_TREE_SCORE` are kept in a sorted list instead.
+
+The index is built from `UserScore` at startup, updated in place on every score
+change made by this process and rebuilt every `RANK_INDEX_REFRESH_SECONDS` to
+pick up other workers' writes (stale data is served while a rebuild runs).
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_right, insort
+from typing import Dict, Optional
+
+from sqlmodel import Session, select
+
+from .config import RANK_INDEX_REFRESH_SECONDS
+from .models import UserScore
+
+MAX_TREE_SCORE = 1 << 20
+_INITIAL_SIZE = 1 << 12
+
+
+class _Fenwick:
+    def __init__(self, size: int = _INITIAL_SIZE):
+        self.size = size
+        self.tree = array("q", [0]) * (size + 1)
+
+    def add(self, i: int, delta: int) -> None:
+        i += 1
+        tree, size = self.tree, self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Sum of counts for values 0..i inclusive."""
+        i = min(i, self.size - 1) + 1
+        tree, s = self.tree, 0
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def grow(self, total: int) -> None:
+        # For power-of-two sizes the first half of a doubled tree is unchanged,
+        # the new top node covers everything and the rest starts empty.
+        old = self.size
+        self.tree.extend(array("q", [0]) * old)
+        self.size = old * 2
+        self.tree[self.size] = total
+
+
+class _ScoreCounts:
+    """Per-user scores plus the Fenwick tree / overflow list counting them."""
+
+    def __init__(self):
+        self.scores: Dict[int, int] = {}
+        self.tree = _Fenwick()
+        self.tree_total = 0
+        self.overflow = []
+
+    def _add(self, score: int, delta: int) -> None:
+        if score >= MAX_TREE_SCORE:
+            if delta > 0:
+                insort(self.overflow, score)
+            else:
+                self.overflow.pop(bisect_right(self.overflow, score) - 1)
+            return
+        while score >= self.tree.size:
+            self.tree.grow(self.tree_total)
+        self.tree.add(score, delta)
+        self.tree_total += delta
+
+    def set(self, user_id: int, score: int) -> None:
+        score = max(0, int(score or 0))
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._add(old, -1)
+        self._add(score, 1)
+        self.scores[user_id] = score
+
+    def count_above(self, score: int) -> int:
+        over = len(self.overflow)
+        if score >= MAX_TREE_SCORE:
+            return over - bisect_right(self.overflow, score)
+        return self.tree_total - self.tree.prefix(score) + over
+
+
+class RankIndex:
+    def __init__(self, refresh_seconds: float = RANK_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._data = _ScoreCounts()
+        self._built_at: Optional[float] = None
+        # score changes made while a rebuild is reading the table
+        self._pending: Optional[Dict[int, int]] = None
+
+    @property
+    def ready(self) -> bool:
+        """True once built, i.e. `lookup` will not block on a rebuild."""
+        return self._built_at is not None
+
+    def set_score(self, user_id: int, score: int) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = score
+            if self._built_at is not None:
+                self._data.set(user_id, score)
+
+    def count_above(self, score: int) -> int:
+        with self._lock:
+            return self._data.count_above(max(0, int(score)))
+
+    def lookup(self, score: int) -> Dict:
+        """Rank (1-based), users above, total users and percentile for `score`."""
+        self.ensure_fresh()
+        with self._lock:
+            above = self._data.count_above(max(0, int(score)))
+            total = len(self._data.scores)
+        total = max(total, above + 1)
+        return {
+            "rank": above + 1,
+            "users_above": above,
+            "total_users": total,
+            # share of users scoring at or below `score`
+            "percentile": round(100.0 * (total - above) / total, 2),
+        }
+
+    def rebuild(self, session=None, force: bool = True) -> None:
+        first_build = self._built_at is None
+        if not self._rebuild_lock.acquire(blocking=first_build):
+            return  # another thread is rebuilding; keep serving current data
+        try:
+            if first_build and self._built_at is not None and not force:
+                return  # built by the thread we waited for
+            with self._lock:
+                self._pending = {}
+            if session is None:
+                from .db import engine
+                with Session(engine) as own_session:
+                    rows = own_session.exec(select(UserScore.user_id, UserScore.score)).all()
+            else:
+                rows = session.exec(select(UserScore.user_id, UserScore.score)).all()
+            fresh = _ScoreCounts()
+            for user_id, score in rows:
+                fresh.set(user_id, score)
+            with self._lock:
+                for user_id, score in self._pending.items():
+                    fresh.set(user_id, score)
+                self._data = fresh
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+            self._rebuild_lock.release()
+
+    def ensure_fresh(self) -> None:
+        if self._built_at is None:
+            self.rebuild(force=False)
+        elif time.monotonic() - self._built_at >= self.refresh_seconds and not self._rebuild_lock.locked():
+            # periodic resync runs off the request path
+            threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+    def _background_rebuild(self) -> None:
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Rank index rebuild failed: {e}")
+
+
+rank_index = RankIndex()
@@ -2,22 +2,35 @@ import random
 import json
 from datetime import date, timedelta
 from typing import List, Dict, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import PlainTextResponse, Response
 from sqlmodel import select, delete, func
 
-from .auth import get_current_user
-from .db import get_session
+from starlette.concurrency import run_in_threadpool
+
+from .auth import get_current_user, get_user_context, get_user_context_async
+from .context import UserContext
+from .db import get_session, get_async_session, get_pool_status
 from .models import (
     User, UserScore, UserStreak, UserSubscription,
     UserAnsweredQuestion, UserAnswerRecord, QuizQuestion, AnswerPayload, AnswerResponse,
+    AnswerBatchPayload, AnswerBatchResponse,
     UserScoreHistory, DeviceToken, DeviceTokenPayload, NotificationMetric, UserSeenInfo
 )
 from .models import UserEnergy, UserOnboarding
 from .models import UserEnergy
 import os
-from .config import TRANSLATIONS, MANUAL_INFOS, NOTIFICATION_FREQUENCY, MANUAL_TRUEFALSE, load_manual_truefalse
-from .utils import _get_info_text, _select_unseen_info_for_user, _send_notification_to_user, _get_user_access_level, _get_rank_name
+from .conditional import cache_headers, etag_matches, not_modified, strong_etag, weak_etag
+from .config import TRANSLATIONS, NOTIFICATION_FREQUENCY, CONTENT_CACHE_MAX_AGE
+from .content import legacy_truefalse_body, registry as content_registry
+from .energy import consume_energy
+from .leaderboard import leaderboard, display_name, query_leaderboard, render as render_leaderboard
+from .metrics import render as render_metrics
+from .rank_index import rank_index
+from .scan_job import start_scan, get_job as get_scan_job, job_status as scan_job_status
+from .quiz_catalog import catalog_version, get_localized_questions
+from .quiz_cursor import next_question_ids
+from .utils import _select_unseen_info_for_user, _send_notification_to_user, _get_user_access_level, _get_rank_name, _quiz_points
 
 router = APIRouter()
 
@@ -36,13 +49,15 @@ def set_user_notifications(enabled: bool = Query(...), db_user: User = Depends(g
 
 
 @router.get("/user/profile/")
-def get_user_profile(db_user: User = Depends(get_current_user), session = Depends(get_session)):
-    score_obj = session.exec(select(UserScore).where(UserScore.user_id == db_user.id)).first()
-    streak_obj = session.exec(select(UserStreak).where(UserStreak.user_id == db_user.id)).first()
-    sub_obj = session.exec(select(UserSubscription).where(UserSubscription.user_id == db_user.id)).first()
-    score = score_obj.score if score_obj else 0
+async def get_user_profile(ctx: UserContext = Depends(get_user_context_async), session = Depends(get_async_session)):
+    return await session.run_sync(_user_profile, ctx)
 
-    access = _get_user_access_level(db_user, session)
+
+def _user_profile(session, ctx: UserContext) -> Dict:
+    db_user = ctx.user
+    access = _get_user_access_level(db_user, session, ctx)
+    score_obj, streak_obj, sub_obj = ctx.score, ctx.streak, ctx.subscription
+    score = score_obj.score if score_obj else 0
     quiz_limit = access["quiz_limit"]
     used = access["questions_answered"]
 
@@ -82,8 +97,13 @@ def get_user_profile(db_user: User = Depends(get_current_user), session = Depend
 
 
 @router.get("/quiz/", response_model=List[Dict])
-def get_quiz_questions(limit: int = 3, lang: Optional[str] = Query(None), preview: bool = Query(False), consume: bool = Query(False), db_user: User = Depends(get_current_user), session = Depends(get_session)):
-    access = _get_user_access_level(db_user, session)
+async def get_quiz_questions(limit: int = 3, lang: Optional[str] = Query(None), preview: bool = Query(False), consume: bool = Query(False), ctx: UserContext = Depends(get_user_context_async), session = Depends(get_async_session)):
+    return await session.run_sync(_quiz_questions, ctx, limit, lang, preview, consume)
+
+
+def _quiz_questions(session, ctx: UserContext, limit: int, lang: Optional[str], preview: bool, consume: bool) -> List[Dict]:
+    db_user = ctx.user
+    access = _get_user_access_level(db_user, session, ctx)
     effective_lang = lang or (db_user.language_code if db_user.language_code else "en")
 
     # Calculate remaining quizzes for the user
@@ -99,88 +119,32 @@ def get_quiz_questions(limit: int = 3, lang: Optional[str] = Query(None), previe
 
     # Daily quota enforcement removed: access gated by `remaining_energy` value in profile only.
 
-    answered_ids_raw = session.exec(select(UserAnsweredQuestion.quizquestion_id).where(UserAnsweredQuestion.user_id == db_user.id)).all()
-    answered_ids = []
-    for item in answered_ids_raw:
-        if isinstance(item, (list, tuple)):
-            if item:
-                answered_ids.append(item[0])
-        else:
-            answered_ids.append(item)
-
-    if not answered_ids:
-        unanswered = session.exec(select(QuizQuestion)).all()
-    else:
-        unanswered = session.exec(select(QuizQuestion).where(QuizQuestion.id.notin_(answered_ids))).all()
-
     actual_limit = limit
     if remaining is not None and remaining < limit:
         actual_limit = max(0, remaining)
 
-    chosen = []
-    if actual_limit == 0:
-        chosen = []
-    elif len(unanswered) >= actual_limit:
-        chosen = random.sample(unanswered, actual_limit)
-    else:
-        if not preview:
-            session.exec(delete(UserAnsweredQuestion).where(UserAnsweredQuestion.user_id == db_user.id))
-            session.commit()
-            all_qs = session.exec(select(QuizQuestion)).all()
-            if len(all_qs) < actual_limit:
-                raise HTTPException(status_code=404, detail="Not enough new questions.")
-            chosen = random.sample(all_qs, actual_limit)
-        else:
-            all_qs = session.exec(select(QuizQuestion)).all()
-            if len(all_qs) < actual_limit:
-                raise HTTPException(status_code=404, detail="Not enough questions for preview.")
-            chosen = random.sample(all_qs, actual_limit)
-
-    def _get_text(obj_field, q):
-        try:
-            data = json.loads(getattr(q, obj_field) or "{}")
-            return data.get(effective_lang) or data.get("en") or ""
-        except Exception:
-            return ""
+    # Walk the user's shuffled question order; previews peek without advancing it.
+    # The move is committed below, so a session that is refused doesn't skip questions.
+    chosen_ids = next_question_ids(session, db_user.id, actual_limit, advance=not preview, commit=False)
+    if len(chosen_ids) < actual_limit:
+        session.rollback()
+        detail = "Not enough questions for preview." if preview else "Not enough new questions."
+        raise HTTPException(status_code=404, detail=detail)
 
     # If this is a real session (not preview) and the client requested consumption,
-    # persistently consume one energy now. Clients should only ask to `consume`
-    # when starting a session; mid-session fetches should not pass `consume=true`.
+    # persistently consume one energy now, in the same commit as the cursor move.
+    # Clients should only ask to `consume` when starting a session; mid-session
+    # fetches should not pass `consume=true`.
     if not preview and consume:
-        user_energy = session.exec(select(UserEnergy).where(UserEnergy.user_id == db_user.id)).first()
-        if not user_energy:
-            # create a fallback row using access energy_per_day
-            user_energy = UserEnergy(user_id=db_user.id, remaining_energy=access.get("energy_per_day", 3))
-            try:
-                session.add(user_energy); session.commit(); session.refresh(user_energy)
-            except Exception:
-                session.rollback()
-        if user_energy.remaining_energy <= 0:
+        if consume_energy(session, db_user.id, access.get("energy_per_day", 3)) is None:
+            # consume_energy rolled back, the cursor move included
             raise HTTPException(status_code=403, detail="Insufficient energy")
-        try:
-            user_energy.remaining_energy = int(user_energy.remaining_energy) - 1
-            session.add(user_energy); session.commit(); session.refresh(user_energy)
-        except Exception:
-            session.rollback()
+    elif not preview:
+        session.commit()
+
     # Server no longer persists per-user daily limits here.
 
-    result = []
-    for q in chosen:
-        question_text = _get_text("question_texts", q)
-        options_raw = _get_text("options_texts", q)
-        if isinstance(options_raw, str):
-            try:
-                options_parsed = json.loads(options_raw)
-            except Exception:
-                options_parsed = [options_raw]
-        else:
-            options_parsed = options_raw or []
-        result.append({
-            "id": q.id,
-            "question_text": question_text,
-            "options": options_parsed,
-            "correct_answer_index": q.correct_answer_index
-        })
+    result = get_localized_questions(session, chosen_ids, effective_lang)
     # include session_seconds hint for client
     if session_seconds is not None:
         for r in result:
@@ -190,33 +154,30 @@ def get_quiz_questions(limit: int = 3, lang: Optional[str] = Query(None), previe
 
 
 @router.post("/quiz/answer/", response_model=AnswerResponse)
-def submit_quiz_answer(payload: AnswerPayload, db_user: User = Depends(get_current_user), session = Depends(get_session)):
-    question = session.get(QuizQuestion, payload.question_id)
+async def submit_quiz_answer(payload: AnswerPayload, ctx: UserContext = Depends(get_user_context_async), session = Depends(get_async_session)):
+    return await session.run_sync(_submit_quiz_answer, ctx, payload)
+
+
+def _submit_quiz_answer(session, ctx: UserContext, payload: AnswerPayload) -> AnswerResponse:
+    db_user = ctx.user
+    question = get_localized_questions(session, [payload.question_id], "en")
     if not question:
         raise HTTPException(status_code=404, detail="Question not found.")
-    user_score = session.exec(select(UserScore).where(UserScore.user_id==db_user.id)).first()
-    user_streak = session.exec(select(UserStreak).where(UserStreak.user_id==db_user.id)).first()
+    correct_index = question[0]["correct_answer_index"]
+    user_score, user_streak = ctx.score, ctx.streak
     if not user_score or not user_streak:
         raise HTTPException(status_code=500, detail="User data missing.")
 
-    access = _get_user_access_level(db_user, session)
+    access = _get_user_access_level(db_user, session, ctx)
     # Daily quiz-count enforcement removed: allow submissions as long as other access checks (energy) permit.
 
     already_answered = session.exec(select(UserAnsweredQuestion).where(UserAnsweredQuestion.user_id == db_user.id, UserAnsweredQuestion.quizquestion_id == payload.question_id)).first()
-    is_correct = (question.correct_answer_index == payload.answer_index)
+    is_correct = (correct_index == payload.answer_index)
     score_awarded = 0
     if not already_answered:
         if is_correct:
             lvl = access.get("level") if isinstance(access, dict) else None
-            if lvl == "pro":
-                base_score = 15
-            elif lvl == "ultra":
-                base_score = 20
-            else:
-                base_score = 10
-            streak_bonus = min(user_streak.streak_count, 5) * 2
-            # Quiz questions award double the per-question points compared to True/False.
-            score_awarded = (base_score + streak_bonus) * 2
+            score_awarded = _quiz_points(lvl, user_streak.streak_count)
             user_score.score += score_awarded
             user_streak.streak_count += 1
             try:
@@ -233,10 +194,89 @@ def submit_quiz_answer(payload: AnswerPayload, db_user: User = Depends(get_curre
         except Exception:
             pass
         session.add(user_score); session.add(user_streak)
+    # read before commit expires the instances, so no refresh round trip is needed
+    new_score = user_score.score
+    if not already_answered:
+        email, username = db_user.email, db_user.username
         session.commit()
-        session.refresh(user_score); session.refresh(user_streak)
+        if score_awarded:
+            leaderboard.record_score(db_user.id, new_score, email, username)
+            rank_index.set_score(db_user.id, new_score)
+
+    return AnswerResponse(correct=is_correct, correct_index=correct_index, score_awarded=score_awarded, new_score=new_score)
+
+
+MAX_BATCH_ANSWERS = 100
+
 
-    return AnswerResponse(correct=is_correct, correct_index=question.correct_answer_index, score_awarded=score_awarded, new_score=user_score.score)
+@router.post("/quiz/answer/batch/", response_model=AnswerBatchResponse)
+def submit_quiz_answers_batch(payload: AnswerBatchPayload, ctx: UserContext = Depends(get_user_context), session = Depends(get_session)):
+    """Score a whole quiz session at once.
+
+    Answers are applied in order with the same rules as /quiz/answer/; every
+    row is written in a single transaction. Questions answered before (or
+    repeated within the batch) score nothing, as in the single endpoint.
+    """
+    db_user = ctx.user
+    answers = payload.answers
+    if not answers:
+        raise HTTPException(status_code=400, detail="answers required")
+    if len(answers) > MAX_BATCH_ANSWERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ANSWERS} answers per batch.")
+    question_ids = [a.question_id for a in answers]
+    correct_by_id = {q["id"]: q["correct_answer_index"] for q in get_localized_questions(session, question_ids, "en")}
+    missing = sorted(set(question_ids) - set(correct_by_id))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Questions not found: {missing}")
+    user_score, user_streak = ctx.score, ctx.streak
+    if not user_score or not user_streak:
+        raise HTTPException(status_code=500, detail="User data missing.")
+
+    access = _get_user_access_level(db_user, session, ctx)
+    lvl = access.get("level") if isinstance(access, dict) else None
+    answered = set(session.exec(
+        select(UserAnsweredQuestion.quizquestion_id)
+        .where(UserAnsweredQuestion.user_id == db_user.id, UserAnsweredQuestion.quizquestion_id.in_(set(question_ids)))
+    ).all())
+
+    score, streak = user_score.score, user_streak.streak_count
+    results, answered_rows, record_rows, history_rows = [], [], [], []
+    for a in answers:
+        correct_index = correct_by_id[a.question_id]
+        is_correct = (correct_index == a.answer_index)
+        score_awarded = 0
+        if a.question_id not in answered:
+            answered.add(a.question_id)
+            if is_correct:
+                score_awarded = _quiz_points(lvl, streak)
+                score += score_awarded
+                streak += 1
+                history_rows.append({"user_id": db_user.id, "points": score_awarded, "timestamp": date.today()})
+            else:
+                streak = 0
+            answered_rows.append({"user_id": db_user.id, "quizquestion_id": a.question_id})
+            record_rows.append({"user_id": db_user.id, "quizquestion_id": a.question_id, "correct": bool(is_correct), "timestamp": date.today()})
+        results.append(AnswerResponse(correct=is_correct, correct_index=correct_index, score_awarded=score_awarded, new_score=score))
+
+    if answered_rows:
+        email, username = db_user.email, db_user.username
+        old_score = user_score.score
+        try:
+            session.execute(UserAnsweredQuestion.__table__.insert(), answered_rows)
+            session.execute(UserAnswerRecord.__table__.insert(), record_rows)
+            if history_rows:
+                session.execute(UserScoreHistory.__table__.insert(), history_rows)
+            user_score.score, user_streak.streak_count = score, streak
+            session.add(user_score); session.add(user_streak)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to record answers: {e}")
+        if score != old_score:
+            leaderboard.record_score(db_user.id, score, email, username)
+            rank_index.set_score(db_user.id, score)
+
+    return AnswerBatchResponse(results=results, final_score=score, streak=streak)
 
 
 @router.get("/user/analysis/")
@@ -329,51 +369,42 @@ def get_my_onboarding(db_user: User = Depends(get_current_user), session = Depen
 
 
 
-@router.get("/leaderboard/")
-def get_leaderboard(limit: int = 100, session = Depends(get_session)):
-    rows = session.exec(
-        select(User, UserScore)
-        .join(UserScore, User.id == UserScore.user_id, isouter=True)
-        .order_by(UserScore.score.desc().nullslast())
-        .limit(limit)
-    ).all()
-
-    result = []
-    rank = 1
-    for pair in rows:
-        user = pair[0]
-        score_obj = pair[1] if len(pair) > 1 else None
-        score = score_obj.score if score_obj else 0
-        username = getattr(user, "username", None) or getattr(user, "display_name", None)
-        if not username and getattr(user, "email", None):
-            username = user.email.split("@", 1)[0]
-        result.append({"rank": rank, "email": user.email, "username": username, "score": score})
-        rank += 1
-    return result
+LEADERBOARD_CACHE_CONTROL = "public, no-cache"
 
 
-@router.get("/user/rank/")
-def get_user_rank(db_user: User = Depends(get_current_user), session = Depends(get_session)):
-    user_score_obj = session.exec(select(UserScore).where(UserScore.user_id == db_user.id)).first()
-    user_score = user_score_obj.score if user_score_obj else 0
+@router.get("/leaderboard/")
+async def get_leaderboard(request: Request, response: Response, limit: int = 100, session = Depends(get_async_session)):
+    if 0 < limit <= leaderboard.top_k:
+        if not leaderboard.is_fresh():
+            # a rebuild reads the database with the sync engine
+            await run_in_threadpool(leaderboard.refresh)
+        # read the generation before the entries: a concurrent update can only
+        # make the validator older than the body, never newer
+        etag = weak_etag("leaderboard", leaderboard.epoch, leaderboard.generation, limit)
+        if etag_matches(request, etag):
+            return not_modified(etag, LEADERBOARD_CACHE_CONTROL)
+        response.headers.update(cache_headers(etag, LEADERBOARD_CACHE_CONTROL))
+        return leaderboard.top(limit)
+    return render_leaderboard(await session.run_sync(query_leaderboard, limit))
 
-    higher_count = session.exec(
-        select(func.count()).select_from(UserScore).where(UserScore.score > user_score)
-    ).one()
-    try:
-        higher_count_val = int(higher_count)
-    except Exception:
-        higher_count_val = int(higher_count[0]) if isinstance(higher_count, (list, tuple)) else 0
 
-    rank = higher_count_val + 1
-    username = getattr(db_user, "username", None) or getattr(db_user, "display_name", None)
-    if not username and getattr(db_user, "email", None):
-        username = db_user.email.split("@", 1)[0]
-    return {"rank": rank, "email": db_user.email, "username": username, "score": user_score}
+@router.get("/user/rank/")
+async def get_user_rank(ctx: UserContext = Depends(get_user_context_async)):
+    db_user = ctx.user
+    user_score = ctx.score.score if ctx.score else 0
+    if rank_index.ready:
+        stats = rank_index.lookup(user_score)
+    else:
+        stats = await run_in_threadpool(rank_index.lookup, user_score)
+    username = display_name(db_user)
+    return {
+        "rank": stats["rank"], "email": db_user.email, "username": username, "score": user_score,
+        "users_above": stats["users_above"], "total_users": stats["total_users"], "percentile": stats["percentile"],
+    }
 
 
 @router.get("/quiz/localize/")
-def localize_quiz(ids: str = Query(..., description="Comma separated quiz ids"), lang: Optional[str] = Query(None), session = Depends(get_session)):
+def localize_quiz(request: Request, ids: str = Query(..., description="Comma separated quiz ids"), lang: Optional[str] = Query(None), session = Depends(get_session)):
     effective_lang = lang or "en"
     try:
         id_list = [int(s.strip()) for s in ids.split(",") if s.strip()]
@@ -382,94 +413,128 @@ def localize_quiz(ids: str = Query(..., description="Comma separated quiz ids"),
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid ids parameter")
 
-    qs = session.exec(select(QuizQuestion).where(QuizQuestion.id.in_(id_list))).all()
+    # the validator comes from the quiz catalog version and the parameters, so
+    # a revalidation is answered without touching the database or the catalog
+    etag = strong_etag("quiz", catalog_version(), effective_lang, *id_list)
+    cache_control = f"public, max-age={CONTENT_CACHE_MAX_AGE}"
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    body = json.dumps(get_localized_questions(session, id_list, effective_lang), ensure_ascii=False, separators=(",", ":"))
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag, cache_control))
 
-    def _get_text(obj_field, q):
-        try:
-            data = json.loads(getattr(q, obj_field) or "{}")
-            return data.get(effective_lang) or data.get("en") or ""
-        except Exception:
-            return ""
-
-    result = []
-    for q in qs:
-        question_text = _get_text("question_texts", q)
-        options_raw = _get_text("options_texts", q)
-        options_parsed = []
-        if isinstance(options_raw, str):
-            try:
-                options_parsed = json.loads(options_raw)
-            except Exception:
-                options_parsed = [options_raw]
-        else:
-            options_parsed = options_raw or []
-        result.append({
-            "id": q.id,
-            "question_text": question_text,
-            "options": options_parsed,
-            "correct_answer_index": q.correct_answer_index
-        })
-    return result
+
+TRUEFALSE_CACHE_CONTROL = "private, no-cache"
 
 
 @router.get("/manual/truefalse/")
-def get_manual_truefalse(db_user: User = Depends(get_current_user), session = Depends(get_session)):
+def get_manual_truefalse(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    category: Optional[str] = Query(None),
+    lang: Optional[str] = Query(None),
+    shuffle: bool = Query(True),
+    ctx: UserContext = Depends(get_user_context), session = Depends(get_session),
+):
     """Return the list of manual true/false questions loaded from data/manual_truefalse.json.
-    This reads the in-memory `MANUAL_TRUEFALSE` list populated at startup by the server.
-    """
-    if not MANUAL_TRUEFALSE:
-        # Try an on-demand load from the repo-root data path in case startup loading failed.
-        try:
-            repo_root = os.path.dirname(os.path.dirname(__file__))
-            tf_path = os.path.join(repo_root, 'data', 'manual_truefalse.json')
-            if tf_path and os.path.exists(tf_path):
-                load_manual_truefalse(tf_path)
-        except Exception:
-            # silent on-demand failure to avoid noisy logs
-            pass
+    This reads the current content snapshot (see server/content.py).
 
-    if not MANUAL_TRUEFALSE:
+    Without query parameters the full multi-language list is returned (legacy
+    clients). Passing any of `limit`, `category` or `lang` switches to the
+    projected mode: questions carry only one language and are returned as
+    `{"items": [...], "total": n, "session_seconds": s}`, either randomly sampled
+    (`shuffle=true`, default) or paginated in catalog order with `offset`.
+
+    The deterministic responses (full list, `shuffle=false`) carry a strong
+    ETag from the catalog version; a matching If-None-Match gets a 304 before
+    any energy is spent or the body is built.
+    """
+    catalog = content_registry.current.truefalse
+    if not catalog.items:
+        # startup loading may have failed; retry off the request path
+        content_registry.reload_in_background()
         raise HTTPException(status_code=404, detail="No true/false questions available.")
 
+    projected = limit is not None or category is not None or lang is not None
+    if projected:
+        pool = catalog.by_category.get(category, []) if category else range(len(catalog.items))
+        if not pool:
+            raise HTTPException(status_code=404, detail="No true/false questions match the category.")
+
+    db_user = ctx.user
+    access = _get_user_access_level(db_user, session, ctx)
+    session_seconds = access.get("session_seconds")
+    etag = None
+    if projected:
+        effective_lang = lang or db_user.language_code or "en"
+        count = len(pool) if limit is None else min(limit, len(pool))
+        if not shuffle:
+            etag = strong_etag("truefalse", catalog.version, effective_lang if effective_lang in catalog.payloads else "en", category, offset, count, session_seconds)
+    else:
+        etag = strong_etag("truefalse", catalog.version, session_seconds)
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag, TRUEFALSE_CACHE_CONTROL)
+
     # Ensure user has energy for a true/false session (cost 1 energy) and consume it
-    access = _get_user_access_level(db_user, session)
-    # Persistently decrement energy for a real session
-    user_energy = session.exec(select(UserEnergy).where(UserEnergy.user_id == db_user.id)).first()
-    if not user_energy:
-        user_energy = UserEnergy(user_id=db_user.id, remaining_energy=access.get("energy_per_day", 3))
-        try:
-            session.add(user_energy); session.commit(); session.refresh(user_energy)
-        except Exception:
-            session.rollback()
-    if user_energy.remaining_energy <= 0:
+    if consume_energy(session, db_user.id, access.get("energy_per_day", 3)) is None:
         raise HTTPException(status_code=403, detail="Insufficient energy")
-    try:
-        user_energy.remaining_energy = int(user_energy.remaining_energy) - 1
-        session.add(user_energy); session.commit(); session.refresh(user_energy)
-    except Exception:
-        session.rollback()
+
+    if projected:
+        payloads = catalog.payloads.get(effective_lang) or catalog.payloads["en"]
+        if shuffle:
+            picked = random.sample(pool, count)
+            headers = {"Cache-Control": "no-store"}
+        else:
+            picked = pool[offset:offset + count]
+            headers = cache_headers(etag, TRUEFALSE_CACHE_CONTROL)
+        body = '{"total":%d,"offset":%d,"session_seconds":%s,"items":[%s]}' % (
+            len(pool), 0 if shuffle else offset, json.dumps(session_seconds), ",".join(payloads[i] for i in picked))
+        return Response(content=body, media_type="application/json", headers=headers)
 
     # Return questions and include session_seconds hint
-    out = []
-    for tf in MANUAL_TRUEFALSE:
-        item = dict(tf)
-        item["session_seconds"] = access.get("session_seconds")
-        out.append(item)
-    return out
+    return Response(content=legacy_truefalse_body(catalog, session_seconds), media_type="application/json",
+                    headers=cache_headers(etag, TRUEFALSE_CACHE_CONTROL))
 
 
 @router.get("/debug/manual_truefalse_status/")
-def debug_manual_truefalse_status():
+def debug_manual_truefalse_status(request: Request, response: Response):
     """Debug endpoint: returns whether manual true/false questions are loaded and a small sample."""
     try:
-        loaded = bool(MANUAL_TRUEFALSE)
-        count = len(MANUAL_TRUEFALSE) if loaded else 0
-        sample = MANUAL_TRUEFALSE[0] if loaded and len(MANUAL_TRUEFALSE) > 0 else None
+        catalog = content_registry.current.truefalse
+        etag = strong_etag("truefalse-status", catalog.version)
+        if etag_matches(request, etag):
+            return not_modified(etag, "no-cache")
+        response.headers.update(cache_headers(etag, "no-cache"))
+        items = catalog.items
+        loaded = bool(items)
+        count = len(items) if loaded else 0
+        sample = items[0] if loaded and len(items) > 0 else None
         return {"loaded": loaded, "count": count, "sample": sample}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/debug/db_pool/")
+def debug_db_pool():
+    """Debug endpoint: connection pool occupancy and checkout wait statistics."""
+    return get_pool_status()
+
+
+@router.get("/debug/startup/")
+def debug_startup():
+    """Debug endpoint: startup mode (fast/full), per-phase timings and the
+    content backend (bundle/json) of this worker."""
+    from .startup import report
+    snap = content_registry.current
+    return dict(report.as_dict(), content_backend={"infos": snap.infos.backend, "truefalse": snap.truefalse.backend})
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @router.get("/challenges/{challenge_id}/localize/")
 def localize_challenge(challenge_id: int, lang: Optional[str] = Query(None), session = Depends(get_session)):
     # Challenge localization removed — this endpoint is deprecated.
@@ -478,21 +543,43 @@ def localize_challenge(challenge_id: int, lang: Optional[str] = Query(None), ses
 
 @router.get("/info/random/")
 def get_random_info(category: Optional[str] = Query(None), db_user: User = Depends(get_current_user), session = Depends(get_session)):
-    if not MANUAL_INFOS:
+    infos = content_registry.current.infos
+    if not infos.items:
         raise HTTPException(status_code=404, detail="No infos available.")
-    candidates = [ (i, it) for i, it in enumerate(MANUAL_INFOS) if (category is None or it.get("category") == category) ]
-    if not candidates:
-        raise HTTPException(status_code=404, detail="No infos match the category.")
-    idx, info = random.choice(candidates)
-    text = _get_info_text(info, db_user.language_code or "en")
+    candidates = infos.by_category.get(category, []) if category is not None else None
+    if candidates is not None:
+        if not candidates:
+            raise HTTPException(status_code=404, detail="No infos match the category.")
+        idx = candidates[random.randrange(len(candidates))]
+    else:
+        idx = random.randrange(len(infos.items))
     return {
         "info_index": idx,
-        "category": info.get("category"),
-        "text": text,
-        "source": info.get("source")
+        "category": infos.category(idx),
+        "text": infos.text(idx, db_user.language_code or "en"),
+        "source": infos.source(idx)
     }
 
 
+@router.get("/info/categories/")
+def get_info_categories():
+    """Info categories with item counts and per-language coverage, precomputed
+    when the catalog is loaded.
+    """
+    infos = content_registry.current.infos
+    if not infos.items:
+        raise HTTPException(status_code=404, detail="No infos available.")
+    return infos.summary
+
+
+@router.get("/manual/truefalse/categories/")
+def get_truefalse_categories():
+    catalog = content_registry.current.truefalse
+    if not catalog.items:
+        raise HTTPException(status_code=404, detail="No true/false questions available.")
+    return catalog.summary
+
+
 @router.post("/user/device-token/")
 def register_device_token(payload: DeviceTokenPayload, db_user: User = Depends(get_current_user), session = Depends(get_session)):
     if not payload.token:
@@ -531,30 +618,57 @@ def send_for_user(user_id: int, db_user: User = Depends(get_current_user), sessi
     return {"info_index": idx, "result": result}
 
 
-@router.post("/notifications/run-scan/")
-def run_scan(internal_secret: Optional[str] = Query(None), session = Depends(get_session)):
+def _check_cron_secret(internal_secret: Optional[str]):
     secret = os.getenv("INTERNAL_CRON_SECRET")
     if secret:
         if not internal_secret or internal_secret != secret:
             raise HTTPException(status_code=403, detail="Forbidden")
 
-    results = []
-    users = session.exec(select(User)).all()
-    for u in users:
-        if not getattr(u, "notifications_enabled", True):
-            continue
-        sub = session.exec(select(UserSubscription).where(UserSubscription.user_id == u.id)).first()
-        level = sub.level if sub else "free"
-        allowed = NOTIFICATION_FREQUENCY.get(level, 1)
-        # Daily per-user notification limits removed; send based on NOTIFICATION_FREQUENCY not enforced per-user.
-        picked = _select_unseen_info_for_user(session, u)
-        if not picked:
-            results.append({"user_id": u.id, "status": "no_info"})
-            continue
-        idx, info = picked
-        res = _send_notification_to_user(session, u, idx, info)
-        results.append({"user_id": u.id, "info_index": idx, "send": res})
-    return {"results_count": len(results), "results": results}
+
+@router.post("/notifications/run-scan/")
+def run_scan(internal_secret: Optional[str] = Query(None), wait: bool = Query(False), session = Depends(get_session)):
+    """Start (or resume) the notification scan as a background job and return
+    its status; poll /notifications/scan-status/ for progress. `wait=true` runs
+    the scan to completion before responding.
+    """
+    _check_cron_secret(internal_secret)
+    return start_scan(session, wait=wait)
+
+
+@router.get("/notifications/scan-status/")
+def scan_status(job_id: Optional[int] = Query(None), internal_secret: Optional[str] = Query(None), session = Depends(get_session)):
+    _check_cron_secret(internal_secret)
+    job = get_scan_job(session, job_id)
+    if job_id is not None and job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found.")
+    return scan_job_status(job)
+
+
+@router.post("/admin/content/reload/")
+def reload_content(internal_secret: Optional[str] = Query(None), wait: bool = Query(False)):
+    """Re-read the data/ catalogs into a new content snapshot and swap it in.
+    Runs in the background unless `wait=true`; requests keep using the current
+    snapshot until the new one is published.
+
+    This reloads only the worker process that handles the request (see `pid`).
+    The other workers pick up file changes through their watchers within
+    CONTENT_RELOAD_SECONDS.
+    """
+    _check_cron_secret(internal_secret)
+    if wait:
+        content_registry.load()
+        started = True
+    else:
+        started = content_registry.reload_in_background()
+    out = content_registry.status()
+    out["started"] = started
+    return out
+
+
+@router.get("/admin/content/status/")
+def content_status(internal_secret: Optional[str] = Query(None)):
+    _check_cron_secret(internal_secret)
+    return content_registry.status()
 
 
 @router.post("/notifications/cleanup/")
@@ -0,0 +1,199 @@
+"""Background, resumable notification scan.
+
+The scan walks users in id order in chunks of `SCAN_CHUNK_SIZE` (keyset
+pagination, so no long-lived cursor has to survive the per-chunk commits) and
+sends each chunk through the batched sender. After every wave of batches the
+users it reached and the summary counters are checkpointed in
+`NotificationScanJob` in the same commit as the seen bits of the users it
+delivered to, and `last_user_id` moves on after every chunk, so a resumed job
+does not push to the same users again and an undelivered pick is not marked
+seen. A job that stops heartbeating (worker restart) or fails is resumed from
+its checkpoint by the next trigger; claiming it is a conditional UPDATE, so only one process wins.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import or_, update
+from sqlmodel import Session, select, func
+
+from .config import SCAN_CHUNK_SIZE, SCAN_STALE_SECONDS
+from .content import registry
+from .models import User, NotificationScanJob
+from .notifications import send_infos
+from .seen_infos import mark_seen_many, pick_unseen_many
+
+_runner_lock = threading.Lock()
+_runner: Optional[threading.Thread] = None
+
+_SUMMARY_FIELDS = (
+    "total_users", "users_scanned", "notified", "no_info", "batches",
+    "tokens_targeted", "delivered", "removed_tokens", "failed_tokens",
+)
+
+
+def _enabled_clause():
+    # legacy rows may have NULL here; the model default is enabled
+    return or_(User.notifications_enabled.is_(None), User.notifications_enabled == True)  # noqa: E712
+
+
+def job_status(job: Optional[NotificationScanJob]) -> Dict:
+    if job is None:
+        return {"status": "never_run"}
+    out = {
+        "job_id": job.id,
+        "status": job.status,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "last_user_id": job.last_user_id,
+        "error": job.error,
+    }
+    for f in _SUMMARY_FIELDS:
+        out[f] = getattr(job, f)
+    out["progress"] = round(min(1.0, job.users_scanned / job.total_users), 4) if job.total_users else (1.0 if job.status == "completed" else 0.0)
+    return out
+
+
+def get_job(session, job_id: Optional[int] = None) -> Optional[NotificationScanJob]:
+    if job_id is not None:
+        return session.get(NotificationScanJob, job_id)
+    return session.exec(select(NotificationScanJob).order_by(NotificationScanJob.id.desc()).limit(1)).first()
+
+
+def _is_stale(job: NotificationScanJob) -> bool:
+    return job.updated_at is None or datetime.utcnow() - job.updated_at > timedelta(seconds=SCAN_STALE_SECONDS)
+
+
+def _take(session, job: NotificationScanJob, **values) -> bool:
+    """Compare-and-set on the row's status and heartbeat; only one claimant
+    sees its UPDATE match.
+    """
+    values["updated_at"] = datetime.utcnow()
+    res = session.execute(update(NotificationScanJob).where(
+        NotificationScanJob.id == job.id,
+        NotificationScanJob.status == job.status,
+        NotificationScanJob.updated_at == job.updated_at,
+    ).values(**values))
+    session.commit()
+    return res.rowcount == 1
+
+
+def _claim_job(session) -> Tuple[NotificationScanJob, bool]:
+    """Return the job to run and whether this process should run it."""
+    job = get_job(session)
+    if job is not None and job.status == "running" and not _is_stale(job):
+        return job, False  # running elsewhere (or in this process)
+    if job is None or job.status == "completed":
+        # touching the finished job's heartbeat decides who starts the next one
+        if job is not None and not _take(session, job):
+            session.expire_all()
+            return get_job(session), False
+        remaining = session.exec(select(func.count(User.id)).where(_enabled_clause())).one()
+        job = NotificationScanJob(total_users=int(remaining or 0))
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        # very first run started twice: the lower id wins
+        rival = session.exec(select(NotificationScanJob).where(
+            NotificationScanJob.status == "running", NotificationScanJob.id < job.id,
+        ).order_by(NotificationScanJob.id).limit(1)).first()
+        if rival is not None and not _is_stale(rival):
+            session.delete(job)
+            session.commit()
+            return rival, False
+        return job, True
+    # interrupted or failed: pick up from the checkpoint
+    if not _take(session, job, status="running", error=None):
+        session.expire_all()
+        return get_job(session), False
+    session.refresh(job)
+    return job, True
+
+
+def _process_chunk(session, job: NotificationScanJob, chunk_size: int) -> bool:
+    infos = registry.current.infos
+    # plain (id, language_code) rows: unlike ORM instances they are not
+    # expired (and lazily re-selected one by one) by the commits below
+    users = session.exec(
+        select(User.id, User.language_code).where(User.id > job.last_user_id, _enabled_clause()).order_by(User.id).limit(chunk_size)
+    ).all()
+    if not users:
+        return False
+    # users of this chunk already reached before an interruption
+    sent = set(json.loads(job.sent_user_ids)) if job.sent_user_ids else set()
+    pending = [u for u in users if u.id not in sent]
+    chosen = pick_unseen_many(session, [u.id for u in pending], infos.items, version=infos.version, mark=False) if infos.items and pending else {}
+    picks = [(u, chosen[u.id], infos.items[chosen[u.id]]) for u in pending if u.id in chosen]
+
+    def checkpoint(user_ids, delivered, summary):
+        # the seen bits go into the same commit as `sent_user_ids`
+        mark_seen_many(session, {u: chosen[u] for u in delivered}, infos.items, version=infos.version, commit=False)
+        reached = set(user_ids) - sent
+        sent.update(reached)
+        job.notified += len(reached)
+        job.batches += summary.get("batches", 0)
+        job.tokens_targeted += summary.get("tokens", 0)
+        job.delivered += summary.get("delivered", 0)
+        job.removed_tokens += summary.get("removed_tokens", 0)
+        job.failed_tokens += summary.get("failed", 0)
+        job.sent_user_ids = json.dumps(sorted(sent))
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+    if picks:
+        send_infos(session, picks, checkpoint=checkpoint)
+    job.no_info += len(pending) - len(picks)
+    job.users_scanned += len(users)
+    job.last_user_id = users[-1].id
+    job.sent_user_ids = None
+    job.updated_at = datetime.utcnow()
+    session.add(job)
+    session.commit()
+    return len(users) == chunk_size
+
+
+def run_job(job_id: int, chunk_size: int = SCAN_CHUNK_SIZE) -> None:
+    from .db import engine
+    with Session(engine) as session:
+        job = session.get(NotificationScanJob, job_id)
+        try:
+            while _process_chunk(session, job, chunk_size):
+                pass
+            job.status = "completed"
+            job.finished_at = job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            job = session.get(NotificationScanJob, job_id)
+            job.status, job.error = "failed", str(e)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            print(f"Notification scan {job_id} failed: {e}")
+
+
+def start_scan(session, wait: bool = False) -> Dict:
+    """Start a scan (or resume an interrupted one) and return its status.
+
+    With `wait=True` the job runs in the calling thread, otherwise in a
+    background thread; only one runner per process is started.
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is not None and _runner.is_alive():
+            return job_status(get_job(session))
+        job, should_run = _claim_job(session)
+        if not should_run:
+            return job_status(job)
+        job_id = job.id
+        if not wait:
+            _runner = threading.Thread(target=run_job, args=(job_id,), name=f"notification-scan-{job_id}", daemon=True)
+            _runner.start()
+            return job_status(job)
+    run_job(job_id)
+    session.expire_all()
+    return job_status(get_job(session, job_id))
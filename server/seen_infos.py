@@ -0,0 +1,206 @@
+"""Per-user seen-info bitmaps.
+
+Each user has one `UserSeenInfoBits` row whose `bits` blob marks the infos
+already shown in the current cycle. Picking an unseen info reads that row,
+chooses a random clear bit among the candidates and writes the row back; when
+every candidate has been seen the candidate bits are cleared and `cycle` is
+bumped. Users without a bitmap are seeded once from their legacy
+`UserSeenInfo` rows. Senders pick with `mark=False` and mark only what was
+delivered, so a failed or interrupted send does not use up the info.
+"""
+import random
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from .models import UserSeenInfo, UserSeenInfoBits
+
+_mask_cache: Dict[Tuple, int] = {}
+
+
+def _to_int(bits: Optional[bytes]) -> int:
+    return int.from_bytes(bits, "little") if bits else 0
+
+
+def _to_bytes(n: int) -> bytes:
+    return n.to_bytes((n.bit_length() + 7) // 8, "little")
+
+
+def candidate_mask(infos: List[Dict], category: Optional[str] = None, version: str = "", candidates: Optional[List[int]] = None) -> int:
+    """Bitmask of the infos eligible for `category` (all infos when None).
+    `candidates` is the precomputed category index, if the caller has one.
+    """
+    key = (version, id(infos), len(infos), category)
+    mask = _mask_cache.get(key)
+    if mask is None:
+        if category is None:
+            mask = (1 << len(infos)) - 1
+        elif candidates is not None:
+            mask = 0
+            for i in candidates:
+                mask |= 1 << i
+        else:
+            mask = 0
+            for i, it in enumerate(infos):
+                if it.get("category") == category:
+                    mask |= 1 << i
+        if len(_mask_cache) > 64:
+            _mask_cache.clear()
+        _mask_cache[key] = mask
+    return mask
+
+
+def _random_set_bit(n: int) -> int:
+    """Index of a uniformly chosen set bit of `n` (n > 0)."""
+    k = random.randrange(bin(n).count("1"))
+    raw = _to_bytes(n)
+    for byte_index, b in enumerate(raw):
+        c = bin(b).count("1")
+        if k < c:
+            for bit in range(8):
+                if b >> bit & 1:
+                    if k == 0:
+                        return byte_index * 8 + bit
+                    k -= 1
+        k -= c
+    raise ValueError("no set bit")
+
+
+def advance(seen: int, cycle: int, mask: int) -> Tuple[int, int, int]:
+    """Pick an unseen candidate; returns `(index, new_seen, new_cycle)`."""
+    unseen = mask & ~seen
+    if not unseen:
+        seen &= ~mask
+        cycle += 1
+        unseen = mask
+    idx = _random_set_bit(unseen)
+    return idx, seen | (1 << idx), cycle
+
+
+def _legacy_seen(session, user_ids: Iterable[int]) -> Dict[int, int]:
+    out: Dict[int, int] = {}
+    user_ids = list(user_ids)
+    if not user_ids:
+        return out
+    rows = session.exec(select(UserSeenInfo.user_id, UserSeenInfo.info_index).where(UserSeenInfo.user_id.in_(user_ids))).all()
+    for user_id, info_index in rows:
+        out[user_id] = out.get(user_id, 0) | (1 << info_index)
+    return out
+
+
+def _write(session, inserts: List[Dict], updates: List[Dict]) -> None:
+    t = UserSeenInfoBits.__table__
+    if inserts:
+        session.execute(t.insert(), inserts)
+    if updates:
+        session.execute(
+            t.update().where(t.c.user_id == bindparam("_user_id")).values(
+                content_version=bindparam("_version"), cycle=bindparam("_cycle"),
+                bits=bindparam("_bits"), updated_at=bindparam("_updated_at"),
+            ),
+            updates,
+        )
+
+
+def _states(session, user_ids: List[int], version: str) -> Dict[int, Tuple[bool, int, int]]:
+    """`(has_row, seen, cycle)` per user: one bitmap select, plus one legacy
+    select for users without a bitmap."""
+    t = UserSeenInfoBits
+    rows = session.exec(select(t.user_id, t.content_version, t.cycle, t.bits).where(t.user_id.in_(user_ids))).all()
+    by_user = {r[0]: r[1:] for r in rows}
+    legacy = _legacy_seen(session, [u for u in user_ids if u not in by_user])
+    out: Dict[int, Tuple[bool, int, int]] = {}
+    for user_id in user_ids:
+        state = by_user.get(user_id)
+        if state is None:
+            out[user_id] = (False, legacy.get(user_id, 0), 0)
+        else:
+            out[user_id] = (True, _to_int(state[2]) if state[0] == version else 0, state[1] or 0)
+    return out
+
+
+def _store(session, states: Dict[int, Tuple[bool, int, int]], version: str, commit: bool = True) -> bool:
+    """Write the bitmaps back with one bulk insert and one bulk update; False
+    (rolled back) when a concurrent pick created one of the rows first."""
+    today = date.today()
+    inserts, updates = [], []
+    for user_id, (has_row, seen, cycle) in states.items():
+        if has_row:
+            updates.append({"_user_id": user_id, "_version": version, "_cycle": cycle, "_bits": _to_bytes(seen), "_updated_at": today})
+        else:
+            inserts.append({"user_id": user_id, "content_version": version, "cycle": cycle, "bits": _to_bytes(seen), "updated_at": today})
+    try:
+        _write(session, inserts, updates)
+        if commit:
+            session.commit()
+        else:
+            session.flush()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+
+def pick_unseen_many(session, user_ids: List[int], infos: List[Dict], category: Optional[str] = None, version: str = "",
+                     candidates: Optional[List[int]] = None, mark: bool = True) -> Dict[int, int]:
+    """Pick one unseen info index per user and mark it seen.
+
+    One select of the bitmaps (plus one legacy select for users without one),
+    one bulk insert and one bulk update, then a single commit. With
+    `mark=False` nothing is written: the caller marks the picks it actually
+    delivered with `mark_seen_many`.
+    """
+    mask = candidate_mask(infos, category, version, candidates)
+    if not mask or not user_ids:
+        return {}
+    picks: Dict[int, int] = {}
+    marked: Dict[int, Tuple[bool, int, int]] = {}
+    for user_id, (has_row, seen, cycle) in _states(session, user_ids, version).items():
+        idx, seen, cycle = advance(seen, cycle, mask)
+        picks[user_id] = idx
+        marked[user_id] = (has_row, seen, cycle)
+    if not mark or _store(session, marked, version):
+        return picks
+    # a concurrent pick created some of the rows first; redo per user
+    if len(user_ids) == 1:
+        return pick_unseen_many(session, user_ids, infos, category, version, candidates) if _row_exists(session, user_ids[0]) else {}
+    picks = {}
+    for user_id in user_ids:
+        picks.update(pick_unseen_many(session, [user_id], infos, category, version, candidates))
+    return picks
+
+
+def mark_seen_many(session, picks: Dict[int, int], infos: List[Dict], category: Optional[str] = None, version: str = "",
+                   candidates: Optional[List[int]] = None, commit: bool = True) -> None:
+    """Mark `{user_id: info_index}` picks from `pick_unseen_many(..., mark=False)`
+    seen, starting a new cycle where the pick did.
+
+    With `commit=False` the writes are only flushed, so they are committed
+    together with the caller's own changes.
+    """
+    mask = candidate_mask(infos, category, version, candidates)
+    if not mask or not picks:
+        return
+    for _ in range(2):
+        marked: Dict[int, Tuple[bool, int, int]] = {}
+        for user_id, (has_row, seen, cycle) in _states(session, list(picks), version).items():
+            if not mask & ~seen:
+                seen &= ~mask
+                cycle += 1
+            marked[user_id] = (has_row, seen | (1 << picks[user_id]), cycle)
+        if _store(session, marked, version, commit):
+            return
+        # a concurrent pick created some of the rows first; mark on top of them
+
+
+def _row_exists(session, user_id: int) -> bool:
+    return session.get(UserSeenInfoBits, user_id) is not None
+
+
+def pick_unseen(session, user_id: int, infos: List[Dict], category: Optional[str] = None, version: str = "",
+                candidates: Optional[List[int]] = None, mark: bool = True) -> Optional[int]:
+    """Pick and mark one unseen info index for a single user (one row read, one row write)."""
+    return pick_unseen_many(session, [user_id], infos, category, version, candidates, mark).get(user_id)
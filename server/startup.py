@@ -0,0 +1,186 @@
+"""Startup preparation with a version stamp and per-phase timings.
+
+A full start runs the legacy migrations, `create_all`, the schema compat
+probes and (from main.py) the content seeder, then stores the schema and
+content versions in `AppStamp`. When CONTENT_BUNDLE_PATH is set, every start
+also rebuilds the compiled content bundle (server/bundle.py) there if it no
+longer matches the JSON files. With STARTUP_MODE=fast (the default) the next
+start reads that stamp first and skips all of it when both still match, so a
+rolling restart or a new autoscaled worker only loads the catalogs.
+"""
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlmodel import SQLModel, Session, select
+
+from .config import STARTUP_MODE
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTENT_FILES = ("manual_info.json", "manual_quiz.json", "manual_truefalse.json")
+
+
+class StartupReport:
+    def __init__(self):
+        self.mode = "pending"
+        self.phases: List[Tuple[str, float]] = []
+        self.failed: List[str] = []
+        self.bundle = "pending"
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def as_dict(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "phases_ms": {name: round(secs * 1000, 2) for name, secs in self.phases},
+            "total_ms": round(sum(secs for _, secs in self.phases) * 1000, 2),
+            "failed": list(self.failed),
+            "bundle": self.bundle,
+        }
+
+    def log(self) -> None:
+        d = self.as_dict()
+        parts = ", ".join(f"{k} {v:.1f}ms" for k, v in d["phases_ms"].items())
+        print(f"[startup] {d['mode']}: {parts} (total {d['total_ms']:.1f}ms)")
+
+
+report = StartupReport()
+_prepared = False
+
+
+def schema_version() -> str:
+    """Hash of every table/column/type and index the models define."""
+    h = hashlib.sha1()
+    for table in sorted(SQLModel.metadata.tables.values(), key=lambda t: t.name):
+        for col in table.columns:
+            h.update(f"{table.name}.{col.name}:{col.type}:{col.nullable};".encode("utf-8"))
+        for ix in sorted(table.indexes, key=lambda ix: ix.name or ""):
+            h.update(f"{ix.name}:{ix.unique};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def content_version(data_dir: Optional[str] = None) -> str:
+    h = hashlib.sha1()
+    data_dir = data_dir or os.path.join(REPO_ROOT, "data")
+    for name in CONTENT_FILES:
+        try:
+            with open(os.path.join(data_dir, name), "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"missing")
+        h.update(name.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def read_stamp(engine) -> Dict[str, str]:
+    from .models import AppStamp
+    try:
+        with Session(engine) as session:
+            return {k: v for k, v in session.exec(select(AppStamp.key, AppStamp.value)).all()}
+    except Exception:
+        # no stamp table yet: first start on this database
+        return {}
+
+
+def write_stamp(engine, values: Dict[str, str]) -> None:
+    from .models import AppStamp
+    with Session(engine) as session:
+        for key, value in values.items():
+            row = session.get(AppStamp, key)
+            if row is None:
+                session.add(AppStamp(key=key, value=value))
+            else:
+                row.value = value
+                session.add(row)
+        session.commit()
+
+
+def _run_legacy_migrations() -> None:
+    import importlib.util
+    mig_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "add_energy_used.py")
+    if not os.path.exists(mig_path):
+        return
+    spec = importlib.util.spec_from_file_location("add_energy_used", mig_path)
+    mig_mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mig_mod)
+    if hasattr(mig_mod, "main"):
+        mig_mod.main()
+
+
+def _ensure_bundle() -> str:
+    from . import content
+    from .bundle import ensure_bundle
+    if not content.CONTENT_BUNDLE_PATH:
+        # never write into the source tree unasked; `python -m server.bundle` builds the default one
+        return "not_configured"
+    try:
+        return ensure_bundle()
+    except Exception as e:
+        # e.g. a read-only data dir: the registry parses the JSON instead
+        print(f"Could not build the content bundle: {e}")
+        return "unavailable"
+
+
+def prepare_database(seed: Optional[Callable[[], object]] = None) -> bool:
+    """Bring the database up to the current schema (and content, when a
+    `seed` callable is given). Returns True when the stamp matched and the
+    work was skipped. Runs at most once per process.
+    """
+    global _prepared
+    if _prepared:
+        return report.mode == "fast"
+    from .db import engine, create_db_and_tables, _ensure_schema_compat
+
+    with report.phase("stamp"):
+        expected = {"schema": schema_version()}
+        if seed is not None:
+            expected["content"] = content_version()
+        stored = read_stamp(engine) if STARTUP_MODE == "fast" else {}
+    # the bundle lives on the local disk, so it is checked even on a fast start
+    with report.phase("bundle"):
+        report.bundle = _ensure_bundle()
+    if stored and all(stored.get(k) == v for k, v in expected.items()):
+        report.mode = "fast"
+        _prepared = True
+        return True
+
+    report.mode = "full"
+    with report.phase("migrations"):
+        try:
+            _run_legacy_migrations()
+        except Exception as e:
+            report.failed.append("migrations")
+            print(f"Startup migrations failed: {e}")
+    with report.phase("create_all"):
+        create_db_and_tables()
+    with report.phase("schema_compat"):
+        try:
+            if _ensure_schema_compat() is False:
+                report.failed.append("schema_compat")
+        except Exception as e:
+            report.failed.append("schema_compat")
+            print(f"Schema compatibility check failed: {e}")
+    if seed is not None and stored.get("content") != expected["content"]:
+        with report.phase("seed"):
+            seed()
+    if report.failed:
+        # no stamp: the next start runs the failed phases again
+        print(f"Not storing the startup stamp; failed phases: {', '.join(report.failed)}")
+    else:
+        try:
+            write_stamp(engine, expected)
+        except Exception as e:
+            print(f"Could not store startup stamp: {e}")
+    _prepared = True
+    return False
@@ -0,0 +1,207 @@
+"""Local verification of Firebase ID tokens.
+
+Tokens are RS256 JWTs signed by Google's `securetoken` service account. Instead
+of calling `firebase_admin.auth.verify_id_token` on every request, signatures are
+checked locally against a cached copy of the public certificates, and decoded
+claims are kept in a bounded cache until the token expires.
+
+The key source is pluggable: `GoogleCertKeySource` fetches and refreshes the
+published certificates, `StaticKeySource` serves a fixed set of keys (tests or
+local development with a self-issued signing key).
+"""
+import json
+import re
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, Optional
+
+from .cache import TTLCache
+from .config import FIREBASE_PROJECT_ID, TOKEN_CACHE_SIZE, init_firebase
+from .metrics import firebase_call
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+# Allowed skew between our clock and Google's when checking exp/iat.
+CLOCK_SKEW_SECONDS = 10
+
+
+class InvalidTokenError(ValueError):
+    pass
+
+
+def _load_public_key(material: Any):
+    """Accept an x509 certificate PEM, a public key PEM or an already-loaded key."""
+    if not isinstance(material, (str, bytes)):
+        return material
+    from cryptography import x509
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+    data = material.encode() if isinstance(material, str) else material
+    if b"BEGIN CERTIFICATE" in data:
+        return x509.load_pem_x509_certificate(data).public_key()
+    return load_pem_public_key(data)
+
+
+class StaticKeySource:
+    """Fixed `kid -> key` mapping; keys may be PEM strings or key objects."""
+
+    def __init__(self, keys: Dict[str, Any]):
+        self._keys = {kid: _load_public_key(k) for kid, k in keys.items()}
+
+    def get_keys(self, force: bool = False) -> Dict[str, Any]:
+        return self._keys
+
+
+class GoogleCertKeySource:
+    """Fetches Google's signing certificates and caches them for the
+    `Cache-Control: max-age` advertised by the response.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, min_refresh_seconds: float = 60.0,
+                 fetch: Optional[Callable[[str], tuple]] = None, clock: Callable[[], float] = time.time):
+        self.url = url
+        self.min_refresh_seconds = min_refresh_seconds
+        self._fetch = fetch or self._http_fetch
+        self._clock = clock
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _http_fetch(url: str) -> tuple:
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            body = json.loads(resp.read().decode("utf-8"))
+            max_age = 3600
+            m = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", "") or "")
+            if m:
+                max_age = int(m.group(1))
+        return body, max_age
+
+    def get_keys(self, force: bool = False) -> Dict[str, Any]:
+        now = self._clock()
+        if self._keys and now < self._expires_at and not force:
+            return self._keys
+        with self._lock:
+            now = self._clock()
+            fresh = self._keys and now < self._expires_at
+            # a forced refresh (unknown kid) is rate-limited so bad tokens can't hammer Google
+            if fresh and (not force or now - self._last_fetch < self.min_refresh_seconds):
+                return self._keys
+            try:
+                with firebase_call("fetch_certs"):
+                    certs, max_age = self._fetch(self.url)
+                self._keys = {kid: _load_public_key(pem) for kid, pem in certs.items()}
+                self._expires_at = now + max(int(max_age), 0)
+                self._last_fetch = now
+            except Exception as e:
+                if not self._keys:
+                    raise InvalidTokenError(f"Unable to fetch signing keys: {e}")
+                # keep serving the previous keys; retry after the refresh interval
+                self._expires_at = now + self.min_refresh_seconds
+            return self._keys
+
+
+class TokenVerifier:
+    def __init__(self, project_id: str, key_source=None, cache_size: int = 10000,
+                 clock: Callable[[], float] = time.time):
+        if not project_id:
+            raise ValueError("project_id is required for local token verification")
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.key_source = key_source or GoogleCertKeySource()
+        self._clock = clock
+        self._claims = TTLCache(maxsize=cache_size, clock=clock)
+
+    def cached(self, id_token: str) -> Optional[Dict]:
+        """Claims of an already verified, unexpired token, without any I/O."""
+        return self._claims.get(id_token)
+
+    def verify(self, id_token: str) -> Dict:
+        cached = self._claims.get(id_token)
+        if cached is not None:
+            return cached
+        claims = self._decode(id_token)
+        self._claims.set(id_token, claims, expires_at=float(claims["exp"]))
+        return claims
+
+    def _decode(self, id_token: str) -> Dict:
+        # PyJWT pulls in cryptography; import on the first uncached verify
+        import jwt
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(f"Malformed token: {e}")
+        if header.get("alg") != "RS256":
+            raise InvalidTokenError("Unexpected token algorithm")
+        kid = header.get("kid")
+        key = self.key_source.get_keys().get(kid)
+        if key is None:
+            key = self.key_source.get_keys(force=True).get(kid)
+        if key is None:
+            raise InvalidTokenError("Token signed by an unknown key")
+        try:
+            claims = jwt.decode(
+                id_token, key, algorithms=["RS256"], audience=self.project_id, issuer=self.issuer,
+                leeway=CLOCK_SKEW_SECONDS, options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e))
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise InvalidTokenError("Invalid subject claim")
+        auth_time = claims.get("auth_time")
+        if auth_time is not None and auth_time > self._clock() + CLOCK_SKEW_SECONDS:
+            raise InvalidTokenError("auth_time is in the future")
+        claims["uid"] = sub
+        return claims
+
+    def clear(self) -> None:
+        self._claims.clear()
+
+
+_verifier: Optional[TokenVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def configure(project_id: Optional[str] = None, key_source=None, cache_size: int = TOKEN_CACHE_SIZE) -> Optional[TokenVerifier]:
+    """(Re)build the process-wide verifier. Passing a `StaticKeySource` lets tests
+    sign tokens with a local key.
+    """
+    global _verifier
+    project_id = project_id or FIREBASE_PROJECT_ID
+    with _verifier_lock:
+        _verifier = TokenVerifier(project_id, key_source=key_source, cache_size=cache_size) if project_id else None
+    return _verifier
+
+
+def get_verifier() -> Optional[TokenVerifier]:
+    if _verifier is None and FIREBASE_PROJECT_ID:
+        configure()
+    return _verifier
+
+
+def verify_id_token(id_token: str) -> Dict:
+    """Verify a Firebase ID token, locally when a project id is known and
+    through firebase_admin otherwise.
+    """
+    verifier = get_verifier()
+    if verifier is not None:
+        return verifier.verify(id_token)
+    init_firebase()
+    from firebase_admin import auth
+    with firebase_call("verify_id_token"):
+        return auth.verify_id_token(id_token)
+
+
+async def verify_id_token_async(id_token: str) -> Dict:
+    """`verify_id_token` for async handlers: cached claims are returned inline,
+    anything that may block (certificate fetch, firebase_admin) runs on the
+    Firebase executor.
+    """
+    verifier = get_verifier()
+    if verifier is not None:
+        cached = verifier.cached(id_token)
+        if cached is not None:
+            return cached
+    from .executors import run_firebase
+    return await run_firebase(verify_id_token, id_token)
@@ -2,13 +2,17 @@ import json
 import random
 from datetime import date
 from typing import Optional, Dict
-from .config import MANUAL_INFOS, TRANSLATIONS, NOTIFICATION_FREQUENCY, load_manual_infos, SUBSCRIPTION_LIMITS, SUBSCRIPTION_ACCESS
+from .config import TRANSLATIONS, NOTIFICATION_FREQUENCY, SUBSCRIPTION_LIMITS, SUBSCRIPTION_ACCESS
+from .content import registry
 from .models import (
-    UserSeenInfo, DeviceToken, NotificationMetric, UserSubscription, UserScoreHistory,
+    DeviceToken, UserSubscription, UserScoreHistory,
     UserScore, UserStreak, UserEnergy
 )
+from .context import UserContext
+from .energy import effective_remaining_energy
+from .notifications import OutcomeCollector, build_batches, send_batch
+from .seen_infos import mark_seen_many, pick_unseen
 from sqlmodel import select, delete
-from firebase_admin import messaging
 
 
 def _get_rank_name(score: int) -> str:
@@ -20,12 +24,34 @@ def _get_rank_name(score: int) -> str:
     return 'Demir'
 
 
-def _get_user_access_level(db_user, session) -> Dict:
+def _quiz_points(level: Optional[str], streak_count: int) -> int:
+    """Points for a correct quiz answer: base score by subscription level plus a
+    streak bonus, doubled because quiz questions are worth twice a true/false one.
+    """
+    if level == "pro":
+        base_score = 15
+    elif level == "ultra":
+        base_score = 20
+    else:
+        base_score = 10
+    streak_bonus = min(streak_count, 5) * 2
+    return (base_score + streak_bonus) * 2
+
+
+def _get_user_access_level(db_user, session, ctx: Optional[UserContext] = None) -> Dict:
+    """Resolve subscription level and energy. When the request already loaded a
+    `UserContext`, its rows are reused instead of being selected again.
+    """
     today = date.today()
-    sub = session.exec(select(UserSubscription).where(UserSubscription.user_id == db_user.id)).first()
+    if ctx is not None:
+        sub = ctx.subscription
+    else:
+        sub = session.exec(select(UserSubscription).where(UserSubscription.user_id == db_user.id)).first()
     if not sub:
         sub = UserSubscription(user_id=db_user.id)
         session.add(sub); session.commit(); session.refresh(sub)
+        if ctx is not None:
+            ctx.subscription = sub
     if sub.expires_at and sub.expires_at < today:
         sub.level, sub.expires_at = "free", None
         session.add(sub); session.commit()
@@ -35,30 +61,13 @@ def _get_user_access_level(db_user, session) -> Dict:
     energy_per_day = int(access.get("energy_per_day", 3))
     session_seconds = int(access.get("session_seconds", 60))
 
-    # Persisted per-user energy row; reset lazily when date changes.
-    user_energy = session.exec(select(UserEnergy).where(UserEnergy.user_id == db_user.id)).first()
-    if not user_energy:
-        # create with full energy
-        user_energy = UserEnergy(user_id=db_user.id, remaining_energy=energy_per_day, last_reset=today)
-        try:
-            session.add(user_energy)
-            session.commit()
-            session.refresh(user_energy)
-        except Exception:
-            session.rollback()
-            user_energy = None
+    # Persisted per-user energy row; the daily reset is applied lazily by
+    # energy.consume_energy, so this read path never writes.
+    if ctx is not None:
+        user_energy = ctx.energy
     else:
-        try:
-            if not getattr(user_energy, 'last_reset', None) or user_energy.last_reset < today:
-                user_energy.remaining_energy = energy_per_day
-                user_energy.last_reset = today
-                session.add(user_energy)
-                session.commit()
-                session.refresh(user_energy)
-        except Exception:
-            session.rollback()
-
-    remaining_energy = int(user_energy.remaining_energy) if user_energy else energy_per_day
+        user_energy = session.exec(select(UserEnergy).where(UserEnergy.user_id == db_user.id)).first()
+    remaining_energy = effective_remaining_energy(user_energy, energy_per_day, today)
 
     return {
         "level": level,
@@ -84,112 +93,80 @@ def _get_info_text(info_obj: Dict, lang: str) -> str:
 
 
 def _select_unseen_info_for_user(session, db_user, category: Optional[str] = None):
-    if not MANUAL_INFOS:
+    """Pick a random info the user has not seen in the current cycle; starts a
+    new cycle once every candidate was shown. Nothing is marked seen here:
+    `_send_notification_to_user` does that once the info was delivered.
+    """
+    infos = registry.current.infos
+    if not infos.items:
+        return None
+    candidates = infos.by_category.get(category, []) if category is not None else None
+    if category is not None and not candidates:
         return None
-    candidate_indices = [i for i, it in enumerate(MANUAL_INFOS) if (category is None or it.get("category") == category)]
-    if not candidate_indices:
+    chosen_idx = pick_unseen(session, db_user.id, infos.items, category, infos.version, candidates, mark=False)
+    if chosen_idx is None:
         return None
+    return (chosen_idx, infos.items[chosen_idx])
 
-    seen_rows = session.exec(select(UserSeenInfo.info_index).where(UserSeenInfo.user_id == db_user.id)).all()
-    seen_set = set()
-    for item in seen_rows:
-        if isinstance(item, (list, tuple)):
-            if item:
-                seen_set.add(item[0])
-        else:
-            seen_set.add(item)
 
-    unseen = [i for i in candidate_indices if i not in seen_set]
-    if not unseen:
-        session.exec(delete(UserSeenInfo).where(UserSeenInfo.user_id == db_user.id))
-        session.commit()
-        unseen = candidate_indices.copy()
+def _merge_retry_results(results) -> Optional[Dict]:
+    """None when nothing was retried, else summed retry counts and/or the last error."""
+    if not results:
+        return None
+    merged: Dict = {}
+    counted = [r for r in results if "error" not in r]
+    if counted:
+        merged["success_count"] = sum(r["success_count"] for r in counted)
+        merged["failure_count"] = sum(r["failure_count"] for r in counted)
+    errors = [r["error"] for r in results if "error" in r]
+    if errors:
+        merged["error"] = errors[-1]
+    return merged
+
 
-    chosen_idx = random.choice(unseen)
-    return (chosen_idx, MANUAL_INFOS[chosen_idx])
+def _mark_info_seen(session, db_user, info_idx: int, category: Optional[str] = None) -> None:
+    infos = registry.current.infos
+    candidates = infos.by_category.get(category, []) if category is not None else None
+    mark_seen_many(session, {db_user.id: info_idx}, infos.items, category, infos.version, candidates)
 
 
-def _send_notification_to_user(session, db_user, info_idx: int, info_obj: Dict) -> Dict:
+def _send_notification_to_user(session, db_user, info_idx: int, info_obj: Dict, category: Optional[str] = None) -> Dict:
     lang = db_user.language_code or "en"
     body = _get_info_text(info_obj, lang)
     title = info_obj.get("category", "SparkUp")
 
-    tokens = session.exec(select(DeviceToken).where(DeviceToken.user_id == db_user.id)).all()
-    token_list = [t.token for t in tokens] if tokens else []
+    token_list = session.exec(select(DeviceToken.token).where(DeviceToken.user_id == db_user.id)).all()
 
     send_result = {"sent": False, "tokens_targeted": len(token_list)}
     try:
         if token_list:
-            message = messaging.MulticastMessage(
-                tokens=token_list,
-                notification=messaging.Notification(title=title, body=body),
-                data={"type": "info", "info_index": str(info_idx)}
-            )
-            resp = messaging.send_multicast(message)
-            send_result.update({"success_count": resp.success_count, "failure_count": resp.failure_count})
-
-            bad_tokens = []
-            retry_tokens = []
-            for i, r in enumerate(resp.responses):
-                if not getattr(r, 'success', False):
-                    tok = token_list[i]
-                    exc = getattr(r, 'exception', None)
-                    exc_text = str(exc).lower() if exc else ''
-                    if any(x in exc_text for x in ["not-registered", "registration-token-not-registered", "invalid-registration-token", "invalid-argument"]):
-                        bad_tokens.append(tok)
-                    else:
-                        retry_tokens.append(tok)
-                else:
-                    try:
-                        session.exec(
-                            select(DeviceToken).where(DeviceToken.token == token_list[i])
-                        ).one()
-                        session.exec((DeviceToken.__table__.update().where(DeviceToken.token == token_list[i]).values(last_seen=date.today())))
-                        session.commit()
-                    except Exception:
-                        session.rollback()
-
-            removed = []
-            if bad_tokens:
-                try:
-                    session.exec(delete(DeviceToken).where(DeviceToken.token.in_(bad_tokens)))
-                    session.commit()
-                    removed = bad_tokens
-                except Exception:
-                    session.rollback()
-
-            try:
-                metric = NotificationMetric(metric_date=date.today(), removed_tokens=len(removed), attempts=len(token_list))
-                session.add(metric)
-                session.commit()
-            except Exception:
-                session.rollback()
-
-            retry_result = None
-            if retry_tokens:
-                try:
-                    retry_msg = messaging.MulticastMessage(
-                        tokens=retry_tokens,
-                        notification=messaging.Notification(title=title, body=body),
-                        data={"type": "info", "info_index": str(info_idx)}
-                    )
-                    retry_resp = messaging.send_multicast(retry_msg)
-                    retry_result = {"success_count": retry_resp.success_count, "failure_count": retry_resp.failure_count}
-                except Exception as e:
-                    retry_result = {"error": str(e)}
-
-            send_result.update({"removed_tokens": removed, "retry": retry_result})
+            # per-token outcomes are collected and written back in bulk
+            collector = OutcomeCollector()
+            for batch in build_batches([(info_idx, lang, title, body, list(token_list))]):
+                collector.add(send_batch(batch))
+            summary = collector.apply(session)
+            outcomes = collector.outcomes
+            first_success = sum(o.first_success for o in outcomes)
+            send_result.update({
+                # first attempt only, as before; the retry is reported under "retry"
+                "success_count": first_success,
+                "failure_count": len(token_list) - first_success,
+                "removed_tokens": collector.bad_tokens if summary["removed_tokens"] else [],
+                "retry": _merge_retry_results([o.retry_result for o in outcomes if o.retry_result is not None]),
+                # totals after the retry
+                "delivered": summary["delivered"],
+                "retried": sum(o.retried for o in outcomes),
+                "failed": summary["failed"],
+            })
+            errors = [o.first_error for o in outcomes if o.first_error]
+            if errors:
+                send_result["error"] = errors[-1]
+            if summary["delivered"]:
+                _mark_info_seen(session, db_user, info_idx, category)
         else:
             send_result.update({"note": "no_device_tokens"})
     except Exception as e:
         send_result.update({"error": str(e)})
 
-    try:
-        session.add(UserSeenInfo(user_id=db_user.id, info_index=info_idx))
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        send_result.update({"persist_error": str(e)})
-
     send_result["sent"] = True
     return send_result
@@ -0,0 +1,17 @@
+import os
+
+# server package creates its engine on import
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def content_bundle_path(tmp_path_factory):
+    """Startup builds the content bundle here instead of in data/."""
+    from server import content
+    mp = pytest.MonkeyPatch()
+    path = str(tmp_path_factory.mktemp("bundle") / "content.bundle")
+    mp.setattr(content, "CONTENT_BUNDLE_PATH", path)
+    yield path
+    mp.undo()
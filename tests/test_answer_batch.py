@@ -0,0 +1,88 @@
+import os
+import json
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from server import auth
+from server.app import app
+from server.db import engine
+from server.models import QuizQuestion
+from server.quiz_catalog import invalidate_catalog
+
+
+def _fake_verify(token):
+    return {"uid": token, "email": f"{token}@example.com"}
+
+
+async def _fake_verify_async(token):
+    return _fake_verify(token)
+
+
+@pytest.fixture(scope="module")
+def client():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(auth, "verify_id_token", _fake_verify)
+    mp.setattr(auth, "verify_id_token_async", _fake_verify_async)
+    with TestClient(app) as c:
+        yield c
+    mp.undo()
+
+
+@pytest.fixture(scope="module")
+def questions(client):
+    with Session(engine) as session:
+        rows = [QuizQuestion(question_texts=json.dumps({"en": f"Batch {i}?"}), options_texts=json.dumps({"en": ["a", "b", "c"]}), correct_answer_index=i % 3, category="general") for i in range(3)]
+        session.add_all(rows)
+        session.commit()
+        ids = [(q.id, q.correct_answer_index) for q in rows]
+    invalidate_catalog()
+    return ids
+
+
+def _headers(uid):
+    return {"Authorization": f"Bearer {uid}"}
+
+
+def _session_answers(questions):
+    (q1, c1), (q2, c2), (q3, c3) = questions
+    # correct, correct, a repeat of the first, wrong
+    return [{"question_id": q1, "answer_index": c1}, {"question_id": q2, "answer_index": c2},
+            {"question_id": q1, "answer_index": c1}, {"question_id": q3, "answer_index": (c3 + 1) % 3}]
+
+
+def test_batch_scores_like_single_answers(client, questions):
+    answers = _session_answers(questions)
+    singles = [client.post("/quiz/answer/", headers=_headers("batch-single"), json=a).json() for a in answers]
+    r = client.post("/quiz/answer/batch/", headers=_headers("batch-many"), json={"answers": answers})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["results"] == singles
+    assert [x["score_awarded"] for x in body["results"]] == [20, 24, 0, 0]  # free level, +2 per streak step, doubled
+    assert [x["correct"] for x in body["results"]] == [True, True, True, False]
+    assert body["final_score"] == singles[-1]["new_score"] and body["streak"] == 0
+    profile = client.get("/user/profile/", headers=_headers("batch-many")).json()
+    assert profile["score"] == body["final_score"] and profile["current_streak"] == 0
+
+    again = client.post("/quiz/answer/batch/", headers=_headers("batch-many"), json={"answers": answers}).json()
+    assert all(x["score_awarded"] == 0 for x in again["results"]) and again["final_score"] == body["final_score"]
+
+
+def test_batch_does_not_spend_energy(client, questions):
+    uid = "batch-energy"
+    start = client.get("/user/profile/", headers=_headers(uid)).json()["remaining_energy"]
+    assert client.get("/quiz/?consume=true", headers=_headers(uid)).status_code == 200
+    after_quiz = client.get("/user/profile/", headers=_headers(uid)).json()["remaining_energy"]
+    assert after_quiz == start - 1
+    assert client.post("/quiz/answer/batch/", headers=_headers(uid), json={"answers": _session_answers(questions)}).status_code == 200
+    assert client.get("/user/profile/", headers=_headers(uid)).json()["remaining_energy"] == after_quiz
+
+
+def test_batch_rejects_empty_and_unknown(client, questions):
+    assert client.post("/quiz/answer/batch/", headers=_headers("batch-bad"), json={"answers": []}).status_code == 400
+    r = client.post("/quiz/answer/batch/", headers=_headers("batch-bad"), json={"answers": [{"question_id": 10**9, "answer_index": 0}]})
+    assert r.status_code == 404
+    assert client.get("/user/profile/", headers=_headers("batch-bad")).json()["score"] == 0
@@ -0,0 +1,91 @@
+"""Async routes against a real file-SQLite AsyncEngine.
+
+The other tests use in-memory SQLite, which has no async engine, so
+`get_async_session` falls back to `ThreadedSession` there. Here `db.async_engine`
+points at an aiosqlite engine, so the handlers' `run_sync` work runs in a
+greenlet on the event-loop thread, like in production.
+
+The scenario runs in a subprocess: a blocked event loop never returns, and
+aiosqlite's worker threads would then keep the test process from exiting.
+"""
+import os
+import sys
+import json
+import asyncio
+import subprocess
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _fake_verify(token):
+    return {"uid": token, "email": f"{token}@example.com"}
+
+
+async def _fake_verify_async(token):
+    return _fake_verify(token)
+
+
+def _setup(db_path):
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+    from sqlmodel import Session, SQLModel
+    from server import auth, db
+    from server.models import QuizQuestion
+
+    url = f"sqlite:///{db_path}"
+    sync_engine = db.build_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    with Session(sync_engine) as session:
+        for i in range(20):
+            session.add(QuizQuestion(
+                question_texts=json.dumps({"en": f"Async {i}?"}),
+                options_texts=json.dumps({"en": ["a", "b"]}),
+                correct_answer_index=0, category="general",
+            ))
+        session.commit()
+    db.async_engine = db.build_async_engine(db.async_url_for(url))
+    auth.verify_id_token = _fake_verify
+    auth.verify_id_token_async = _fake_verify_async
+
+    @event.listens_for(db.async_engine.sync_engine, "before_cursor_execute")
+    def _slow_id_query(conn, cursor, statement, params, context, executemany):
+        # a slow id query on a real server: the loop runs other requests meanwhile
+        if "ORDER BY quizquestion.id" in statement:
+            await_only(asyncio.sleep(0.2))
+
+
+async def _cold_quiz_burst(n):
+    import httpx
+    from server import db
+    from server.app import app
+    from server.quiz_catalog import invalidate_catalog
+
+    headers = [{"Authorization": f"Bearer async-user-{i}"} for i in range(n)]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for h in headers:
+            # create the users first so the burst below reaches the id query together
+            assert (await client.get("/user/profile/", headers=h)).status_code == 200
+        invalidate_catalog()  # also drops the shared question id list
+        responses = await asyncio.gather(*(client.get("/quiz/?limit=3", headers=h) for h in headers))
+    await db.async_engine.dispose()
+    return [(r.status_code, len(r.json())) for r in responses]
+
+
+def test_concurrent_cold_quiz_requests_do_not_block_the_loop(tmp_path):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, DATABASE_URL="sqlite:///:memory:")
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), str(tmp_path / "async.db")],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=30,
+        )
+    except subprocess.TimeoutExpired:
+        raise AssertionError("event loop blocked")
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == [[200, 3]] * 40
+
+
+if __name__ == "__main__":
+    _setup(sys.argv[1])
+    print(json.dumps(asyncio.run(_cold_quiz_burst(40))))
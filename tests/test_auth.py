@@ -0,0 +1,75 @@
+import os
+import time
+
+# server package creates its engine on import
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from server.tokens import TokenVerifier, StaticKeySource, InvalidTokenError
+
+PROJECT = "sparkup-test"
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+class CountingKeySource(StaticKeySource):
+    def __init__(self, keys):
+        super().__init__(keys)
+        self.calls = 0
+
+    def get_keys(self, force=False):
+        self.calls += 1
+        return super().get_keys(force)
+
+
+def _make_token(key, kid="k1", **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT}",
+        "aud": PROJECT,
+        "sub": "uid-123",
+        "iat": now,
+        "exp": now + 3600,
+        "auth_time": now,
+        "email": "a@example.com",
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+def test_verify_and_cache_claims(signing_key):
+    source = CountingKeySource({"k1": signing_key.public_key()})
+    verifier = TokenVerifier(PROJECT, key_source=source)
+    token = _make_token(signing_key)
+
+    claims = verifier.verify(token)
+    assert claims["uid"] == "uid-123"
+    assert claims["email"] == "a@example.com"
+    calls = source.calls
+    assert verifier.verify(token) is claims
+    assert source.calls == calls
+
+
+def test_rejects_bad_audience_unknown_kid_and_expired(signing_key):
+    verifier = TokenVerifier(PROJECT, key_source=StaticKeySource({"k1": signing_key.public_key()}))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(_make_token(signing_key, aud="other-project"))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(_make_token(signing_key, kid="unknown"))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(_make_token(signing_key, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600))
+
+
+def test_cached_claims_expire_with_token(signing_key):
+    now = [time.time()]
+    verifier = TokenVerifier(PROJECT, key_source=StaticKeySource({"k1": signing_key.public_key()}), clock=lambda: now[0])
+    token = _make_token(signing_key, exp=int(now[0]) + 60)
+    verifier.verify(token)
+    now[0] += 120
+    assert verifier._claims.get(token) is None
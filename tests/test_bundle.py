@@ -0,0 +1,77 @@
+import os
+import json
+import random
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from server.bundle import BundleInfoCatalog, BundleTrueFalseCatalog, build_bundle, ensure_bundle, file_digest, open_bundle
+from server.content import InfoCatalog, TrueFalseCatalog, _open_bundle, legacy_truefalse_body
+
+INFOS = [
+    {"category": "history", "info_texts": {"en": "Zanzibar", "tr": "Zanzibar'da"}, "source": "Wiki"},
+    {"category": "space", "info_texts": {"en": "Light-year", "de": ""}, "source": None},
+    {"category": "history", "info_texts": {"en": "Ünicode ✓"}},
+]
+TRUEFALSE = [
+    {"category": "space", "question": {"en": "The sun is a star.", "tr": "Güneş bir yıldızdır."}, "correct_answer": True},
+    {"question": "Plain string question", "correct_answer": False},
+]
+
+
+def test_bundle_matches_the_json_catalogs(tmp_path):
+    path = str(tmp_path / "content.bundle")
+    build_bundle(INFOS, TRUEFALSE, path, {"infos": "a", "truefalse": "b"})
+    bundle = open_bundle(path)
+    infos, tf = BundleInfoCatalog(bundle), BundleTrueFalseCatalog(bundle)
+    ref_infos, ref_tf = InfoCatalog(INFOS), TrueFalseCatalog(TRUEFALSE)
+
+    assert (infos.version, tf.version) == (ref_infos.version, ref_tf.version)
+    assert list(infos.items) == INFOS and list(tf.items) == TRUEFALSE
+    assert {c: list(ix) for c, ix in infos.by_category.items()} == ref_infos.by_category
+    assert {c: list(ix) for c, ix in tf.by_category.items()} == ref_tf.by_category
+    assert infos.summary == ref_infos.summary and tf.summary == ref_tf.summary
+    for i in range(len(INFOS)):
+        for lang in ("en", "tr", "de", "xx"):
+            assert infos.text(i, lang) == ref_infos.text(i, lang)
+        assert (infos.category(i), infos.source(i)) == (ref_infos.category(i), ref_infos.source(i))
+    for lang, rows in ref_tf.payloads.items():
+        assert list(tf.payloads[lang]) == rows
+    assert random.sample(infos.by_category["history"], 2) in ([0, 2], [2, 0])
+
+
+def test_stale_bundle_is_ignored(tmp_path):
+    info_path, tf_path, path = str(tmp_path / "i.json"), str(tmp_path / "t.json"), str(tmp_path / "c.bundle")
+    for p, items in ((info_path, INFOS), (tf_path, TRUEFALSE)):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+    build_bundle(INFOS, TRUEFALSE, path, {"infos": file_digest(info_path), "truefalse": file_digest(tf_path)})
+    assert _open_bundle(path, info_path, tf_path) is not None
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(INFOS[:1], f)
+    assert _open_bundle(path, info_path, tf_path) is None
+
+
+def test_ensure_bundle_rebuilds_only_when_stale(tmp_path):
+    info_path, tf_path, path = str(tmp_path / "i.json"), str(tmp_path / "t.json"), str(tmp_path / "c.bundle")
+    for p, items in ((info_path, INFOS), (tf_path, TRUEFALSE)):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+    assert ensure_bundle(path, info_path, tf_path) == "built"
+    assert ensure_bundle(path, info_path, tf_path) == "fresh"
+    assert _open_bundle(path, info_path, tf_path) is not None
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(INFOS[:1], f)
+    assert ensure_bundle(path, info_path, tf_path) == "built"
+    infos, _ = _open_bundle(path, info_path, tf_path)
+    assert list(infos.items) == INFOS[:1]
+
+
+def test_legacy_truefalse_body_is_the_same_on_both_backends(tmp_path):
+    path = str(tmp_path / "content.bundle")
+    build_bundle(INFOS, TRUEFALSE + [{}], path, {"infos": "a", "truefalse": "b"})
+    bundle_tf, json_tf = BundleTrueFalseCatalog(open_bundle(path)), TrueFalseCatalog(TRUEFALSE + [{}])
+    for seconds in (None, 90):
+        expected = [dict(it, session_seconds=seconds) for it in TRUEFALSE + [{}]]
+        assert json.loads(legacy_truefalse_body(json_tf, seconds)) == expected
+        assert legacy_truefalse_body(bundle_tf, seconds) == legacy_truefalse_body(json_tf, seconds)
+    assert legacy_truefalse_body(bundle_tf, 90) is legacy_truefalse_body(bundle_tf, 90)  # joined once
@@ -0,0 +1,104 @@
+import os
+import json
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from server import auth, routes
+from server.app import app
+from server.content import registry
+from server.db import engine
+from server.leaderboard import leaderboard
+from server.models import QuizQuestion, User, UserEnergy
+from server.quiz_catalog import invalidate_catalog
+
+
+def _fake_verify(token):
+    return {"uid": token, "email": f"{token}@example.com"}
+
+
+async def _fake_verify_async(token):
+    return _fake_verify(token)
+
+
+@pytest.fixture(scope="module")
+def client():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(auth, "verify_id_token", _fake_verify)
+    mp.setattr(auth, "verify_id_token_async", _fake_verify_async)
+    with TestClient(app) as c:
+        previous = registry.current
+        yield c
+        registry.publish(infos=previous.infos, truefalse=previous.truefalse)
+    mp.undo()
+
+
+def _energy(uid):
+    with Session(engine) as session:
+        return session.exec(select(UserEnergy.remaining_energy).join(User).where(User.firebase_uid == uid)).one()
+
+
+def _revalidate(client, url, etag, **kwargs):
+    return client.get(url, headers=dict(kwargs.pop("headers", {}), **{"If-None-Match": etag}), **kwargs)
+
+
+def test_quiz_localize_is_revalidated_with_a_strong_etag(client, monkeypatch):
+    with Session(engine) as session:
+        q = QuizQuestion(question_texts=json.dumps({"en": "Cached?", "tr": "Önbellekte mi?"}), options_texts=json.dumps({"en": ["y", "n"]}), correct_answer_index=0, category="general")
+        session.add(q)
+        session.commit()
+        qid = q.id
+    url = f"/quiz/localize/?ids={qid}&lang=en"
+    r = client.get(url)
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and not etag.startswith("W/")
+    assert r.json()[0]["question_text"] == "Cached?"
+    assert "max-age" in r.headers["cache-control"]
+    def untouched(*args, **kwargs):
+        raise AssertionError("a revalidation must not build the body")
+    with monkeypatch.context() as m:
+        m.setattr(routes, "get_localized_questions", untouched)
+        again = _revalidate(client, url, f'"other", {etag}')
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert _revalidate(client, f"/quiz/localize/?ids={qid}&lang=tr", etag).status_code == 200
+    invalidate_catalog()  # reseeded content
+    assert _revalidate(client, url, etag).status_code == 200
+
+
+def test_leaderboard_etag_follows_the_generation(client):
+    leaderboard.invalidate()
+    r = client.get("/leaderboard/?limit=10")
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and etag.startswith("W/")
+    assert _revalidate(client, "/leaderboard/?limit=10", etag).status_code == 304
+    assert _revalidate(client, "/leaderboard/?limit=5", etag).status_code == 200
+    leaderboard.record_score(10**6, 10**9, email="top@example.com")
+    changed = _revalidate(client, "/leaderboard/?limit=10", etag)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()[0]["email"] == "top@example.com"
+
+
+def test_truefalse_etags_track_the_content_version(client):
+    registry.publish(truefalse=[{"category": "General", "question": {"en": f"Q{i}"}, "correct_answer": True} for i in range(4)])
+    status = client.get("/debug/manual_truefalse_status/")
+    assert status.json()["count"] == 4
+    assert _revalidate(client, "/debug/manual_truefalse_status/", status.headers["etag"]).status_code == 304
+
+    headers = {"Authorization": "Bearer etag-player"}
+    url = "/manual/truefalse/?limit=2&shuffle=false"
+    r = client.get(url, headers=headers)
+    assert r.status_code == 200 and r.headers["cache-control"].startswith("private")
+    remaining = _energy("etag-player")
+    assert _revalidate(client, url, r.headers["etag"], headers=headers).status_code == 304
+    assert _energy("etag-player") == remaining  # a revalidation is not charged
+    full = client.get("/manual/truefalse/", headers=headers)
+    assert _revalidate(client, "/manual/truefalse/", full.headers["etag"], headers=headers).status_code == 304
+    assert _energy("etag-player") == remaining - 1
+    shuffled = client.get("/manual/truefalse/?limit=2", headers=headers)
+    assert "etag" not in shuffled.headers and shuffled.headers["cache-control"] == "no-store"
+
+    registry.publish(truefalse=[{"category": "General", "question": {"en": "New"}, "correct_answer": False}])
+    assert _revalidate(client, "/debug/manual_truefalse_status/", status.headers["etag"]).status_code == 200
@@ -0,0 +1,121 @@
+import os
+import json
+import threading
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from server.content import ContentRegistry
+
+
+def _infos(n):
+    return [{"category": f"c{i % 3}", "info_texts": {"en": f"Info {i}"}} for i in range(n)]
+
+
+def _truefalse(n):
+    return [{"category": "General", "question": {"en": f"Q{i}", "tr": f"S{i}"}, "correct_answer": i % 2 == 0} for i in range(n)]
+
+
+def _write(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f)
+
+
+def test_reload_publishes_a_new_snapshot_and_keeps_it_on_failure(tmp_path):
+    info_path, tf_path = str(tmp_path / "info.json"), str(tmp_path / "tf.json")
+    _write(info_path, _infos(5))
+    _write(tf_path, _truefalse(4))
+    reg = ContentRegistry()
+    first = reg.load(info_path, tf_path, initial=True)
+    assert (len(first.infos.items), len(first.truefalse.items)) == (5, 4)
+    assert first.truefalse.payloads["tr"][1] == '{"id":1,"category":"General","question_text":"S1","correct_answer":false}'
+    assert not reg.changed_on_disk()
+
+    with open(info_path, "w", encoding="utf-8") as f:
+        f.write("[{broken")
+    _write(tf_path, _truefalse(6))
+    assert reg.changed_on_disk()
+    second = reg.load()
+    assert second is reg.current and second.generation == first.generation + 1
+    assert second.infos is first.infos  # unreadable file: previous catalog kept
+    assert len(second.truefalse.items) == 6
+    assert reg.status()["last_error"]
+
+
+def test_readers_never_see_a_partial_catalog(tmp_path):
+    info_path, tf_path = str(tmp_path / "info.json"), str(tmp_path / "tf.json")
+    _write(info_path, _infos(10))
+    _write(tf_path, _truefalse(10))
+    reg = ContentRegistry()
+    reg.load(info_path, tf_path, initial=True)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            snap = reg.current
+            n = len(snap.infos.items)
+            if n == 0 or snap.infos.summary["total"] != n or sum(len(ix) for ix in snap.infos.by_category.values()) != n:
+                errors.append(n)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for i in range(20):
+        _write(info_path, _infos(10 + i * 7))
+        reg.load()
+    stop.set()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(reg.current.infos.items) == 10 + 19 * 7
+
+
+def test_watcher_picks_up_file_changes(tmp_path):
+    import time
+    info_path, tf_path = str(tmp_path / "info.json"), str(tmp_path / "tf.json")
+    _write(info_path, _infos(3))
+    _write(tf_path, _truefalse(3))
+    reg = ContentRegistry()
+    first = reg.load(info_path, tf_path, initial=True)
+    reg.start_watcher(0.02)
+    try:
+        assert reg.status()["watching"]
+        _write(info_path, _infos(4))
+        deadline = time.time() + 5
+        while reg.current.infos.version == first.infos.version and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        reg.stop_watcher()
+    assert len(reg.current.infos.items) == 4
+    assert not reg.status()["watching"]
+
+
+def test_category_summaries_are_served_from_the_index():
+    from fastapi.testclient import TestClient
+    from server.app import app
+    from server.content import registry
+    infos = [
+        {"category": "space", "info_texts": {"en": "Orbit", "tr": "Yörünge"}},
+        {"category": "history", "info_texts": {"en": "Rome", "tr": ""}},
+        {"category": "space", "info_texts": {"en": "Comet", "de": "Komet"}},
+    ]
+    truefalse = [{"question": "Plain", "correct_answer": True}, {"category": "Space", "question": {"en": "Sun", "tr": "Güneş"}}]
+    with TestClient(app) as client:
+        previous = registry.current
+        try:
+            registry.publish(infos=infos, truefalse=truefalse)
+            assert client.get("/info/categories/").json() == {
+                "total": 3,
+                "categories": [{"category": "space", "count": 2}, {"category": "history", "count": 1}],
+                "languages": {"de": 1, "en": 3, "tr": 1},  # empty texts don't count
+            }
+            assert client.get("/manual/truefalse/categories/").json() == {
+                "total": 2,
+                "categories": [{"category": "General", "count": 1}, {"category": "Space", "count": 1}],
+                "languages": {"en": 2, "tr": 1},
+            }
+            registry.publish(infos=[], truefalse=[])
+            assert client.get("/info/categories/").status_code == 404
+            assert client.get("/manual/truefalse/categories/").status_code == 404
+        finally:
+            registry.publish(infos=previous.infos, truefalse=previous.truefalse)
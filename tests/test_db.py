@@ -0,0 +1,43 @@
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from server import db
+from server.app import app
+
+
+def test_default_profile_keeps_sqlalchemy_defaults(monkeypatch):
+    for env in ("DB_POOL_SIZE", "DB_POOL_TIMEOUT", "DB_STATEMENT_TIMEOUT_MS"):
+        monkeypatch.delenv(env, raising=False)
+    assert db.DB_PROFILE == "default"
+    assert db.engine_profile() == db.ENGINE_PROFILES["default"]
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    assert db.engine_profile("web")["pool_size"] == 3
+    assert db.engine_profile("web")["statement_timeout_ms"] == 15000
+
+
+def test_file_sqlite_gets_pragmas_and_pool_stats(tmp_path):
+    engine = db.build_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == db.SQLITE_BUSY_TIMEOUT_MS
+        status = db.get_pool_status(engine)
+    finally:
+        engine.dispose()
+    assert status["pool"] == "_TimedQueuePool" and status["profile"] == db.DB_PROFILE
+    assert status["size"] == db.ENGINE_PROFILES["default"]["pool_size"]
+    assert status["checked_out"] == 0 and status["acquired"] >= 1
+    for key in ("checked_in", "overflow", "max_overflow", "timeouts", "wait_seconds_total", "wait_seconds_max", "wait_seconds_avg"):
+        assert key in status
+
+
+def test_debug_db_pool_endpoint():
+    with TestClient(app) as client:
+        body = client.get("/debug/db_pool/").json()
+    assert body["pool"] == "StaticPool" and body["profile"] == db.DB_PROFILE
+    assert {"acquired", "timeouts", "wait_seconds_avg"} <= set(body)
@@ -0,0 +1,138 @@
+import os
+import json
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel
+
+from server import ingest as ingest_mod
+from server.db import _ensure_content_columns
+from server.ingest import SPECS, ingest, iter_json_array
+
+
+def _write(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=2)
+
+
+def _quiz(i, answer=0):
+    return {"category": "general", "correct_answer_index": answer,
+            "question_texts": {"en": f"Question {i}?", "tr": f"Soru {i}?"},
+            "options_texts": {"en": ["a", "b", "c", "d"]}}
+
+
+def test_iter_json_array_across_chunk_boundaries(tmp_path):
+    path = str(tmp_path / "items.json")
+    items = [_quiz(i) for i in range(50)] + [1, "x, ]", [2, 3], None]
+    _write(path, items)
+    for chunk_size in (1, 7, 1 << 16):
+        assert list(iter_json_array(path, chunk_size)) == items
+
+
+def test_ingest_only_writes_new_and_changed_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    SQLModel.metadata.create_all(engine)
+    path = str(tmp_path / "quiz.json")
+    spec = SPECS["quiz"]
+
+    _write(path, [_quiz(i) for i in range(10)])
+    assert ingest(engine, spec, path, batch_size=3) == {"inserted": 10, "updated": 0, "unchanged": 0, "retired": 0}
+    assert ingest(engine, spec, path, batch_size=3) == {"inserted": 0, "updated": 0, "unchanged": 10, "retired": 0}
+
+    items = [_quiz(i) for i in range(12)]
+    items[4] = _quiz(4, answer=2)
+    _write(path, items)
+    assert ingest(engine, spec, path, batch_size=3) == {"inserted": 2, "updated": 1, "unchanged": 9, "retired": 0}
+
+    with engine.connect() as conn:
+        assert conn.execute(text("select count(*) from quizquestion")).scalar() == 12
+        answer = conn.execute(text("select correct_answer_index from quizquestion where question_texts like '%Question 4?%'")).scalar()
+    assert answer == 2
+
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("select id, question_texts from quizquestion order by id")).all()
+
+
+def _live_ids(engine):
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text("select id from quizquestion where not retired order by id"))]
+
+
+def test_removed_items_are_retired_and_keep_user_history(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    SQLModel.metadata.create_all(engine)
+    path = str(tmp_path / "quiz.json")
+    spec = SPECS["quiz"]
+    items = [_quiz(i) for i in range(5)]
+    _write(path, items)
+    ingest(engine, spec, path)
+    ids = [r[0] for r in _rows(engine)]
+    with engine.begin() as conn:
+        for qid in (ids[1], ids[3]):
+            conn.execute(text(f"insert into useransweredquestion (user_id, quizquestion_id) values (1, {qid})"))
+            conn.execute(text(f"insert into useranswerrecord (user_id, quizquestion_id, correct, timestamp) values (1, {qid}, 1, '2026-01-01')"))
+
+    # an edited text without an explicit key is a new item: fresh id, old row retired
+    items[1] = dict(items[1], question_texts={"en": "Edited 1?", "tr": "Soru 1?"})
+    removed = items.pop(3)
+    _write(path, items)
+    assert ingest(engine, spec, path) == {"inserted": 1, "updated": 0, "unchanged": 3, "retired": 2}
+    rows = _rows(engine)
+    assert [r[0] for r in rows][:5] == ids and len(rows) == 6
+    assert "Question 1?" in rows[1][1] and "Edited 1?" in rows[5][1]  # answered ids still mean the same question
+    assert _live_ids(engine) == [ids[0], ids[2], ids[4], rows[5][0]]
+    with engine.connect() as conn:
+        assert conn.execute(text("select count(*) from useransweredquestion")).scalar() == 2
+        assert conn.execute(text("select count(*) from useranswerrecord")).scalar() == 2
+    assert ingest(engine, spec, path) == {"inserted": 0, "updated": 0, "unchanged": 4, "retired": 0}
+
+    # an item that comes back un-retires its old row
+    _write(path, items + [removed])
+    assert ingest(engine, spec, path) == {"inserted": 0, "updated": 1, "unchanged": 4, "retired": 0}
+    assert ids[3] in _live_ids(engine) and len(_rows(engine)) == 6
+
+
+def test_explicit_keys_and_duplicate_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    SQLModel.metadata.create_all(engine)
+    path = str(tmp_path / "quiz.json")
+    spec = SPECS["quiz"]
+    _write(path, [dict(_quiz(i), key=f"q{i}") for i in range(3)])
+    ingest(engine, spec, path)
+    # a keyed item keeps its row even when its category and text change
+    _write(path, [dict(_quiz(9), key="q0", category="science")] + [dict(_quiz(i), key=f"q{i}") for i in (1, 2)])
+    assert ingest(engine, spec, path) == {"inserted": 0, "updated": 1, "unchanged": 2, "retired": 0}
+
+    # a duplicate left by an earlier race (before the index was unique) is retired
+    with engine.begin() as conn:
+        conn.execute(text("drop index ix_quizquestion_content_key"))
+        conn.execute(text("insert into quizquestion (question_texts, options_texts, correct_answer_index, category, content_key, retired) "
+                          "select question_texts, options_texts, correct_answer_index, category, content_key, retired from quizquestion limit 1"))
+    assert not _ensure_content_columns(engine)
+    assert ingest(engine, spec, path)["retired"] == 1
+    assert _ensure_content_columns(engine)
+    assert len(_rows(engine)) == 4 and len(_live_ids(engine)) == 3
+    assert ingest(engine, spec, path) == {"inserted": 0, "updated": 0, "unchanged": 3, "retired": 0}
+
+
+def test_seed_that_loses_a_race_retries(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    SQLModel.metadata.create_all(engine)
+    path = str(tmp_path / "quiz.json")
+    spec = SPECS["quiz"]
+    _write(path, [_quiz(i) for i in range(4)])
+    ingest(engine, spec, path)
+    real = ingest_mod._existing
+    calls = []
+
+    def stale_existing(conn, spec):
+        # the first read happens before the other worker's rows were committed
+        calls.append(1)
+        return {} if len(calls) == 1 else real(conn, spec)
+
+    monkeypatch.setattr(ingest_mod, "_existing", stale_existing)
+    assert ingest(engine, spec, path) == {"inserted": 0, "updated": 0, "unchanged": 4, "retired": 0}
+    assert len(_rows(engine)) == 4
@@ -0,0 +1,61 @@
+import os
+import threading
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from server.leaderboard import Leaderboard
+
+
+class _SlowBoard(Leaderboard):
+    """Loads from a list instead of the database, blocking until released."""
+
+    def __init__(self, rows, **kwargs):
+        super().__init__(**kwargs)
+        self.rows = rows
+        self.loads = 0
+        self.loading = threading.Event()
+        self.release = threading.Event()
+
+    def _load(self):
+        self.loads += 1
+        self.loading.set()
+        assert self.release.wait(10)
+        return [dict(r) for r in self.rows]
+
+
+def _row(user_id, score):
+    return {"user_id": user_id, "email": f"u{user_id}@example.com", "username": f"u{user_id}", "score": score}
+
+
+def test_concurrent_rebuilds_share_one_load_and_replay_updates():
+    board = _SlowBoard([_row(1, 50), _row(2, 40), _row(3, 30)], top_k=3, refresh_seconds=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(board.top(3))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    assert board.loading.wait(10)
+    board.record_score(4, 45, email="u4@example.com")  # committed while the query runs
+    board.release.set()
+    for t in threads:
+        t.join(10)
+    assert board.loads == 1 and len(results) == 8
+    expected = [(1, "u1", 50), (2, "u4", 45), (3, "u2", 40)]
+    for top in results:
+        assert [(e["rank"], e["username"], e["score"]) for e in top] == expected
+
+
+def test_record_score_keeps_the_top_k_ordered():
+    board = _SlowBoard([_row(1, 50), _row(2, 40), _row(3, 30)], top_k=3, refresh_seconds=60)
+    board.release.set()
+    board.top(3)
+    generation = board.generation
+    board.record_score(5, 10)  # below the cut: no visible change
+    assert board.generation == generation
+    board.record_score(3, 60, email="u3@example.com")  # existing entry moves up
+    board.record_score(2, 40, email="u2@example.com")  # unchanged score keeps its place among ties
+    assert [(e["username"], e["score"]) for e in board.top(3)] == [("u3", 60), ("u1", 50), ("u2", 40)]
+    assert board.generation > generation
+    board.invalidate()
+    assert not board.is_fresh()
+    board.top(1)
+    assert board.loads == 2
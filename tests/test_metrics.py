@@ -0,0 +1,28 @@
+import os
+import re
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from fastapi.testclient import TestClient
+from firebase_admin import auth as firebase_auth
+
+from server import tokens
+from server.app import app
+
+
+def _firebase_calls(metrics_text, route):
+    m = re.search(r'^sparkup_http_firebase_calls_sum\{route="%s",method="GET"\} (\S+)$' % re.escape(route), metrics_text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+
+def test_firebase_calls_on_async_routes_count_towards_the_request(monkeypatch):
+    # no project id configured: tokens go through firebase_admin on the Firebase executor
+    monkeypatch.setattr(tokens, "get_verifier", lambda: None)
+    monkeypatch.setattr(tokens, "init_firebase", lambda: None)
+    monkeypatch.setattr(firebase_auth, "verify_id_token", lambda token: {"uid": token, "email": f"{token}@example.com"})
+    with TestClient(app) as client:
+        before = _firebase_calls(client.get("/metrics").text, "/user/profile/")
+        for _ in range(2):
+            assert client.get("/user/profile/", headers={"Authorization": "Bearer metrics-user"}).status_code == 200
+        after = _firebase_calls(client.get("/metrics").text, "/user/profile/")
+    assert after - before == 2
@@ -3,11 +3,17 @@ import importlib
 import json
 
 # Ensure in-memory sqlite for tests
-os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
 
-import main
 import pytest
-from sqlmodel import Session
+from firebase_admin import messaging
+from sqlmodel import Session, select
+
+from server import utils
+from server.content import registry
+from server.db import engine, create_db_and_tables
+from server.models import User, DeviceToken, NotificationMetric, UserSeenInfo, UserSeenInfoBits
+from server.seen_infos import _to_int, pick_unseen_many
 
 
 class DummyResponse:
@@ -25,22 +31,26 @@ class DummyMultiResp:
 
 @pytest.fixture(autouse=True)
 def setup_env():
-    # ensure DB tables exist in the current main module
-    main.create_db_and_tables()
-    # small MANUAL_INFOS
-    main.MANUAL_INFOS = [
+    # ensure DB tables exist
+    create_db_and_tables()
+    # small info catalog
+    saved = registry.current.infos
+    registry.publish(infos=[
         {"category": "general", "info_texts": {"en": "Info A"}},
         {"category": "general", "info_texts": {"en": "Info B"}},
         {"category": "general", "info_texts": {"en": "Info C"}},
-    ]
+    ])
     yield
+    registry.publish(infos=saved)
 
 
 def test_select_unseen_and_cycle():
-    with Session(main.engine) as session:
+    with Session(engine) as session:
         # create user
-        u = main.User(firebase_uid='u1')
+        u = User(firebase_uid='u1')
         session.add(u); session.commit(); session.refresh(u)
+        # only delivered infos are marked seen
+        session.add(DeviceToken(user_id=u.id, token='u1-token')); session.commit()
 
         picked_indices = []
         # monkeypatch messaging to harmless stub
@@ -48,33 +58,33 @@ def test_select_unseen_and_cycle():
             # simulate all success
             responses = [DummyResponse(True) for _ in (msg.tokens or [])]
             return DummyMultiResp(len(responses), 0, responses)
-        main.messaging.send_multicast = fake_send
+        messaging.send_multicast = fake_send
 
         # pick and send 3 times, should be unique
         for _ in range(3):
-            idx, info = main._select_unseen_info_for_user(session, u)
+            idx, info = utils._select_unseen_info_for_user(session, u)
             assert idx not in picked_indices
             picked_indices.append(idx)
-            res = main._send_notification_to_user(session, u, idx, info)
+            res = utils._send_notification_to_user(session, u, idx, info)
             assert res.get('sent') is True
 
         # now all seen; next pick should reset cycle and return some index from full set
-        idx2, info2 = main._select_unseen_info_for_user(session, u)
+        idx2, info2 = utils._select_unseen_info_for_user(session, u)
         assert idx2 in [0,1,2]
 
 
 def test_invalid_token_removal_and_metrics():
-    with Session(main.engine) as session:
+    with Session(engine) as session:
         # create user
-        u = main.User(firebase_uid='u2')
+        u = User(firebase_uid='u2')
         session.add(u); session.commit(); session.refresh(u)
         # add device tokens
-        t1 = main.DeviceToken(user_id=u.id, token='badtoken')
-        t2 = main.DeviceToken(user_id=u.id, token='retrytoken')
+        t1 = DeviceToken(user_id=u.id, token='badtoken')
+        t2 = DeviceToken(user_id=u.id, token='retrytoken')
         session.add(t1); session.add(t2); session.commit()
 
-        # craft MANUAL_INFOS pick
-        idx, info = 0, main.MANUAL_INFOS[0]
+        # craft info pick
+        idx, info = 0, registry.current.infos.items[0]
 
         # fake send multicast: first response invalid token, second transient
         def fake_send(msg):
@@ -99,14 +109,130 @@ def test_invalid_token_removal_and_metrics():
             else:
                 return fake_send_retry(msg)
 
-        main.messaging.send_multicast = send_with_retry
+        messaging.send_multicast = send_with_retry
 
-        res = main._send_notification_to_user(session, u, idx, info)
+        res = utils._send_notification_to_user(session, u, idx, info)
         assert res.get('sent') is True
+        # first attempt counts at the top level, the retry's own counts under "retry"
+        assert (res['success_count'], res['failure_count']) == (0, 2)
+        assert res['removed_tokens'] == ['badtoken']
+        assert res['retry'] == {'success_count': 1, 'failure_count': 0}
+        assert (res['delivered'], res['retried'], res['failed']) == (1, 1, 0)
         # badtoken should have been removed from DB
-        remaining = session.exec(main.select(main.DeviceToken).where(main.DeviceToken.token == 'badtoken')).all()
+        remaining = session.exec(select(DeviceToken).where(DeviceToken.token == 'badtoken')).all()
         assert len(remaining) == 0
         # metrics entry should exist
-        metrics = session.exec(main.select(main.NotificationMetric)).all()
+        metrics = session.exec(select(NotificationMetric)).all()
         assert len(metrics) >= 1
-    assert metrics[-1].removed_tokens >= 1
\ No newline at end of file
+    assert metrics[-1].removed_tokens >= 1
+
+
+def test_undelivered_info_is_not_marked_seen():
+    with Session(engine) as session:
+        u = User(firebase_uid='undelivered')
+        session.add(u); session.commit(); session.refresh(u)
+        session.add(DeviceToken(user_id=u.id, token='undelivered-token')); session.commit()
+
+        def fails(msg):
+            return DummyMultiResp(0, len(msg.tokens), [DummyResponse(False, Exception('internal error')) for _ in msg.tokens])
+        messaging.send_multicast = fails
+        idx, info = utils._select_unseen_info_for_user(session, u)
+        res = utils._send_notification_to_user(session, u, idx, info)
+        assert res['delivered'] == 0
+        assert session.get(UserSeenInfoBits, u.id) is None
+
+        messaging.send_multicast = lambda msg: DummyMultiResp(len(msg.tokens), 0, [DummyResponse(True) for _ in msg.tokens])
+        utils._send_notification_to_user(session, u, idx, info)
+        session.expire_all()
+        assert _to_int(session.get(UserSeenInfoBits, u.id).bits) == 1 << idx
+
+
+def test_seen_bitmap_cycles_and_imports_legacy_rows():
+    with Session(engine) as session:
+        users = [User(firebase_uid=f'bits{i}') for i in range(3)]
+        session.add_all(users); session.commit()
+        ids = [u.id for u in users]
+        # legacy per-info rows are folded into the bitmap on first pick
+        session.add(UserSeenInfo(user_id=ids[0], info_index=0))
+        session.add(UserSeenInfo(user_id=ids[0], info_index=1))
+        session.commit()
+
+        first = pick_unseen_many(session, ids, registry.current.infos.items, version='v1')
+        assert first[ids[0]] == 2
+        assert len(session.exec(select(UserSeenInfoBits).where(UserSeenInfoBits.user_id.in_(ids))).all()) == 3
+
+        seen = {uid: {idx} for uid, idx in first.items()}
+        for _ in range(2):
+            for uid, idx in pick_unseen_many(session, ids[1:], registry.current.infos.items, version='v1').items():
+                assert idx not in seen[uid]
+                seen[uid].add(idx)
+        assert all(seen[uid] == {0, 1, 2} for uid in ids[1:])
+
+        # everything seen: a new cycle starts
+        pick_unseen_many(session, ids[1:2], registry.current.infos.items, version='v1')
+        assert session.get(UserSeenInfoBits, ids[1]).cycle == 1
+
+
+def _scan_sender(sent):
+    def fake_send(msg):
+        sent.extend(msg.tokens)
+        return DummyMultiResp(len(msg.tokens), 0, [DummyResponse(True) for _ in msg.tokens])
+    return fake_send
+
+
+def test_scan_claim_is_a_compare_and_set():
+    from datetime import datetime, timedelta
+    from server import scan_job
+    from server.models import NotificationScanJob
+    with Session(engine) as session:
+        job = NotificationScanJob(status="failed", updated_at=datetime.utcnow() - timedelta(hours=1))
+        session.add(job); session.commit()
+        job_id = job.id
+    with Session(engine) as a, Session(engine) as b:
+        mine, theirs = a.get(NotificationScanJob, job_id), b.get(NotificationScanJob, job_id)
+        assert scan_job._take(a, mine, status="running", error=None)
+        assert not scan_job._take(b, theirs, status="running", error=None)
+        b.expire_all()
+        assert b.get(NotificationScanJob, job_id).status == "running"
+        a.delete(a.get(NotificationScanJob, job_id)); a.commit()
+
+
+def test_interrupted_scan_resumes_without_duplicate_pushes(monkeypatch):
+    from server import notifications
+    from server.scan_job import start_scan, get_job
+    sent = []
+    monkeypatch.setattr(messaging, "send_multicast", _scan_sender(sent), raising=False)
+    monkeypatch.setattr(notifications, "MULTICAST_LIMIT", 1)  # one batch per token, several waves per chunk
+    with Session(engine) as session:
+        for i in range(20):
+            u = User(firebase_uid=f'scan-resume-{i}')
+            session.add(u); session.flush()
+            session.add(DeviceToken(user_id=u.id, token=f'scan-resume-token-{i}'))
+        session.commit()
+
+    real = notifications.dispatch_batches
+    waves = {"n": 0}
+
+    def dies_on_second_wave(batches, max_workers):
+        waves["n"] += 1
+        if waves["n"] == 2:
+            raise RuntimeError("worker died")
+        return real(batches, max_workers)
+    monkeypatch.setattr(notifications, "dispatch_batches", dies_on_second_wave)
+    with Session(engine) as session:
+        first = start_scan(session, wait=True)
+        assert first["status"] == "failed"
+        reached = set(json.loads(get_job(session).sent_user_ids))
+        assert reached  # the first wave is checkpointed
+        # picks of the users the dead wave never reached are not marked seen
+        ours = session.exec(select(User.id).where(User.firebase_uid.like('scan-resume-%'))).all()
+        marked = set(session.exec(select(UserSeenInfoBits.user_id).where(UserSeenInfoBits.user_id.in_(ours))).all())
+        assert marked == reached & set(ours) and marked != set(ours)
+
+    monkeypatch.setattr(notifications, "dispatch_batches", real)
+    with Session(engine) as session:
+        second = start_scan(session, wait=True)
+        assert second["status"] == "completed" and second["job_id"] == first["job_id"]
+        assert get_job(session).sent_user_ids is None
+    mine = [t for t in sent if t.startswith('scan-resume-token-')]
+    assert sorted(mine) == sorted(f'scan-resume-token-{i}' for i in range(20))
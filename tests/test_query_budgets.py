@@ -0,0 +1,163 @@
+"""SQL statement budgets for the hot endpoints.
+
+Each request goes through the FastAPI TestClient with Firebase auth and
+messaging stubbed out, and the statements it issues are counted with an
+engine hook. A budget that is exceeded means a new query (often an N+1) was
+added to the handler; lower the budget when a change removes queries.
+"""
+import os
+import json
+from contextlib import contextmanager
+
+# server package creates its engine on import
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from fastapi.testclient import TestClient
+from firebase_admin import messaging
+from sqlalchemy import event
+from sqlmodel import Session
+
+from server import auth
+from server.app import app
+from server.content import registry
+from server.db import engine
+from server.leaderboard import leaderboard
+from server.models import User, DeviceToken, QuizQuestion
+from server.quiz_catalog import invalidate_catalog
+
+# Warm requests (the user row already exists) must stay within these.
+BUDGETS = {
+    "GET /user/profile/": 2,
+    "GET /quiz/": 6,
+    "POST /quiz/answer/": 8,
+    "POST /quiz/answer/batch/": 8,
+    "GET /leaderboard/": 0,
+    "GET /user/rank/": 1,
+    "GET /info/random/": 1,
+}
+
+
+class _Response:
+    def __init__(self, success):
+        self.success = success
+        self.exception = None
+
+
+class _BatchResponse:
+    def __init__(self, n):
+        self.responses = [_Response(True) for _ in range(n)]
+        self.success_count = n
+        self.failure_count = 0
+
+
+def _fake_verify(token):
+    # tests authenticate with "Bearer <uid>"
+    return {"uid": token, "email": f"{token}@example.com"}
+
+
+async def _fake_verify_async(token):
+    return _fake_verify(token)
+
+
+@contextmanager
+def count_statements():
+    counter = {"n": 0}
+
+    def _count(*args, **kwargs):
+        counter["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+@pytest.fixture(scope="module")
+def client():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(auth, "verify_id_token", _fake_verify)
+    mp.setattr(auth, "verify_id_token_async", _fake_verify_async)
+    mp.setattr(messaging, "send_multicast", lambda msg: _BatchResponse(len(msg.tokens)), raising=False)
+    with TestClient(app) as c:
+        with Session(engine) as session:
+            for i in range(30):
+                session.add(QuizQuestion(
+                    question_texts=json.dumps({"en": f"Question {i}?"}),
+                    options_texts=json.dumps({"en": ["a", "b", "c", "d"]}),
+                    correct_answer_index=i % 4, category="general",
+                ))
+            session.commit()
+        invalidate_catalog()
+        leaderboard.invalidate()
+        yield c
+    mp.undo()
+
+
+def _call(client, method, url, uid, **kwargs):
+    with count_statements() as counter:
+        r = client.request(method, url, headers={"Authorization": f"Bearer {uid}"}, **kwargs)
+    assert r.status_code == 200, r.text
+    return r, counter["n"]
+
+
+def _check(client, method, url, uid, **kwargs):
+    r, n = _call(client, method, url, uid, **kwargs)
+    key = f"{method} {url.split('?')[0]}"
+    assert n <= BUDGETS[key], f"{key} issued {n} statements, budget is {BUDGETS[key]}"
+    return r
+
+
+def test_read_endpoints_within_budget(client):
+    _call(client, "GET", "/user/profile/", "budget-reader")  # creates the user
+    _check(client, "GET", "/user/profile/", "budget-reader")
+    _check(client, "GET", "/user/rank/", "budget-reader")
+    _check(client, "GET", "/info/random/", "budget-reader")
+    _call(client, "GET", "/leaderboard/", "budget-reader")  # builds the board
+    _check(client, "GET", "/leaderboard/", "budget-reader")
+
+
+def test_quiz_flow_within_budget(client):
+    uid = "budget-player"
+    _call(client, "GET", "/quiz/?consume=true", uid)  # creates the user and energy row
+    questions = _check(client, "GET", "/quiz/?consume=true", uid).json()
+    for q in questions[:2]:
+        _check(client, "POST", "/quiz/answer/", uid, json={"question_id": q["id"], "answer_index": q["correct_answer_index"]})
+    more = _call(client, "GET", "/quiz/?limit=3", uid)[0].json()
+    answers = [{"question_id": q["id"], "answer_index": 0} for q in questions[2:] + more]
+    _check(client, "POST", "/quiz/answer/batch/", uid, json={"answers": answers})
+
+
+def _add_users(prefix, count):
+    with Session(engine) as session:
+        for i in range(count):
+            u = User(firebase_uid=f"{prefix}-{i}")
+            session.add(u)
+            session.flush()
+            session.add(DeviceToken(user_id=u.id, token=f"{prefix}-token-{i}"))
+        session.commit()
+
+
+@pytest.fixture
+def one_info():
+    # every user gets the same info, so each run sends one batch (one checkpointed wave)
+    previous = registry.current.infos
+    registry.publish(infos=[{"category": "general", "info_texts": {"en": "Budget info"}}])
+    yield
+    registry.publish(infos=previous)
+
+
+def test_run_scan_statements_do_not_scale_with_users(client, one_info):
+    _add_users("scan-warm", 5)
+    _call(client, "POST", "/notifications/run-scan/?wait=true", "scan-admin")  # every user gets a bitmap row
+
+    _add_users("scan-small", 10)
+    r, small = _call(client, "POST", "/notifications/run-scan/?wait=true", "scan-admin")
+    assert r.json()["status"] == "completed"
+
+    _add_users("scan-large", 100)
+    r, large = _call(client, "POST", "/notifications/run-scan/?wait=true", "scan-admin")
+    assert r.json()["status"] == "completed"
+    assert r.json()["users_scanned"] > 100
+    assert large == small, f"run-scan issued {small} statements for the small run and {large} for 100 more users"
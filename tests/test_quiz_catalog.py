@@ -0,0 +1,59 @@
+import os
+import json
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from server.db import engine, create_db_and_tables
+from server.models import QuizQuestion
+from server.quiz_catalog import get_localized_questions, invalidate_catalog
+
+
+def _question(session, en, tr=None):
+    texts = {"en": en}
+    if tr:
+        texts["tr"] = tr
+    q = QuizQuestion(question_texts=json.dumps(texts), options_texts=json.dumps({"en": ["a", "b"], "tr": ["x", "y"]}), correct_answer_index=1, category="general")
+    session.add(q)
+    session.commit()
+    return q.id
+
+
+def _statements(fn):
+    counter = {"n": 0}
+
+    def _count(*args, **kwargs):
+        counter["n"] += 1
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        return fn(), counter["n"]
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+def test_localized_questions_are_cached_until_invalidated():
+    create_db_and_tables()
+    invalidate_catalog()
+    with Session(engine) as session:
+        a = _question(session, "Catalog A?", "Katalog A?")
+        b = _question(session, "Catalog B?")
+        first, n = _statements(lambda: get_localized_questions(session, [b, a, b, 10**9], "tr"))
+        assert n == 1
+        assert [q["id"] for q in first] == [b, a]  # request order, duplicates and unknown ids dropped
+        assert first[0]["question_text"] == "Catalog B?" and first[1]["question_text"] == "Katalog A?"
+        assert first[1]["options"] == ["x", "y"] and first[1]["correct_answer_index"] == 1
+
+        first[1]["options"].append("mutated")
+        cached, n = _statements(lambda: get_localized_questions(session, [a], "tr"))
+        assert n == 0 and cached[0]["options"] == ["x", "y"]
+        assert _statements(lambda: get_localized_questions(session, [a], "en"))[1] == 0  # every language of a parsed row is cached
+
+        row = session.get(QuizQuestion, a)
+        row.question_texts = json.dumps({"en": "Edited A?", "tr": "Düzenlendi A?"})
+        session.add(row)
+        session.commit()
+        assert get_localized_questions(session, [a], "tr")[0]["question_text"] == "Katalog A?"
+        invalidate_catalog()
+        assert get_localized_questions(session, [a], "tr")[0]["question_text"] == "Düzenlendi A?"
@@ -0,0 +1,136 @@
+import os
+from datetime import date
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session, SQLModel, select
+
+from server.models import QuizQuestion, UserAnsweredQuestion, UserQuizCursor
+from server.quiz_cursor import invalidate_question_ids, next_question_ids, permute
+
+
+def test_permute_is_a_bijection():
+    for size in (1, 2, 3, 7, 64, 420, 1000):
+        for key in (0, 12345, 2 ** 62 + 7):
+            out = [permute(i, size, key) for i in range(size)]
+            assert sorted(out) == list(range(size))
+
+
+def test_permute_depends_on_key():
+    a = [permute(i, 420, 1) for i in range(420)]
+    b = [permute(i, 420, 2) for i in range(420)]
+    assert a != b
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cursor.db'}")
+    SQLModel.metadata.create_all(engine)
+    invalidate_question_ids()  # the id list is shared process-wide
+    with Session(engine) as s:
+        for i in range(10):
+            s.add(QuizQuestion(question_texts="{}", options_texts="{}", correct_answer_index=0, category="c"))
+        s.commit()
+        yield s
+    invalidate_question_ids()
+
+
+def _answered(session, user_id):
+    return set(session.exec(select(UserAnsweredQuestion.quizquestion_id).where(UserAnsweredQuestion.user_id == user_id)).all())
+
+
+def test_epoch_serves_every_question_once_then_wraps(session):
+    first = next_question_ids(session, 1, 4) + next_question_ids(session, 1, 4)
+    session.add(UserAnsweredQuestion(user_id=1, quizquestion_id=first[0]))
+    session.commit()
+    rest = next_question_ids(session, 1, 2)
+    assert sorted(first + rest) == list(range(1, 11))
+    assert session.get(UserQuizCursor, 1).epoch == 0 and _answered(session, 1) == {first[0]}
+
+    wrapped = next_question_ids(session, 1, 3)
+    row = session.get(UserQuizCursor, 1)
+    assert (row.epoch, row.cursor) == (1, 3) and len(set(wrapped)) == 3
+    assert _answered(session, 1) == set()  # questions can score again
+
+
+def test_preview_leaves_the_cursor_alone(session):
+    next_question_ids(session, 2, 3)
+    before = session.get(UserQuizCursor, 2)
+    state = (before.epoch, before.cursor)
+    peek = next_question_ids(session, 2, 3, advance=False)
+    assert next_question_ids(session, 2, 3, advance=False) == peek
+    session.expire_all()
+    assert (session.get(UserQuizCursor, 2).epoch, session.get(UserQuizCursor, 2).cursor) == state
+    assert next_question_ids(session, 2, 3) == peek
+
+
+def test_shrinking_bank_resets_the_cursor(session):
+    next_question_ids(session, 3, 5)
+    for q in session.exec(select(QuizQuestion).where(QuizQuestion.id > 6)).all():
+        session.delete(q)
+    session.commit()
+    invalidate_question_ids()
+    ids = next_question_ids(session, 3, 6)
+    row = session.get(UserQuizCursor, 3)
+    assert (row.epoch, row.cursor, row.bank_size) == (1, 6, 6)
+    assert sorted(ids) == list(range(1, 7))
+
+
+def test_first_epoch_skips_questions_answered_before_the_cursor(session):
+    for qid in range(1, 8):
+        session.add(UserAnsweredQuestion(user_id=4, quizquestion_id=qid))
+    session.commit()
+    assert sorted(next_question_ids(session, 4, 2) + next_question_ids(session, 4, 1)) == [8, 9, 10]
+    assert session.get(UserQuizCursor, 4).skip_answered
+    # the next epoch serves everything again
+    assert len(next_question_ids(session, 4, 10)) == 10
+    assert not session.get(UserQuizCursor, 4).skip_answered and _answered(session, 4) == set()
+
+
+def test_retired_questions_leave_the_bank(session):
+    retired = session.get(QuizQuestion, 3)
+    retired.retired = True
+    session.add(retired)
+    session.commit()
+    invalidate_question_ids()
+    served = next_question_ids(session, 4, 9)
+    assert sorted(served) == [1, 2, 4, 5, 6, 7, 8, 9, 10]
+
+
+def test_quiz_session_is_charged_only_when_it_can_be_served(monkeypatch):
+    from fastapi.testclient import TestClient
+    from server import auth, quiz_cursor
+    from server.app import app
+    from server.db import engine as app_engine
+    from server.models import UserEnergy, User
+
+    def _verify(token):
+        return {"uid": token, "email": f"{token}@example.com"}
+
+    async def _verify_async(token):
+        return _verify(token)
+
+    monkeypatch.setattr(auth, "verify_id_token", _verify)
+    monkeypatch.setattr(auth, "verify_id_token_async", _verify_async)
+    headers = {"Authorization": "Bearer cursor-energy"}
+    bank = {"ids": []}  # an empty (exhausted) bank first
+    real_ids = quiz_cursor.get_question_ids
+    monkeypatch.setattr(quiz_cursor, "get_question_ids", lambda s: real_ids(s) if bank["ids"] is None else bank["ids"])
+    with TestClient(app) as client:
+        start = client.get("/user/profile/", headers=headers).json()["remaining_energy"]
+        r = client.get("/quiz/?limit=1&consume=true", headers=headers)
+        assert r.status_code == 404 and r.json()["detail"] == "Not enough new questions."
+        assert client.get("/user/profile/", headers=headers).json()["remaining_energy"] == start
+
+        bank["ids"] = None
+        with Session(app_engine) as s:
+            s.add(QuizQuestion(question_texts='{"en": "Energy?"}', options_texts='{"en": ["a"]}', correct_answer_index=0, category="c"))
+            user_id = s.exec(select(User.id).where(User.firebase_uid == "cursor-energy")).one()
+            s.merge(UserEnergy(user_id=user_id, remaining_energy=0, last_reset=date.today()))
+            s.commit()
+        invalidate_question_ids()
+        assert client.get("/quiz/?limit=1&consume=true", headers=headers).status_code == 403
+        with Session(app_engine) as s:
+            assert s.get(UserQuizCursor, user_id) is None  # the refused session didn't move the cursor
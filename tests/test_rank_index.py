@@ -0,0 +1,59 @@
+import os
+import random
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from server.rank_index import MAX_TREE_SCORE, RankIndex, _Fenwick, _ScoreCounts, _INITIAL_SIZE
+
+
+def _brute_above(scores, s):
+    return sum(1 for v in scores.values() if v > s)
+
+
+def test_counts_match_a_scan_after_grow_and_updates():
+    rng = random.Random(7)
+    counts = _ScoreCounts()
+    scores = {}
+    for step in range(3000):
+        user_id = rng.randrange(400)
+        # mostly small scores, some past several doublings, a few beyond the tree
+        score = rng.choice((rng.randrange(100), rng.randrange(_INITIAL_SIZE * 8), MAX_TREE_SCORE + rng.randrange(50)))
+        counts.set(user_id, score)
+        scores[user_id] = score
+        if step % 100 == 0:
+            for probe in (0, 50, _INITIAL_SIZE - 1, _INITIAL_SIZE, _INITIAL_SIZE * 3, MAX_TREE_SCORE - 1, MAX_TREE_SCORE + 25):
+                assert counts.count_above(probe) == _brute_above(scores, probe)
+    assert counts.tree.size > _INITIAL_SIZE
+    assert counts.tree_total + len(counts.overflow) == len(scores)
+
+
+def test_grow_keeps_prefix_sums():
+    tree = _Fenwick(8)
+    for v in (0, 3, 3, 7):
+        tree.add(v, 1)
+    tree.grow(4)
+    tree.add(12, 1)
+    assert tree.size == 16
+    assert [tree.prefix(i) for i in (0, 2, 3, 7, 11, 12, 15)] == [1, 1, 3, 4, 4, 5, 5]
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def exec(self, _stmt):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_lookup_follows_score_changes():
+    index = RankIndex(refresh_seconds=3600)
+    index.rebuild(_Rows([(1, 100), (2, 50), (3, 50), (4, 0)]))
+    assert index.lookup(50) == {"rank": 2, "users_above": 1, "total_users": 4, "percentile": 75.0}
+    index.set_score(4, 10 * _INITIAL_SIZE)  # past the initial tree size
+    index.set_score(5, 75)
+    assert index.lookup(50)["rank"] == 4
+    assert index.lookup(10 * _INITIAL_SIZE)["rank"] == 1
+    assert index.count_above(-5) == 5
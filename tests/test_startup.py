@@ -0,0 +1,105 @@
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel
+
+from server.startup import content_version, read_stamp, schema_version, write_stamp
+
+
+def test_stamp_round_trip(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stamp.db'}")
+    assert read_stamp(engine) == {}  # no table yet
+    SQLModel.metadata.create_all(engine)
+    write_stamp(engine, {"schema": schema_version()})
+    write_stamp(engine, {"schema": schema_version(), "content": "abc"})
+    assert read_stamp(engine) == {"schema": schema_version(), "content": "abc"}
+
+
+def test_content_version_follows_the_data_files(tmp_path):
+    (tmp_path / "manual_quiz.json").write_text("[]", encoding="utf-8")
+    before = content_version(str(tmp_path))
+    assert content_version(str(tmp_path)) == before
+    (tmp_path / "manual_quiz.json").write_text('[{"category": "x"}]', encoding="utf-8")
+    assert content_version(str(tmp_path)) != before
+
+
+def test_failed_phase_does_not_store_the_stamp(tmp_path, monkeypatch):
+    from server import db, startup
+    engine = create_engine(f"sqlite:///{tmp_path / 'prepare.db'}")
+    compat_ok = [False]
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(db, "create_db_and_tables", lambda: SQLModel.metadata.create_all(engine))
+    monkeypatch.setattr(db, "_ensure_schema_compat", lambda: compat_ok[0])
+    monkeypatch.setattr(startup, "STARTUP_MODE", "fast")
+
+    def prepare():
+        monkeypatch.setattr(startup, "_prepared", False)
+        monkeypatch.setattr(startup, "report", startup.StartupReport())
+        return startup.prepare_database()
+
+    assert prepare() is False
+    assert startup.report.failed == ["schema_compat"] and read_stamp(engine) == {}
+    assert prepare() is False  # retried, not skipped
+    compat_ok[0] = True
+    assert prepare() is False and read_stamp(engine) == {"schema": schema_version()}
+    assert prepare() is True
+
+
+def test_concurrent_init_firebase_waits_for_the_app(monkeypatch):
+    import threading
+    import time
+    import firebase_admin
+    from firebase_admin import credentials
+    from server import config
+
+    apps = {}
+    attempts = []
+
+    def initialize_app(cred):
+        attempts.append(1)
+        time.sleep(0.05)
+        if len(attempts) == 1:
+            raise ValueError("transient")
+        apps["[DEFAULT]"] = object()
+
+    monkeypatch.setattr(config, "_firebase_ready", False)
+    monkeypatch.setattr(config, "GOOGLE_APPLICATION_CREDENTIALS", "creds.json")
+    monkeypatch.setattr(credentials, "Certificate", lambda path: object())
+    monkeypatch.setattr(firebase_admin, "_apps", apps)
+    monkeypatch.setattr(firebase_admin, "initialize_app", initialize_app)
+
+    config.init_firebase()  # fails; the next call must retry
+    assert not config._firebase_ready and not apps
+    seen = []
+
+    def worker():
+        config.init_firebase()
+        seen.append("[DEFAULT]" in apps)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen == [True] * 8 and len(attempts) == 2
+
+
+def test_debug_startup_reports_the_content_backend():
+    from fastapi.testclient import TestClient
+    from server.app import app
+    with TestClient(app) as client:
+        body = client.get("/debug/startup/").json()
+    assert "bundle" in body["phases_ms"] and body["bundle"] in ("built", "fresh")
+    assert body["content_backend"] == {"infos": "bundle", "truefalse": "bundle"}
+
+
+def test_bundle_is_built_only_at_a_configured_path(tmp_path, monkeypatch):
+    from server import content, startup
+    monkeypatch.setattr(content, "CONTENT_BUNDLE_PATH", None)
+    assert startup._ensure_bundle() == "not_configured"
+    assert not os.path.exists(content.bundle_path())
+    monkeypatch.setattr(content, "CONTENT_BUNDLE_PATH", str(tmp_path / "content.bundle"))
+    assert startup._ensure_bundle() == "built" and os.path.exists(tmp_path / "content.bundle")
+    assert startup._ensure_bundle() == "fresh"
@@ -0,0 +1,69 @@
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import auth
+from server.app import app
+from server.content import registry
+
+TRUEFALSE = [
+    {"category": "Space", "question": {"en": "The sun is a star.", "tr": "Güneş bir yıldızdır."}, "correct_answer": True},
+    {"category": "Space", "question": {"en": "Mars has rings."}, "correct_answer": False},
+    {"category": "History", "question": {"en": "Rome was built in a day.", "tr": "Roma bir günde kuruldu."}, "correct_answer": False},
+    {"question": "Plain string question", "correct_answer": True},
+]
+
+
+def _fake_verify(token):
+    return {"uid": token, "email": f"{token}@example.com"}
+
+
+async def _fake_verify_async(token):
+    return _fake_verify(token)
+
+
+@pytest.fixture(scope="module")
+def client():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(auth, "verify_id_token", _fake_verify)
+    mp.setattr(auth, "verify_id_token_async", _fake_verify_async)
+    with TestClient(app) as c:
+        previous = registry.current
+        registry.publish(truefalse=TRUEFALSE)
+        yield c
+        registry.publish(infos=previous.infos, truefalse=previous.truefalse)
+    mp.undo()
+
+
+def _get(client, url, uid):
+    # a fresh user per request: every session costs energy
+    return client.get(url, headers={"Authorization": f"Bearer {uid}"})
+
+
+def test_projected_page_carries_one_language(client):
+    r = _get(client, "/manual/truefalse/?lang=tr&shuffle=false&limit=3&offset=1", "tf-page")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 4 and body["offset"] == 1 and "session_seconds" in body
+    assert body["items"] == [
+        {"id": 1, "category": "Space", "question_text": "Mars has rings.", "correct_answer": False},
+        {"id": 2, "category": "History", "question_text": "Roma bir günde kuruldu.", "correct_answer": False},
+        {"id": 3, "category": "General", "question_text": "Plain string question", "correct_answer": True},
+    ]
+
+
+def test_projected_sample_stays_in_the_category(client):
+    body = _get(client, "/manual/truefalse/?category=Space&limit=5&lang=xx", "tf-sample").json()
+    assert body["total"] == 2 and body["offset"] == 0
+    assert sorted(i["id"] for i in body["items"]) == [0, 1]
+    assert {i["question_text"] for i in body["items"]} == {"The sun is a star.", "Mars has rings."}  # unknown language: English
+    assert _get(client, "/manual/truefalse/?category=Nope", "tf-missing").status_code == 404
+
+
+def test_without_parameters_the_full_list_is_returned(client):
+    body = _get(client, "/manual/truefalse/", "tf-legacy").json()
+    assert [dict(i, session_seconds=None) for i in body] == [dict(t, session_seconds=None) for t in TRUEFALSE]
+    assert all("session_seconds" in i for i in body)